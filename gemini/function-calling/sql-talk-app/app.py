@@ -1,11 +1,13 @@
-import time
-
 from google.cloud import bigquery
 import streamlit as st
 from vertexai.generative_models import FunctionDeclaration, GenerativeModel, Part, Tool
 
 BIGQUERY_DATASET_ID = "thelook_ecommerce"
 
+# How long dataset listings and table schemas are answered from the cache
+# before they are fetched from BigQuery again
+SCHEMA_CACHE_TTL_SECONDS = 3600
+
 list_datasets_func = FunctionDeclaration(
     name="list_datasets",
     description="Get a list of datasets that will help answer the user's question",
@@ -75,6 +77,51 @@ sql_query_tool = Tool(
     ],
 )
 
+
+@st.cache_resource
+def get_bigquery_client() -> bigquery.Client:
+    """Returns a BigQuery client shared by all sessions."""
+    return bigquery.Client()
+
+
+@st.cache_data(ttl=SCHEMA_CACHE_TTL_SECONDS, show_spinner=False)
+def list_tables(dataset_id: str) -> list:
+    """Returns the IDs of the tables in a dataset."""
+    return [table.table_id for table in get_bigquery_client().list_tables(dataset_id)]
+
+
+def summarize_fields(fields: list, prefix: str = "") -> list:
+    """Flattens a table schema into one line per column."""
+    lines = []
+    for field in fields:
+        name = prefix + field["name"]
+        line = f"{name} {field['type']}"
+        if field.get("mode") == "REPEATED":
+            line += " REPEATED"
+        if field.get("description"):
+            line += f" - {field['description']}"
+        lines.append(line)
+        lines.extend(summarize_fields(field.get("fields", []), prefix=f"{name}."))
+    return lines
+
+
+@st.cache_data(ttl=SCHEMA_CACHE_TTL_SECONDS, show_spinner=False)
+def get_table_summary(table_id: str) -> dict:
+    """Returns a compact description, row count, and schema of a table.
+
+    Only the parts of the table metadata the model needs are kept, instead
+    of the full API representation.
+    """
+    table = get_bigquery_client().get_table(table_id).to_api_repr()
+    fields = table.get("schema", {}).get("fields", [])
+    return {
+        "description": str(table.get("description", "")),
+        "num_rows": table.get("numRows"),
+        "columns": [field["name"] for field in fields],
+        "schema": "\n".join(summarize_fields(fields)),
+    }
+
+
 model = GenerativeModel(
     "gemini-1.5-pro-001",
     generation_config={"temperature": 0},
@@ -131,7 +178,7 @@ if prompt := st.chat_input("Ask me about information in the database..."):
         message_placeholder = st.empty()
         full_response = ""
         chat = model.start_chat()
-        client = bigquery.Client()
+        client = get_bigquery_client()
 
         prompt += """
             Please give a concise, high-level summary followed by detail in
@@ -159,38 +206,34 @@ if prompt := st.chat_input("Ask me about information in the database..."):
                 print(params)
 
                 if response.function_call.name == "list_datasets":
-                    api_response = client.list_datasets()
                     api_response = BIGQUERY_DATASET_ID
                     api_requests_and_responses.append(
                         [response.function_call.name, params, api_response]
                     )
 
                 if response.function_call.name == "list_tables":
-                    api_response = client.list_tables(params["dataset_id"])
-                    api_response = str([table.table_id for table in api_response])
+                    api_response = str(list_tables(params["dataset_id"]))
                     api_requests_and_responses.append(
                         [response.function_call.name, params, api_response]
                     )
 
                 if response.function_call.name == "get_table":
-                    api_response = client.get_table(params["table_id"])
-                    api_response = api_response.to_api_repr()
+                    table_summary = get_table_summary(params["table_id"])
                     api_requests_and_responses.append(
                         [
                             response.function_call.name,
                             params,
                             [
-                                str(api_response.get("description", "")),
-                                str(
-                                    [
-                                        column["name"]
-                                        for column in api_response["schema"]["fields"]
-                                    ]
-                                ),
+                                table_summary["description"],
+                                str(table_summary["columns"]),
                             ],
                         ]
                     )
-                    api_response = str(api_response)
+                    api_response = (
+                        f"Description: {table_summary['description']}\n"
+                        f"Number of rows: {table_summary['num_rows']}\n"
+                        f"Schema:\n{table_summary['schema']}"
+                    )
 
                 if response.function_call.name == "sql_query":
                     job_config = bigquery.QueryJobConfig(
@@ -253,8 +296,6 @@ if prompt := st.chat_input("Ask me about information in the database..."):
             except AttributeError:
                 function_calling_in_process = False
 
-        time.sleep(3)
-
         full_response = response.text
         with message_placeholder.container():
             st.markdown(full_response.replace("$", "\$"))  # noqa: W605
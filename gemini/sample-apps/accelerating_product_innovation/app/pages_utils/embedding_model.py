@@ -3,6 +3,8 @@ Defines functions for generating text embeddings using a Vertex AI
 TextEmbeddingModel.
 """
 
+from concurrent.futures import ThreadPoolExecutor
+
 import backoff
 from google.api_core.exceptions import ResourceExhausted
 import numpy as np
@@ -31,3 +33,75 @@ def embedding_model_with_backoff(text: list[str]) -> np.ndarray:
     """
     embeddings = get_embedding_model().get_embeddings(text)
     return np.array([each.values for each in embeddings][0])
+
+
+def get_embedding_batches(
+    texts: list[str], max_batch_size: int, max_batch_characters: int
+) -> list[list[str]]:
+    """
+    Splits texts into batches that fit in a single embedding request.
+
+    Args:
+        texts: A list of text strings to split.
+        max_batch_size: Maximum number of texts per request.
+        max_batch_characters: Maximum total characters per request, a proxy
+            for the model's per-request token limit.
+
+    Returns:
+        The batches, in input order.
+    """
+    batches: list[list[str]] = []
+    batch: list[str] = []
+    batch_characters = 0
+    for text in texts:
+        if batch and (
+            len(batch) >= max_batch_size
+            or batch_characters + len(text) > max_batch_characters
+        ):
+            batches.append(batch)
+            batch = []
+            batch_characters = 0
+        batch.append(text)
+        batch_characters += len(text)
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+@backoff.on_exception(backoff.expo, ResourceExhausted, max_time=60)
+def _embed_batch_with_backoff(texts: list[str]) -> list[list[float]]:
+    return [each.values for each in get_embedding_model().get_embeddings(texts)]
+
+
+def embedding_model_batch_with_backoff(
+    texts: list[str],
+    max_batch_size: int = 250,
+    max_batch_characters: int = 60_000,
+    max_concurrent_requests: int = 4,
+) -> np.ndarray:
+    """
+    Process embeddings for many texts in as few requests as possible.
+
+    Texts are split into batches that fit a single request, and up to
+    max_concurrent_requests batches are embedded at once. Throttled
+    requests are retried with exponential backoff.
+
+    Args:
+        texts: A list of text strings to process.
+        max_batch_size: Maximum number of texts per request.
+        max_batch_characters: Maximum total characters per request.
+        max_concurrent_requests: Requests in flight, to stay within quota.
+
+    Returns:
+        A NumPy array with one embedding per text, in input order.
+    """
+    batches = get_embedding_batches(texts, max_batch_size, max_batch_characters)
+    if not batches:
+        return np.array([])
+
+    with ThreadPoolExecutor(
+        max_workers=min(max_concurrent_requests, len(batches))
+    ) as executor:
+        results = list(executor.map(_embed_batch_with_backoff, batches))
+
+    return np.array([embedding for batch in results for embedding in batch])
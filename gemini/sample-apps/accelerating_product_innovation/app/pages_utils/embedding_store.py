@@ -0,0 +1,517 @@
+"""
+This module provides an append-only store for the text embeddings of a
+product category in the Google Cloud Storage (GCS) bucket.
+
+This module:
+    * Writes every upload as a new, immutable segment with binary (float32)
+      embeddings, so ingest cost depends only on the uploaded file and
+      concurrent uploads never overwrite each other.
+    * Skips chunks whose content hash is already stored, using a small hash
+      index written next to each segment, so deduplication never downloads
+      stored embeddings.
+    * Records file deletions as tombstones instead of rewriting segments.
+    * Merges segments and tombstones into one compacted segment in the
+      background, tracked by a manifest.
+
+Store layout for a product category:
+    <category>/embedding_store/manifest.json
+    <category>/embedding_store/segments/<time_ns>-<id>.npz
+    <category>/embedding_store/hashes/<time_ns>-<id>.json
+    <category>/embedding_store/tombstones/<time_ns>-<id>.json
+
+Segments and tombstones are applied in the order GCS wrote them (object
+generation), not by the writer's clock in their names.
+
+A legacy <category>/embeddings.json is read as the oldest segment and is
+removed by the first compaction.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Iterable, Optional
+import uuid
+
+from app.pages_utils.pages_config import GLOBAL_CFG
+from dotenv import load_dotenv
+from google.api_core.exceptions import NotFound, PreconditionFailed
+from google.cloud import storage
+import numpy as np
+import pandas as pd
+
+load_dotenv()
+
+PROJECT_ID = os.getenv("PROJECT_ID")
+
+# Metadata columns stored alongside each embedding.
+STORE_COLUMNS = ["file_name", "chunk_number", "content"]
+
+# Number of uncompacted segments and tombstones that triggers a background
+# compaction after an append.
+COMPACTION_MIN_OBJECTS = 8
+
+# Define storage bucket
+storage_client = storage.Client(project=PROJECT_ID)
+bucket = storage_client.bucket(GLOBAL_CFG["bucket_name"])
+
+_compaction_lock = threading.Lock()
+_compacting_categories: set[str] = set()
+
+
+def get_content_hash(content: str) -> str:
+    """Returns the hex SHA-256 of a chunk's content, used for deduplication.
+
+    Args:
+        content: The chunk text.
+
+    Returns:
+        The content hash.
+    """
+    return hashlib.sha256(str(content).encode("utf-8")).hexdigest()
+
+
+def _store_prefix(product_category: str) -> str:
+    return f"{product_category}/embedding_store/"
+
+
+def _legacy_blob_name(product_category: str) -> str:
+    return f"{product_category}/embeddings.json"
+
+
+def _new_object_name(product_category: str, kind: str, extension: str) -> str:
+    # Names only need to be unique; objects are applied in generation order.
+    return (
+        f"{_store_prefix(product_category)}{kind}/"
+        f"{time.time_ns():020d}-{uuid.uuid4().hex[:8]}{extension}"
+    )
+
+
+def _hashes_name(segment_name: str) -> str:
+    """Returns the name of the hash index written next to a segment."""
+    stem = segment_name.rsplit("/", 1)[-1].removesuffix(".npz")
+    return f"{segment_name.rsplit('/segments/', 1)[0]}/hashes/{stem}.json"
+
+
+def _has_embedding(row: Any) -> bool:
+    return isinstance(row, (list, tuple, np.ndarray))
+
+
+def encode_segment(dataframe: pd.DataFrame) -> bytes:
+    """Serializes chunks and their embeddings into a segment file.
+
+    Args:
+        dataframe: Chunks with the STORE_COLUMNS, "embedding" and
+            "content_hash" columns.
+
+    Returns:
+        The segment as .npz bytes.
+    """
+    embeddings = dataframe["embedding"].tolist()
+    has_embedding = np.array([_has_embedding(row) for row in embeddings], dtype=bool)
+    dimensions = next((len(row) for row in embeddings if _has_embedding(row)), 0)
+
+    matrix = np.zeros((len(embeddings), dimensions), dtype=np.float32)
+    for position, row in enumerate(embeddings):
+        if has_embedding[position]:
+            matrix[position] = row
+
+    # Metadata is stored as UTF-8 JSON so segments load without pickle.
+    records = dataframe[STORE_COLUMNS + ["content_hash"]].to_dict(orient="list")
+    metadata = np.frombuffer(json.dumps(records).encode("utf-8"), dtype=np.uint8)
+
+    buffer = io.BytesIO()
+    np.savez(buffer, embeddings=matrix, has_embedding=has_embedding, metadata=metadata)
+    return buffer.getvalue()
+
+
+def encode_hashes(dataframe: pd.DataFrame) -> bytes:
+    """Serializes the content hashes of a segment, grouped by file name.
+
+    Args:
+        dataframe: Chunks with the "file_name" and "content_hash" columns.
+
+    Returns:
+        The hash index as JSON bytes.
+    """
+    hashes: dict[str, list[str]] = {}
+    for file_name, content_hash in zip(
+        dataframe["file_name"], dataframe["content_hash"]
+    ):
+        hashes.setdefault(str(file_name), []).append(content_hash)
+    return json.dumps(hashes).encode("utf-8")
+
+
+def decode_segment(data: bytes) -> pd.DataFrame:
+    """Deserializes a segment file written by encode_segment.
+
+    Args:
+        data: The segment as .npz bytes.
+
+    Returns:
+        A DataFrame with the STORE_COLUMNS, "embedding" and "content_hash"
+        columns. Embeddings are float32 rows of the segment matrix.
+    """
+    with np.load(io.BytesIO(data), allow_pickle=False) as segment:
+        matrix = segment["embeddings"]
+        has_embedding = segment["has_embedding"]
+        records = json.loads(segment["metadata"].tobytes().decode("utf-8"))
+
+    dataframe = pd.DataFrame(records, columns=STORE_COLUMNS + ["content_hash"])
+    dataframe["embedding"] = [
+        matrix[position] if has_embedding[position] else None
+        for position in range(len(matrix))
+    ]
+    return dataframe
+
+
+def _decode_legacy(data: bytes) -> pd.DataFrame:
+    dataframe = pd.DataFrame.from_dict(json.loads(data))
+    for column in STORE_COLUMNS:
+        if column not in dataframe:
+            dataframe[column] = None
+    dataframe["content_hash"] = dataframe["content"].map(get_content_hash)
+    dataframe["embedding"] = [
+        np.asarray(row, dtype=np.float32) if _has_embedding(row) else None
+        for row in dataframe["embedding"]
+    ]
+    return dataframe[STORE_COLUMNS + ["content_hash", "embedding"]]
+
+
+def _read_manifest(product_category: str) -> tuple[dict, int]:
+    """Returns the manifest and its generation (0 if there is none yet)."""
+    blob = bucket.get_blob(f"{_store_prefix(product_category)}manifest.json")
+    if blob is None:
+        return {"base": None, "covers": []}, 0
+    return json.loads(blob.download_as_bytes()), blob.generation
+
+
+def _list_pending(product_category: str, manifest: dict) -> list[storage.Blob]:
+    """Lists the segments and tombstones not yet merged into the base segment.
+
+    Returns:
+        The blobs in the order they are applied, legacy embeddings.json first.
+    """
+    covered = set(manifest["covers"])
+    pending = []
+    for blob in bucket.list_blobs(prefix=_store_prefix(product_category)):
+        if blob.name in covered or blob.name == manifest["base"]:
+            continue
+        if "/segments/" in blob.name or "/tombstones/" in blob.name:
+            pending.append(blob)
+    # Generations are assigned by GCS, so this is the order the objects were
+    # written in regardless of the writers' clocks.
+    pending.sort(key=lambda blob: (blob.generation, blob.name))
+
+    legacy = bucket.get_blob(_legacy_blob_name(product_category))
+    if legacy is not None and legacy.name not in covered:
+        pending.insert(0, legacy)
+    return pending
+
+
+def get_store_version(product_category: str) -> Optional[tuple]:
+    """Identifies the current contents of a category's store.
+
+    Only object metadata is listed, so this is cheap enough to call on every
+    page load and use as a cache key.
+
+    Args:
+        product_category: The product category.
+
+    Returns:
+        A hashable version, or None if the category has no stored embeddings.
+    """
+    manifest, manifest_generation = _read_manifest(product_category)
+    pending = _list_pending(product_category, manifest)
+    if manifest["base"] is None and not pending:
+        return None
+    return (manifest_generation,) + tuple(
+        (blob.name, blob.generation) for blob in pending
+    )
+
+
+def store_exists(product_category: str) -> bool:
+    """Returns whether the category has any stored embeddings."""
+    return get_store_version(product_category) is not None
+
+
+def _load_state(
+    product_category: str,
+) -> tuple[Optional[pd.DataFrame], dict, int, list[storage.Blob]]:
+    manifest, manifest_generation = _read_manifest(product_category)
+    pending = _list_pending(product_category, manifest)
+
+    blob_names = ([manifest["base"]] if manifest["base"] else []) + [
+        blob.name for blob in pending
+    ]
+
+    def download(blob_name: str) -> bytes:
+        return bucket.blob(blob_name).download_as_bytes()
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        contents = list(executor.map(download, blob_names))
+
+    frames = []
+    for blob_name, data in zip(blob_names, contents):
+        if blob_name.endswith("/embeddings.json"):
+            frames.append(_decode_legacy(data))
+        elif "/tombstones/" in blob_name:
+            file_name = json.loads(data)["file_name"]
+            frames = [frame[frame["file_name"] != file_name] for frame in frames]
+        else:
+            frames.append(decode_segment(data))
+
+    if not blob_names:
+        return None, manifest, manifest_generation, pending
+
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        dataframe = pd.DataFrame(columns=STORE_COLUMNS + ["content_hash", "embedding"])
+    else:
+        dataframe = pd.concat(frames, ignore_index=True)
+        dataframe = dataframe.drop_duplicates(subset="content_hash", keep="first")
+        dataframe.reset_index(inplace=True, drop=True)
+    return dataframe, manifest, manifest_generation, pending
+
+
+def load_store(product_category: str, attempts: int = 3) -> Optional[pd.DataFrame]:
+    """Loads all stored chunks and embeddings of a category.
+
+    Segments are downloaded concurrently and merged in write order, with
+    tombstones applied to the segments written before them.
+
+    Args:
+        product_category: The product category.
+        attempts: Number of tries if a compaction removes objects mid-read.
+
+    Returns:
+        A DataFrame with the STORE_COLUMNS, "content_hash" and "embedding"
+        columns, or None if the category has no stored embeddings.
+    """
+    for attempt in range(attempts):
+        try:
+            return _load_state(product_category)[0]
+        except NotFound:
+            if attempt == attempts - 1:
+                raise
+            logging.info("Store of %s changed during read, retrying", product_category)
+    return None
+
+
+def _upload_segment(segment_name: str, dataframe: pd.DataFrame) -> None:
+    # The hash index is written first, so every segment has one once it is
+    # visible. An index without its segment is never read.
+    bucket.blob(_hashes_name(segment_name)).upload_from_string(
+        encode_hashes(dataframe),
+        content_type="application/json",
+        if_generation_match=0,
+    )
+    bucket.blob(segment_name).upload_from_string(
+        encode_segment(dataframe),
+        content_type="application/octet-stream",
+        if_generation_match=0,
+    )
+
+
+def _load_content_hashes(product_category: str) -> set[str]:
+    manifest, _ = _read_manifest(product_category)
+    pending = _list_pending(product_category, manifest)
+    blob_names = ([manifest["base"]] if manifest["base"] else []) + [
+        blob.name for blob in pending
+    ]
+
+    def download(blob_name: str) -> dict:
+        if blob_name.endswith("/embeddings.json"):
+            data = bucket.blob(blob_name).download_as_bytes()
+            return json.loads(encode_hashes(_decode_legacy(data)))
+        if "/tombstones/" in blob_name:
+            return json.loads(bucket.blob(blob_name).download_as_bytes())
+        try:
+            return json.loads(bucket.blob(_hashes_name(blob_name)).download_as_bytes())
+        except NotFound:
+            # Segment written before hash indexes existed
+            data = bucket.blob(blob_name).download_as_bytes()
+            return json.loads(encode_hashes(decode_segment(data)))
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        contents = list(executor.map(download, blob_names))
+
+    hashes_by_file: dict[str, set[str]] = {}
+    for blob_name, data in zip(blob_names, contents):
+        if "/tombstones/" in blob_name:
+            hashes_by_file.pop(data["file_name"], None)
+        else:
+            for file_name, hashes in data.items():
+                hashes_by_file.setdefault(file_name, set()).update(hashes)
+    return set().union(*hashes_by_file.values())
+
+
+def load_content_hashes(product_category: str, attempts: int = 3) -> set[str]:
+    """Loads the content hashes of all stored chunks of a category.
+
+    Only the hash index of each segment and the tombstones are downloaded,
+    so the cost does not depend on the size of the stored embeddings.
+
+    Args:
+        product_category: The product category.
+        attempts: Number of tries if a compaction removes objects mid-read.
+
+    Returns:
+        The content hashes of the stored chunks.
+    """
+    for attempt in range(attempts):
+        try:
+            return _load_content_hashes(product_category)
+        except NotFound:
+            if attempt == attempts - 1:
+                raise
+            logging.info("Store of %s changed during read, retrying", product_category)
+    return set()
+
+
+def append_segment(
+    product_category: str,
+    dataframe: pd.DataFrame,
+    existing_hashes: Iterable[str] = (),
+) -> int:
+    """Appends chunks and their embeddings to the store as a new segment.
+
+    Chunks already in existing_hashes, or repeated within dataframe, are
+    skipped.
+
+    Args:
+        product_category: The product category.
+        dataframe: Chunks with the STORE_COLUMNS and "embedding" columns.
+        existing_hashes: Content hashes of the chunks already stored.
+
+    Returns:
+        The number of chunks written.
+    """
+    dataframe = dataframe.copy()
+    if "embedding" not in dataframe:
+        dataframe["embedding"] = None
+    if "content_hash" not in dataframe:
+        dataframe["content_hash"] = dataframe["content"].map(get_content_hash)
+    dataframe = dataframe.drop_duplicates(subset="content_hash", keep="first")
+    dataframe = dataframe[~dataframe["content_hash"].isin(set(existing_hashes))]
+    if dataframe.empty:
+        return 0
+
+    _upload_segment(_new_object_name(product_category, "segments", ".npz"), dataframe)
+    maybe_compact_in_background(product_category)
+    return len(dataframe)
+
+
+def delete_file(product_category: str, file_name: str) -> None:
+    """Removes the chunks of a file from the store by writing a tombstone.
+
+    Args:
+        product_category: The product category.
+        file_name: The name of the file whose chunks to remove.
+    """
+    blob = bucket.blob(_new_object_name(product_category, "tombstones", ".json"))
+    blob.upload_from_string(
+        json.dumps({"file_name": file_name}),
+        content_type="application/json",
+        if_generation_match=0,
+    )
+    maybe_compact_in_background(product_category)
+
+
+def compact_store(product_category: str) -> bool:
+    """Merges the base segment, pending segments and tombstones into one.
+
+    The manifest is swapped with a generation precondition, so a concurrent
+    compaction loses cleanly instead of dropping segments. Appends that land
+    during compaction are not listed in the manifest and stay pending.
+
+    Args:
+        product_category: The product category.
+
+    Returns:
+        True if the store was compacted.
+    """
+    dataframe, manifest, manifest_generation, pending = _load_state(product_category)
+    if dataframe is None or not pending:
+        return False
+
+    base_name = _new_object_name(product_category, "segments", ".npz")
+    _upload_segment(base_name, dataframe)
+
+    # Objects covered by an earlier compaction but not deleted yet are kept in
+    # the manifest until they are gone.
+    leftovers = [
+        blob_name
+        for blob_name in manifest["covers"]
+        if bucket.get_blob(blob_name) is not None
+    ]
+    obsolete_segments = [blob.name for blob in pending] + (
+        [manifest["base"]] if manifest["base"] else []
+    )
+    # Segments take their hash indexes with them
+    obsolete = obsolete_segments + [
+        _hashes_name(blob_name)
+        for blob_name in obsolete_segments
+        if "/segments/" in blob_name
+    ]
+    new_manifest = {"base": base_name, "covers": sorted(set(leftovers + obsolete))}
+
+    try:
+        bucket.blob(
+            f"{_store_prefix(product_category)}manifest.json"
+        ).upload_from_string(
+            json.dumps(new_manifest),
+            content_type="application/json",
+            if_generation_match=manifest_generation,
+        )
+    except PreconditionFailed:
+        for blob_name in (base_name, _hashes_name(base_name)):
+            bucket.blob(blob_name).delete()
+        return False
+
+    for blob_name in new_manifest["covers"]:
+        try:
+            bucket.blob(blob_name).delete()
+        except NotFound:
+            pass
+
+    logging.info(
+        "Compacted %d objects of %s into %s", len(pending), product_category, base_name
+    )
+    return True
+
+
+def maybe_compact_in_background(
+    product_category: str, min_objects: int = COMPACTION_MIN_OBJECTS
+) -> None:
+    """Starts a background compaction if enough segments are pending.
+
+    At most one compaction per category runs in this process at a time.
+
+    Args:
+        product_category: The product category.
+        min_objects: Number of pending segments and tombstones needed.
+    """
+    manifest, _ = _read_manifest(product_category)
+    if len(_list_pending(product_category, manifest)) < min_objects:
+        return
+
+    with _compaction_lock:
+        if product_category in _compacting_categories:
+            return
+        _compacting_categories.add(product_category)
+
+    def compact() -> None:
+        try:
+            compact_store(product_category)
+        except Exception:
+            logging.exception("Compaction of %s failed", product_category)
+        finally:
+            with _compaction_lock:
+                _compacting_categories.discard(product_category)
+
+    threading.Thread(target=compact, daemon=True).start()
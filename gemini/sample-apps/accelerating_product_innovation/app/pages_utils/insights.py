@@ -8,11 +8,11 @@ relevant information from uploaded data.
     * Presents the answer along with top-matched context sources.
 """
 
-import json
 import os
 import re
 from typing import Optional
 
+from app.pages_utils import embedding_store
 from app.pages_utils.embedding_model import embedding_model_with_backoff
 from app.pages_utils.get_llm_response import generate_gemini
 from app.pages_utils.pages_config import GLOBAL_CFG
@@ -77,19 +77,109 @@ def get_suggestions(state_key: str) -> None:
     st.session_state[state_key] = extract_bullet_points(gen_suggestions)
 
 
+class CategoryVectorIndex:
+    """In-memory vector index over the stored embeddings of a product category.
+
+    Embeddings are kept as one contiguous float32 matrix so a query is a single
+    matrix-vector product, and the top-k rows are selected with a partial sort
+    instead of sorting every score.
+    """
+
+    def __init__(
+        self, dataframe: pd.DataFrame, store_version: Optional[tuple] = None
+    ) -> None:
+        """Builds the index from a dataframe with an "embedding" column.
+
+        Args:
+            dataframe: The stored embeddings dataframe. Rows without an
+                embedding score 0 for every query.
+            store_version: The embedding_store.get_store_version() the
+                dataframe was loaded at, if any.
+        """
+        self.store_version = store_version
+        self.dataframe = dataframe.reset_index(drop=True)
+        embeddings = self.dataframe["embedding"].tolist()
+        dimensions = next((len(row) for row in embeddings if row is not None), 0)
+
+        self.matrix = np.zeros((len(embeddings), dimensions), dtype=np.float32)
+        for position, row in enumerate(embeddings):
+            if row is not None:
+                self.matrix[position] = row
+
+    def search(self, query_vector: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        """Finds the k rows with the highest dot product with query_vector.
+
+        Args:
+            query_vector: The query embedding.
+            k: The number of rows to return.
+
+        Returns:
+            A tuple of row positions and their scores, best match first.
+        """
+        scores = self.matrix @ np.asarray(query_vector, dtype=np.float32).ravel()
+        k = min(k, len(scores))
+        if k <= 0:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.float32)
+
+        top_k = np.argpartition(-scores, k - 1)[:k]
+        top_k = top_k[np.argsort(-scores[top_k])]
+        return top_k, scores[top_k]
+
+
+@st.cache_resource(max_entries=16, show_spinner=False)
+def load_category_index(
+    product_category: str, store_version: tuple
+) -> Optional[CategoryVectorIndex]:
+    """Loads and indexes the stored embeddings of a product category.
+
+    The index is cached per process and shared by every Streamlit session.
+    The store version is part of the cache key, so new uploads are picked
+    up on the next call.
+
+    Args:
+        product_category: The product category to load.
+        store_version: The category's embedding_store.get_store_version().
+
+    Returns:
+        The category's vector index.
+    """
+    embedding_dataframe = embedding_store.load_store(product_category)
+    if embedding_dataframe is None:
+        return None
+    return CategoryVectorIndex(embedding_dataframe, store_version)
+
+
+def get_category_index() -> Optional[CategoryVectorIndex]:
+    """Returns the vector index of the current product category.
+
+    Only object metadata is fetched on each call; the embeddings are
+    downloaded again only when the category's store has changed.
+
+    Returns:
+        The category's vector index, or None if no embeddings are stored.
+    """
+    store_version = embedding_store.get_store_version(st.session_state.product_category)
+    if store_version is None:
+        return None
+    return load_category_index(st.session_state.product_category, store_version)
+
+
 def get_stored_embeddings_as_df() -> Optional[pd.DataFrame]:
     """Retrieves and processes stored embeddings from cloud storage.
 
+    The cached index is shared by every session, so each session gets its
+    own copy of the dataframe.
+
     Returns:
         A Pandas DataFrame containing the embeddings, or None if not found.
     """
-    embedding = bucket.blob(st.session_state.product_category + "/embeddings.json")
+    index = get_category_index()
 
-    if embedding.exists():
-        stored_embedding_data = embedding.download_as_string()
-        embedding_dataframe = pd.DataFrame.from_dict(json.loads(stored_embedding_data))
-        st.session_state["processed_data_list"] = embedding_dataframe
-        return embedding_dataframe
+    if index is not None:
+        st.session_state["vector_index"] = index
+        st.session_state["processed_data_list"] = index.dataframe.copy()
+        st.session_state["processed_data_version"] = index.store_version
+        return st.session_state["processed_data_list"]
 
     return None
 
@@ -112,28 +202,25 @@ def get_filter_context_from_vector_database(
     st.session_state["query_vectors"] = np.array(
         embedding_model_with_backoff([question])
     )
-    top_matched_score = (
-        st.session_state["processed_data_list"]["embedding"]
-        .apply(
-            lambda row: (
-                np.dot(row, st.session_state["query_vectors"]) if row is not None else 0
-            )
+    index = st.session_state.get("vector_index")
+    processed_data_version = st.session_state.get("processed_data_version")
+    if index is None or index.store_version != processed_data_version:
+        index = CategoryVectorIndex(
+            st.session_state["processed_data_list"], processed_data_version
         )
-        .sort_values(ascending=False)[:sort_index_value]
-    )
+        st.session_state["vector_index"] = index
 
-    top_matched_df = st.session_state["processed_data_list"][
-        st.session_state["processed_data_list"].index.isin(top_matched_score.index)
-    ]
-    top_matched_df = top_matched_df[["file_name", "chunk_number", "content"]]
-    top_matched_df["confidence_score"] = top_matched_score
-    top_matched_df.sort_values(by=["confidence_score"], ascending=False, inplace=True)
-
-    context = "\n".join(
-        st.session_state["processed_data_list"][
-            st.session_state["processed_data_list"].index.isin(top_matched_score.index)
-        ]["content"].values
+    positions, scores = index.search(
+        st.session_state["query_vectors"], sort_index_value
     )
+
+    # Keep the matches in document order for the context, as before
+    context = "\n".join(index.dataframe["content"].values[np.sort(positions)])
+
+    top_matched_df = index.dataframe.iloc[positions][
+        ["file_name", "chunk_number", "content"]
+    ].copy()
+    top_matched_df["confidence_score"] = scores
     return (context, top_matched_df)
 
 
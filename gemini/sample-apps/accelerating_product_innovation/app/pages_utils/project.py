@@ -15,10 +15,10 @@ import logging
 import os
 from typing import Any
 
+from app.pages_utils import embedding_store
 from app.pages_utils.pages_config import GLOBAL_CFG
 from dotenv import load_dotenv
 from google.cloud import storage
-import pandas as pd
 import streamlit as st
 
 load_dotenv()
@@ -45,11 +45,8 @@ def list_pdf_files_gcs() -> list[list[Any]]:
         list[list[Any]]: A list of tuples of the blob name and the file
         extension.
     """
-    project_embedding = bucket.blob(
-        f"{st.session_state.product_category}/embeddings.json"
-    )
     files = []
-    if project_embedding.exists():
+    if embedding_store.store_exists(st.session_state.product_category):
         file_list = bucket.list_blobs(prefix=f"{st.session_state.product_category}/")
         for file in file_list:
             _, file_extension = os.path.splitext(file.name)
@@ -107,20 +104,5 @@ def delete_file_from_gcs(file_name: str) -> None:
     deleted_file_blob = bucket.blob(f"{st.session_state.product_category}/{file_name}")
     deleted_file_blob.delete()
 
-    # Load embeddings of the project
-    project_embeddings = bucket.blob(
-        st.session_state.product_category + "/embeddings.json"
-    )
-    stored_embedding_data = project_embeddings.download_as_string()
-    embeddings_df = pd.DataFrame.from_dict(json.loads(stored_embedding_data))
-
     # Remove deleted file from project embeddings.
-    embeddings_df = embeddings_df.drop(
-        embeddings_df[embeddings_df["file_name"] == file_name].index
-    )
-    embeddings_df.reset_index(inplace=True, drop=True)
-
-    # Update embeddings in GCS.
-    bucket.blob(
-        f"{st.session_state.product_category}/embeddings.json"
-    ).upload_from_string(embeddings_df.to_json(), "application/json")
+    embedding_store.delete_file(st.session_state.product_category, file_name)
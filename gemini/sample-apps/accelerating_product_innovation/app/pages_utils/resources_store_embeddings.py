@@ -6,21 +6,23 @@ and managing data within the Google Cloud Storage (GCS) bucket.
 This module:
     * Parses different file formats (CSV, text, Word, PDF), extracts
       text, splits it into chunks, and creates data packets.
-    * Leverages `embedding_model_with_backoff` to embed text chunks.
+    * Leverages `embedding_model_batch_with_backoff` to embed text chunks.
     * Uploads processed data packets to a GCS bucket.
     * Stores embeddings alongside their associated metadata.
 """
 
 import asyncio
+import base64
 import json
 import logging
 import os
+import random
 from typing import Any
 
 from PyPDF2 import PdfReader
 import aiohttp as cloud_function_call
-from app.pages_utils import insights
-from app.pages_utils.embedding_model import embedding_model_with_backoff
+from app.pages_utils import embedding_store
+from app.pages_utils.embedding_model import embedding_model_batch_with_backoff
 from app.pages_utils.pages_config import GLOBAL_CFG
 import docx
 from dotenv import load_dotenv
@@ -35,6 +37,13 @@ load_dotenv()
 PROJECT_ID = os.getenv("PROJECT_ID")
 LOCATION = os.getenv("LOCATION")
 
+# URL of the text-embedding cloud function. Point it at a local
+# functions-framework server to benchmark the ingest path.
+TEXT_EMBEDDING_URL = os.getenv(
+    "TEXT_EMBEDDING_URL",
+    f"https://us-central1-{PROJECT_ID}.cloudfunctions.net/text-embedding",
+)
+
 logging.basicConfig(format="%(levelname)s:%(message)s", level=logging.DEBUG)
 
 # Define storage bucket
@@ -105,134 +114,234 @@ def chunk_and_store_data(
     return final_data
 
 
-async def add_embedding_col(pdf_data: pd.DataFrame) -> pd.DataFrame:
+async def add_embedding_col(
+    pdf_data: pd.DataFrame,
+    session: cloud_function_call.ClientSession,
+    max_retries: int = 5,
+) -> pd.DataFrame:
     """Adds an 'embedding' column to the PDF data.
 
-    This function adds an 'embedding' column to the PDF data.
-    It uses the 'apply' function to apply the 'generate_embeddings' function
-    to each row of the 'content' column and returns the resulting DataFrame.
+    This function sends the 'content' column to the text-embedding cloud
+    function, asking for float32 binary embeddings, and adds them as the
+    'embedding' column. Requests rejected with 429 are retried with
+    exponential backoff.
 
     Args:
         pdf_data (pd.DataFrame): The PDF data.
-        ti (int): The task index.
+        session (aiohttp.ClientSession): Session shared by all requests.
+        max_retries (int): Retries after a 429 response.
 
     Returns:
         pd.DataFrame: The PDF data with the 'embedding' column.
+
+    Raises:
+        aiohttp.ClientResponseError: If the request still fails after the
+            retries.
     """
     # Make request data payload
-    pdf_content = json.dumps({"pdf_data": pdf_data["content"].to_json()})
-
-    async with cloud_function_call.ClientSession() as session:
-        # URL for cloud function.
-        url = f"""https://us-central1-{PROJECT_ID}.cloudfunctions.net/text-embedding"""
+    pdf_content = json.dumps(
+        {
+            "pdf_data": dict(enumerate(pdf_data["content"])),
+            "encoding": "float32_base64",
+        }
+    )
 
+    for attempt in range(max_retries + 1):
         # Call cloud function to generate embeddings with data and headers.
         async with session.post(
-            url,
+            TEXT_EMBEDDING_URL,
             data=pdf_content,
             headers=st.session_state.headers,
             verify_ssl=False,
         ) as embedding_response:
-            # Process cloud function Response
-            if embedding_response.status == 200:
-                response = await embedding_response.text()  # Read response
-                # Extract text embeddings and convert to pd.Series.
-                text_embeddings = pd.Series(json.loads(response)["embedding_column"][0])
-                # Add embedding column
-                pdf_data["embedding"] = text_embeddings
+            if embedding_response.status == 429 and attempt < max_retries:
+                retry_after = embedding_response.headers.get("Retry-After", "")
+                delay = (
+                    float(retry_after)
+                    if retry_after.isdigit()
+                    else 2**attempt + random.random()
+                )
+                logging.info("Embedding request throttled, retrying in %.1fs", delay)
+                await asyncio.sleep(delay)
+                continue
+
+            # Raise on failures, so chunks without embeddings are never stored
+            embedding_response.raise_for_status()
+            response = json.loads(await embedding_response.text())
+            pdf_data["embedding"] = decode_embeddings(response, pdf_data.index)
+            return pdf_data
 
     return pdf_data
 
 
-async def process_rows(df: pd.DataFrame, filename: str, header: list) -> pd.DataFrame:
+def decode_embeddings(response: dict, index: pd.Index) -> pd.Series:
+    """Decodes a text-embedding cloud function response.
+
+    Args:
+        response (dict): The parsed response, either float32 base64 or the
+            nested JSON lists returned in batches.
+        index (pd.Index): Index of the rows the embeddings belong to.
+
+    Returns:
+        pd.Series: One embedding per row.
+    """
+    if response.get("encoding") == "float32_base64":
+        matrix = np.frombuffer(
+            base64.b64decode(response["embeddings"]), dtype="<f4"
+        ).reshape(response["count"], response["dimensions"])
+        return pd.Series(list(matrix), index=index)
+
+    text_embeddings = [
+        embedding for batch in response["embedding_column"] for embedding in batch
+    ]
+    return pd.Series(text_embeddings, index=index)
+
+
+def serialize_rows(df: pd.DataFrame, header: list) -> pd.Series:
+    """Serializes each row of a DataFrame to text, one column at a time.
+
+    Every row becomes "<header> is <value>. " for each column, in column
+    order. Building the text with vectorized string operations per column
+    avoids indexing every cell individually.
+
+    Args:
+        df (pd.DataFrame): The rows to serialize.
+        header (list): The header of the file, one name per column.
+
+    Returns:
+        pd.Series: The text of each row, with the same index as df.
+    """
+    content = pd.Series("", index=df.index, dtype=object)
+    for j, head in enumerate(header):
+        # numpy formats values like str(), including "nan" for missing ones
+        values = df.iloc[:, j].to_numpy().astype(str).astype(object)
+        content = content + f"{head} is " + values + ". "
+    return content
+
+
+def process_rows(
+    df: pd.DataFrame, filename: str, header: list, start: int = 0
+) -> pd.DataFrame:
     """Processes the rows.
 
-    This function processes the rows.
-    It iterates over the rows of the DataFrame and creates a data packet for
-    each row.
-    It then returns a DataFrame with the data packets.
+    This function creates a data packet for each row of the DataFrame and
+    returns a DataFrame with the data packets.
 
     Args:
         df (pd.DataFrame): The DataFrame to process.
         filename (str): The name of the file.
         header (list): The header of the file.
+        start (int): Position of the first row of df in the file.
 
     Returns:
         pd.DataFrame: A DataFrame with the data packets.
     """
-    final_data = []
-    last_index = len(df)
-    for i in range(last_index):
-        chunk_content = ""
-        for j, head in enumerate(header):
-            chunk_content += f"{head} is {df.iloc[[i], [j]].squeeze()}. "
-        data_packet = {}
-        data_packet["file_name"] = filename
-        data_packet["chunk_number"] = str(i + 1)
-        data_packet["content"] = chunk_content
-
-        final_data.append(data_packet)
-    pdf_data = pd.DataFrame.from_dict(final_data)
+    content = serialize_rows(df, header)
+    pdf_data = pd.DataFrame(
+        {
+            "file_name": filename,
+            "chunk_number": [str(i) for i in range(start + 1, start + len(df) + 1)],
+            "content": content.to_numpy(),
+        }
+    )
+    pdf_data["content_hash"] = pdf_data["content"].map(embedding_store.get_content_hash)
     return pdf_data
 
 
 async def csv_processing(
     df: pd.DataFrame,
     header: list,
-    embeddings_df: pd.DataFrame,
+    existing_hashes: set[str],
     file: str,
+    rows_per_block: int = 10_000,
+    rows_per_request: int = 100,
+    max_concurrent_requests: int = 8,
 ) -> None:
     """Processes the CSV file.
 
-    This function processes the CSV file.
-    It splits the DataFrame into chunks and processes each chunk in parallel.
-    It then concatenates the results and uploads the resulting DataFrame to
-    the GCS bucket.
+    This function serializes the CSV rows in blocks on a worker thread and
+    streams them to the embedding cloud function as they are ready, over
+    one shared session with a semaphore bounding the requests in flight, so
+    embedding is the only bottleneck. It then appends the results to the
+    project embeddings in the GCS bucket.
+
+    Rows whose embedding request failed are left out of the stored segment
+    and reported to the user, so uploading the file again retries them.
 
     Args:
         df (pd.DataFrame): The DataFrame to process.
         header (list): The header of the file.
-        embeddings_df (pd.DataFrame): The DataFrame with the stored embeddings.
+        existing_hashes (set[str]): Content hashes of the stored chunks.
         file (str): The name of the file.
+        rows_per_block (int): Rows serialized per worker thread call.
+        rows_per_request (int): Rows sent per embedding request.
+        max_concurrent_requests (int): Embedding requests in flight at once.
     """
-    pdf_data = pd.DataFrame()
-    df_size = len(df)
-    chunk_size = 100  # Default chunk size if df_size is below all thresholds
-    chunk_sizes = {
-        1_000_000: 100_000,
-        100_000: 10_000,
-        10_000: 1_000,
-    }
-    for threshold, size in chunk_sizes.items():
-        if df_size > threshold:
-            chunk_size = size
-
-    chunks = np.array_split(df, chunk_size)
-
-    # Parallel processing in stages
-    processed_chunks = await asyncio.gather(
-        *(process_rows(chunk, file, header) for _, chunk in enumerate(chunks))
-    )
-    typed_chunks = await asyncio.gather(
-        *(
-            asyncio.to_thread(
-                chunk.assign(types=[type(x) for x in chunk["content"]]), chunk
+    seen_hashes = set(existing_hashes)
+    semaphore = asyncio.Semaphore(max_concurrent_requests)
+    tasks = {}
+    chunk_rows = {}
+
+    async def embed(chunk: pd.DataFrame) -> pd.DataFrame:
+        try:
+            return await add_embedding_col(chunk, session)
+        finally:
+            semaphore.release()
+
+    async with cloud_function_call.ClientSession() as session:
+        for start in range(0, len(df), rows_per_block):
+            block = await asyncio.to_thread(
+                process_rows,
+                df.iloc[start : start + rows_per_block],
+                file,
+                header,
+                start,
             )
-            for chunk in processed_chunks
+            # Skip rows that are already stored or repeated in this file
+            block = block[~block["content_hash"].isin(seen_hashes)]
+            block = block.drop_duplicates(subset="content_hash", keep="first")
+            seen_hashes.update(block["content_hash"])
+            block = block.reset_index(drop=True)
+
+            for request_start in range(0, len(block), rows_per_request):
+                chunk = block.iloc[request_start : request_start + rows_per_request]
+                # Wait for a free slot before sending, so serialization
+                # never runs far ahead of embedding
+                await semaphore.acquire()
+                tasks[start + request_start] = asyncio.create_task(
+                    embed(chunk.reset_index(drop=True))
+                )
+                chunk_rows[start + request_start] = len(chunk)
+
+        results = await asyncio.gather(*tasks.values(), return_exceptions=True)
+
+    embedded_chunks = {}
+    failed_rows = 0
+    for position, result in zip(tasks, results):
+        if isinstance(result, Exception):
+            logging.error("Embedding request failed: %s", result)
+            failed_rows += chunk_rows[position]
+        else:
+            embedded_chunks[position] = result
+
+    if failed_rows:
+        st.error(
+            f"Could not create embeddings for {failed_rows} rows of {file}. "
+            "Upload the file again to retry them."
         )
-    )
-    embedded_chunks = await asyncio.gather(
-        *(add_embedding_col(chunk) for chunk in typed_chunks)
-    )
 
-    # Combine, merge, deduplicate, and upload
-    pdf_data = pd.concat(embedded_chunks + [embeddings_df])
-    pdf_data = pdf_data.drop_duplicates(subset="content", keep="first").reset_index(
-        drop=True
+    if not embedded_chunks:
+        return
+
+    # Append the new chunks as a segment
+    embedding_store.append_segment(
+        st.session_state.product_category,
+        pd.concat(
+            [embedded_chunks[position] for position in sorted(embedded_chunks)],
+            ignore_index=True,
+        ),
+        existing_hashes=existing_hashes,
     )
-    bucket.blob(
-        f"{st.session_state.product_category}/embeddings.json"
-    ).upload_from_string(pdf_data.to_json(), "application/json")
 
 
 def load_file_content(
@@ -301,7 +410,10 @@ def create_and_store_embeddings(uploaded_file: UploadedFile) -> None:
             f"{st.session_state.product_category}/{uploaded_file.name}"
         )
 
-        embeddings_df = insights.get_stored_embeddings_as_df()
+        # Only the stored content hashes are needed to skip known chunks.
+        existing_hashes = embedding_store.load_content_hashes(
+            st.session_state.product_category
+        )
         final_data = []
 
         # Processing for csv/text files.
@@ -323,7 +435,7 @@ def create_and_store_embeddings(uploaded_file: UploadedFile) -> None:
             # to the GCS bucket.
             with st.spinner("Processing csv...this might take some time..."):
                 asyncio.run(
-                    csv_processing(df, header, embeddings_df, uploaded_file.name)
+                    csv_processing(df, header, existing_hashes, uploaded_file.name)
                 )
             return
 
@@ -341,22 +453,22 @@ def create_and_store_embeddings(uploaded_file: UploadedFile) -> None:
             pdf_data = pd.DataFrame.from_dict(final_data)
             pdf_data.reset_index(inplace=True, drop=True)
 
-            # Add datatype column to df.
-            pdf_data["types"] = [type(x) for x in pdf_data["content"]]
-
-            # Add embedding column to df for text embeddings.
-            pdf_data["embedding"] = pdf_data["content"].apply(
-                lambda x: embedding_model_with_backoff([x])
+            # Skip chunks that are already stored before embedding them.
+            pdf_data["content_hash"] = pdf_data["content"].map(
+                embedding_store.get_content_hash
             )
-            pdf_data["embedding"] = pdf_data.embedding.apply(np.array)
+            pdf_data = pdf_data[~pdf_data["content_hash"].isin(existing_hashes)]
+            pdf_data = pdf_data.drop_duplicates(
+                subset=["content_hash"], keep="first"
+            ).reset_index(drop=True)
+            if pdf_data.empty:
+                return
 
-            # Concatenate the data of newly uploaded files with that of
-            # existing file embeddings
-            pdf_data = pd.concat([embeddings_df, pdf_data])
-            pdf_data = pdf_data.drop_duplicates(subset=["content"], keep="first")
-            pdf_data.reset_index(inplace=True, drop=True)
+            # Add embedding column to df for text embeddings, embedding all
+            # chunks in a few batched requests.
+            pdf_data["embedding"] = list(
+                embedding_model_batch_with_backoff(pdf_data["content"].tolist())
+            )
 
-            # Upload newly created embeddings to gcs
-            bucket.blob(
-                f"{st.session_state.product_category}/embeddings.json"
-            ).upload_from_string(pdf_data.to_json(), "application/json")
+            # Append the new chunks to the project embeddings in GCS.
+            embedding_store.append_segment(st.session_state.product_category, pdf_data)
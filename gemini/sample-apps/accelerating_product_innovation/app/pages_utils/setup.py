@@ -77,6 +77,8 @@ def initialize_all_session_state(reinitialize: bool = False) -> None:
         "suggestion_first_time": 1,
         "processed_data_list": [],
         "query_vectors": [],
+        "vector_index": None,
+        "processed_data_version": None,
         "embeddings_df": None,
         "temp_suggestions": None,
         "assorted_prod_title": None,
@@ -0,0 +1,65 @@
+"""
+Reports the query latency of the insights vector index on synthetic embeddings.
+
+Run from this directory, with the same environment as the app:
+
+    python -m benchmark_vector_index
+"""
+
+import time
+
+from app.pages_utils.insights import CategoryVectorIndex
+import numpy as np
+import pandas as pd
+
+
+def benchmark_vector_index(
+    corpus_sizes: tuple[int, ...] = (10_000, 100_000, 1_000_000),
+    dimensions: int = 768,
+    num_queries: int = 200,
+    k: int = 20,
+) -> pd.DataFrame:
+    """Reports p50/p99 query latency of CategoryVectorIndex by corpus size.
+
+    Uses random unit vectors, so it needs no GCS access. The 1M chunk
+    corpus takes about 3 GB of memory at 768 dimensions.
+
+    Args:
+        corpus_sizes: The numbers of chunks to index.
+        dimensions: The embedding size.
+        num_queries: The number of queries timed per corpus size.
+        k: The number of matches per query.
+
+    Returns:
+        A DataFrame with one row of latency percentiles per corpus size.
+    """
+    rng = np.random.default_rng(0)
+    results = []
+    for corpus_size in corpus_sizes:
+        index = CategoryVectorIndex(pd.DataFrame({"embedding": []}))
+        index.matrix = rng.standard_normal((corpus_size, dimensions), dtype=np.float32)
+        index.matrix /= np.linalg.norm(index.matrix, axis=1, keepdims=True)
+        queries = rng.standard_normal((num_queries, dimensions), dtype=np.float32)
+
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            index.search(query, k)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        results.append(
+            {
+                "corpus_size": corpus_size,
+                "p50_ms": float(np.percentile(latencies, 50)),
+                "p99_ms": float(np.percentile(latencies, 99)),
+            }
+        )
+        print(
+            f"{corpus_size} chunks: p50 {results[-1]['p50_ms']:.2f} ms, "
+            f"p99 {results[-1]['p99_ms']:.2f} ms"
+        )
+    return pd.DataFrame(results)
+
+
+if __name__ == "__main__":
+    benchmark_vector_index()
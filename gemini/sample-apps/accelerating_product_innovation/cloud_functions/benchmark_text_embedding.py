@@ -0,0 +1,52 @@
+"""
+Benchmarks the text-embedding cloud function against its stub model.
+
+Run from the cloud_functions directory with:
+
+    PYTHONPATH=text_embedding python benchmark_text_embedding.py
+"""
+
+import json
+import time
+
+import main
+
+
+def benchmark_generate_embeddings(
+    num_texts: int = 1000, max_workers: int = main.MAX_WORKERS
+) -> dict:
+    """
+    Compares serial and concurrent embedding, and JSON and binary response
+    sizes, against the stub model.
+
+    Args:
+        num_texts (int): Number of texts to embed.
+        max_workers (int): Model requests in flight for the concurrent run.
+
+    Returns:
+        dict: Elapsed seconds and response bytes for each variant.
+    """
+    pdf_data = {str(i): f"benchmark text {i}" for i in range(num_texts)}
+    results = {}
+    for name, workers, encoding in (
+        ("serial_json", 1, None),
+        ("concurrent_json", max_workers, None),
+        ("concurrent_binary", max_workers, main.BINARY_ENCODING),
+    ):
+        start = time.perf_counter()
+        response = main.generate_embeddings(
+            pdf_data, encoding, max_workers=workers, embed=main.get_stub_embeddings
+        )
+        results[name] = {
+            "seconds": time.perf_counter() - start,
+            "response_bytes": len(json.dumps(response)),
+        }
+        print(
+            f"{name}: {results[name]['seconds']:.2f}s, "
+            f"{results[name]['response_bytes']} response bytes"
+        )
+    return results
+
+
+if __name__ == "__main__":
+    benchmark_generate_embeddings()
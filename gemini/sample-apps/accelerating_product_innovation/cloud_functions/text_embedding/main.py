@@ -2,12 +2,20 @@
 Cloud function to generate embedding of given file.
 """
 
+import array
+import base64
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
 import json
 import os
-from typing import Any, List
+import random
+import sys
+import time
+from typing import Any, Callable, List, Optional
 
 from dotenv import load_dotenv
 import functions_framework
+from google.api_core.exceptions import ResourceExhausted
 from vertexai.preview.language_models import TextEmbeddingModel
 
 load_dotenv()
@@ -16,8 +24,54 @@ load_dotenv()
 PROJECT_ID = os.getenv("PROJECT_ID")
 LOCATION = os.getenv("LOCATION")
 
+# Texts per model request, and model requests in flight per function call.
+BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "10"))
+MAX_WORKERS = int(os.getenv("EMBEDDING_MAX_WORKERS", "8"))
 
-embedding_model = TextEmbeddingModel.from_pretrained("textembedding-gecko@003")
+# Seconds the client is asked to wait when the embedding quota is exhausted.
+RETRY_AFTER_SECONDS = int(os.getenv("EMBEDDING_RETRY_AFTER_SECONDS", "10"))
+
+# Set EMBEDDING_MODEL=stub to serve deterministic fake embeddings, e.g. to
+# benchmark the client and function locally without calling Vertex AI.
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "textembedding-gecko@003")
+STUB_DIMENSIONS = 768
+STUB_LATENCY_SECONDS = float(os.getenv("EMBEDDING_STUB_LATENCY_SECONDS", "0.1"))
+
+# Response encoding the client can ask for instead of nested JSON floats.
+BINARY_ENCODING = "float32_base64"
+
+_embedding_model = None
+
+
+def get_embedding_model() -> Any:
+    """
+    Loads the embedding model on first use and reuses it afterwards.
+    """
+    global _embedding_model
+    if _embedding_model is None:
+        _embedding_model = TextEmbeddingModel.from_pretrained(EMBEDDING_MODEL)
+    return _embedding_model
+
+
+def get_stub_embeddings(instances: list[str]) -> List[List[float]]:
+    """
+    Generates deterministic fake embeddings after a fixed delay.
+
+    Args:
+        instances (list[str]):
+            Text to convert to embeddings.
+
+    Returns:
+        embeddings (list):
+            values of embeddings.
+    """
+    time.sleep(STUB_LATENCY_SECONDS)
+    embeddings = []
+    for instance in instances:
+        seed = int.from_bytes(hashlib.sha256(instance.encode()).digest()[:8], "big")
+        generator = random.Random(seed)
+        embeddings.append([generator.uniform(-1, 1) for _ in range(STUB_DIMENSIONS)])
+    return embeddings
 
 
 def get_embeddings(instances: list[str]) -> List[List[float]]:
@@ -32,33 +86,69 @@ def get_embeddings(instances: list[str]) -> List[List[float]]:
         embeddings (list):
             values of embeddings.
     """
+    if EMBEDDING_MODEL == "stub":
+        return get_stub_embeddings(instances)
 
-    embeddings = embedding_model.get_embeddings(instances)
+    embeddings = get_embedding_model().get_embeddings(instances)
     return [embedding.values for embedding in embeddings]
 
 
-def generate_embeddings(pdf_data: dict) -> dict:
+def encode_embeddings(embeddings: List[List[float]]) -> dict:
     """
-    Extracts content from pdf_data for creating embeddings.
+    Packs embeddings into little-endian float32 bytes encoded as base64.
 
     Args:
-        pdf_data (dict): file data to be processed.
+        embeddings (list): values of embeddings.
+
+    Returns:
+        dict: The encoded embeddings with their count and dimensions.
+    """
+    values = array.array("f", (value for row in embeddings for value in row))
+    if sys.byteorder == "big":
+        values.byteswap()
+    return {
+        "encoding": BINARY_ENCODING,
+        "count": len(embeddings),
+        "dimensions": len(embeddings[0]) if embeddings else 0,
+        "embeddings": base64.b64encode(values.tobytes()).decode("ascii"),
+    }
+
+
+def generate_embeddings(
+    pdf_data: dict,
+    encoding: Optional[str] = None,
+    batch_size: int = BATCH_SIZE,
+    max_workers: int = MAX_WORKERS,
+    embed: Callable[[list[str]], List[List[float]]] = get_embeddings,
+) -> dict:
     """
-    instances = []
-    values = []
+    Extracts content from pdf_data for creating embeddings.
 
-    batch_size = 10
-    iterate = 0
+    Batches of batch_size texts are embedded concurrently, with at most
+    max_workers model requests in flight.
 
-    for content in pdf_data.values():
-        instances.append(content)
-        iterate += 1
+    Args:
+        pdf_data (dict): file data to be processed.
+        encoding (str, optional): BINARY_ENCODING for float32 base64
+            output, otherwise embeddings are returned as nested JSON lists
+            in batches of batch_size.
+        batch_size (int): Texts per model request.
+        max_workers (int): Model requests in flight.
+        embed: Function embedding a batch of texts.
+    """
+    contents = list(pdf_data.values())
+    batches = [
+        contents[start : start + batch_size]
+        for start in range(0, len(contents), batch_size)
+    ]
 
-        if iterate % batch_size == 0 or iterate == len(pdf_data):
-            embeddings = get_embeddings(instances)
-            values.append(embeddings)
+    with ThreadPoolExecutor(
+        max_workers=max(1, min(max_workers, len(batches)))
+    ) as executor:
+        values = list(executor.map(embed, batches))
 
-            instances = []
+    if encoding == BINARY_ENCODING:
+        return encode_embeddings([row for batch in values for row in batch])
 
     response_json = json.dumps({"embedding_column": values})
     response = json.loads(response_json)
@@ -66,7 +156,9 @@ def generate_embeddings(pdf_data: dict) -> dict:
 
 
 @functions_framework.http
-def get_text_embeddings(request: Any) -> tuple[dict[str, str], int]:
+def get_text_embeddings(
+    request: Any,
+) -> tuple[dict, int] | tuple[dict, int, dict[str, str]]:
     """
     Processes request for generating embeddings.
 
@@ -76,11 +168,23 @@ def get_text_embeddings(request: Any) -> tuple[dict[str, str], int]:
             headers by the calling func.
     Returns:
         embeddings (dict):
-            generated embeddings
+            generated embeddings, or a 429 with a Retry-After header
+            when the embedding quota is exhausted.
     """
     request_json = request.get_json(silent=True)
     if not request_json or "pdf_data" not in request_json:
         return {"error": "Request body must contain 'pdf_data' field."}, 400
     pdf_data = request_json["pdf_data"]
-    embeddings = generate_embeddings(pdf_data)
+    # Older clients send the content as a JSON encoded string.
+    if isinstance(pdf_data, str):
+        pdf_data = json.loads(pdf_data)
+    try:
+        embeddings = generate_embeddings(pdf_data, request_json.get("encoding"))
+    except ResourceExhausted as e:
+        # Let the client back off and retry instead of failing with a 500
+        return (
+            {"error": f"Embedding quota exhausted: {e.message}"},
+            429,
+            {"Retry-After": str(RETRY_AFTER_SECONDS)},
+        )
     return embeddings, 200
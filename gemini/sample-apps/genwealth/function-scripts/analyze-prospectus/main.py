@@ -1,61 +1,28 @@
 """Cloud Function code to analyze a prospectus"""
 
 import base64
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
 import os
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
+from alloydb_pool import get_pool
 import functions_framework
-from google.cloud.alloydb.connector import Connector
 from langchain_core.prompts import PromptTemplate
 from langchain_google_vertexai import VertexAI
 import sqlalchemy
 
 
-# Triggered from a message on a Cloud Pub/Sub topic.
-@functions_framework.cloud_event
-def analyze_prospectus(cloud_event):
-    """Function to analyze prospectus"""
-    # Print out the data from Pub/Sub, to prove that it worked
-    ticker = base64.b64decode(cloud_event.data["message"]["data"])
-    ticker = ticker.decode("utf-8")
-    print(ticker)
-
-    # Environment Vars
-    region = os.environ["REGION"]
-    project_id = os.environ["PROJECT_ID"]
-
-    # AlloyDB Vars
-    cluster = "alloydb-cluster"
-    instance = "alloydb-instance"
-    database = "ragdemos"
-    table_name = "langchain_vector_store"
-    user = "postgres"
-    password = os.environ["ALLOYDB_PASSWORD"]
-
-    # Setup sync connector
-    connector = Connector()
-
-    def getconn():
-        conn = connector.connect(
-            f"projects/{project_id}/locations/{region}/clusters/{cluster}/instances/{instance}",
-            "pg8000",
-            user=user,
-            password=password,
-            db=database,
-        )
-        return conn
-
-    # create connection pool
-    pool = sqlalchemy.create_engine(
-        "postgresql+pg8000://",
-        creator=getconn,
-    )
+# Average number of characters of prospectus text sent to the model per
+# request. Windows are between half and one and a half times this long.
+WINDOW_CHARACTERS = 50000
 
-    # Prep SQL statement
-    sql = f"SELECT content FROM {table_name} WHERE ticker = '{ticker}' ORDER BY page, page_chunk"
+# Window summaries from earlier runs, so re-ingested prospectuses only
+# re-summarize the windows whose text changed
+SUMMARY_TABLE = "prospectus_window_summaries"
 
-    # Prep model and template
-    model = VertexAI(model_name="gemini-pro", max_output_tokens=1024, temperature=0.0)
-    template = """
+REFINE_TEMPLATE = """
 <MISSION>
  You are an experienced financial analyst. Your mission is to create a detailed
  company financial overview for {ticker} using their latest prospectus. I will be
@@ -78,51 +45,328 @@ def analyze_prospectus(cloud_event):
 {chunk_text}
 </ADDITIONAL_CONTEXT>"""
 
-    prompt = PromptTemplate.from_template(template)
+MAP_TEMPLATE = """
+<MISSION>
+ You are an experienced financial analyst. Your mission is to create a detailed
+ company financial overview for {ticker} using their latest prospectus. There are
+ a total of {total_chunk_count} prospectus chunks, and I am sending you prospectus
+ chunk numbers {first_chunk}-{last_chunk} as part of this request.
+</MISSION>
 
-    # Create overview of full document by iterating through chunks
-    with pool.connect() as db_conn:
-        # query database
-        result = db_conn.execute(sqlalchemy.text(sql)).fetchall()
+<TASK>
+ Use the prospectus chunks labeled <CONTEXT> below to write a financial overview
+ of {ticker}. Respond using less than 4000 characters, including whitespace.
+</TASK>
 
-        # commit transaction (SQLAlchemy v2.X.X is commit as you go)
-        db_conn.commit()
+<CONTEXT>
+{chunk_text}
+</CONTEXT>"""
+
+REDUCE_TEMPLATE = """
+<MISSION>
+ You are an experienced financial analyst. Your mission is to create a detailed
+ company financial overview for {ticker} using their latest prospectus.
+</MISSION>
 
-        # Iterate through results
-        total_chunk_count = len(result)
-        overview = ""
+<TASK>
+ Each section labeled <OVERVIEW> below is a financial overview of {ticker} written
+ from a different part of the prospectus, in prospectus order. Combine them into a
+ single financial overview that keeps the most important details from each.
+ Respond using less than 4000 characters, including whitespace.
+</TASK>
+
+{overviews}"""
+
+
+def is_window_boundary(content: str, boundary_characters: int) -> bool:
+    """Returns whether a window may end after a prospectus chunk.
+
+    The decision depends only on the chunk's own text. Chunks are picked
+    with a probability proportional to their length, so a window grows by
+    boundary_characters on average before it ends.
+    """
+    digest = hashlib.sha256(content.encode("utf-8")).digest()
+    threshold = min(1.0, len(content) / boundary_characters)
+    return int.from_bytes(digest[:8], "big") < threshold * 2**64
+
+
+def iter_windows(
+    rows: Iterable, window_characters: int = WINDOW_CHARACTERS
+) -> Iterator[Tuple[int, int, str]]:
+    """Groups prospectus chunks into windows of about window_characters.
+
+    Windows end at content-defined boundaries instead of after a fixed
+    number of characters, so an edit to one chunk only changes the windows
+    around it, and the others keep their hashes and stored summaries.
+
+    Rows are consumed lazily, so a server-side cursor can be passed in.
+    Yields (first_chunk, last_chunk, chunk_text), with 1-based chunk numbers.
+    """
+    min_characters = window_characters // 2
+    max_characters = window_characters * 3 // 2
+    chunk_text = ""
+    first_chunk = 1
+    current_chunk = 0
+
+    for current_chunk, row in enumerate(rows, start=1):
+        # Add text to chunk_text until a boundary chunk ends the window
+        content = str(row.content)
+        chunk_text = chunk_text + content + " "
+        if len(chunk_text) < min_characters:
+            continue
+        if len(chunk_text) < max_characters and not is_window_boundary(
+            content, window_characters - min_characters
+        ):
+            continue
+
+        yield first_chunk, current_chunk, chunk_text
+
+        # Reset first_chunk and chunk_text values
+        first_chunk = current_chunk + 1
         chunk_text = ""
-        first_chunk = 1
-        last_chunk = 1
 
-        for i in range(len(result)):
-            current_chunk = i + 1
-            first_chunk = min(first_chunk, current_chunk)
-            last_chunk = max(last_chunk, current_chunk)
+    # Send the last, partially filled window too
+    if chunk_text:
+        yield first_chunk, current_chunk, chunk_text
+
+
+def refine_overview(
+    model: VertexAI,
+    ticker: str,
+    windows: Iterable[Tuple[int, int, str]],
+    total_chunk_count: int,
+) -> str:
+    """Folds the windows into the overview one model call at a time."""
+    prompt = PromptTemplate.from_template(REFINE_TEMPLATE)
+    overview = ""
+
+    for first_chunk, last_chunk, chunk_text in windows:
+        # Invoke the model
+        print(
+            f"Adding chunks {first_chunk} through {last_chunk} out of {total_chunk_count} to {ticker} overview..."
+        )
+        fmt_prompt = prompt.format(
+            total_chunk_count=total_chunk_count,
+            first_chunk=first_chunk,
+            last_chunk=last_chunk,
+            previous_overview=overview,
+            chunk_text=chunk_text,
+            ticker=ticker,
+        )
+
+        overview = model.invoke(fmt_prompt)
+
+    return overview
+
+
+def get_window_hash(ticker: str, chunk_text: str) -> str:
+    """Returns the hex SHA-256 identifying a window's text."""
+    return hashlib.sha256(f"{ticker}\n{chunk_text}".encode("utf-8")).hexdigest()
+
+
+def load_window_summaries(
+    db_conn: sqlalchemy.engine.Connection, ticker: str
+) -> Dict[str, str]:
+    """Returns the stored window summaries of a ticker as {window_hash: summary}."""
+    db_conn.execute(
+        sqlalchemy.text(
+            f"CREATE TABLE IF NOT EXISTS {SUMMARY_TABLE} "
+            "(ticker VARCHAR NOT NULL, window_hash CHAR(64) NOT NULL, summary TEXT NOT NULL, "
+            "PRIMARY KEY (ticker, window_hash))"
+        )
+    )
+    rows = db_conn.execute(
+        sqlalchemy.text(
+            f"SELECT window_hash, summary FROM {SUMMARY_TABLE} WHERE ticker = :ticker"
+        ),
+        parameters={"ticker": ticker},
+    )
+    return {window_hash: summary for window_hash, summary in rows}
+
+
+def save_window_summaries(
+    db_conn: sqlalchemy.engine.Connection,
+    ticker: str,
+    window_summaries: Dict[str, str],
+    stored_hashes: Iterable[str] = (),
+) -> None:
+    """Replaces the stored window summaries of a ticker with window_summaries.
 
-            # Add text to chunk_text until token window is full
-            chunk_text = chunk_text + str(result[i].content) + " "
-            if len(chunk_text) < 50000:
+    Only rows that are not already in stored_hashes are inserted.
+    """
+    db_conn.execute(
+        sqlalchemy.text(
+            f"DELETE FROM {SUMMARY_TABLE} WHERE ticker = :ticker "
+            "AND NOT (window_hash = ANY(CAST(:hashes AS VARCHAR[])))"
+        ),
+        parameters={"ticker": ticker, "hashes": list(window_summaries)},
+    )
+
+    stored_hashes = set(stored_hashes)
+    for window_hash, summary in window_summaries.items():
+        if window_hash in stored_hashes:
+            continue
+        db_conn.execute(
+            sqlalchemy.text(
+                f"INSERT INTO {SUMMARY_TABLE} (ticker, window_hash, summary) "
+                "VALUES (:ticker, :window_hash, :summary) ON CONFLICT DO NOTHING"
+            ),
+            parameters={
+                "ticker": ticker,
+                "window_hash": window_hash,
+                "summary": summary,
+            },
+        )
+
+
+def map_reduce_overview(
+    model: VertexAI,
+    ticker: str,
+    windows: Iterable[Tuple[int, int, str]],
+    total_chunk_count: int,
+    max_workers: int = 8,
+    fan_in: int = 4,
+    window_summaries: Optional[Dict[str, str]] = None,
+) -> str:
+    """Summarizes the windows concurrently, then merges the partial overviews
+    fan_in at a time until one is left.
+
+    Latency grows with the number of merge levels, i.e. the log of the
+    document length, instead of with the number of windows.
+
+    If window_summaries is given, windows whose hash is already in it are
+    not sent to the model. On return it holds exactly the summaries of this
+    document's windows, ready to be saved for the next run.
+    """
+    map_prompt = PromptTemplate.from_template(MAP_TEMPLATE)
+    reduce_prompt = PromptTemplate.from_template(REDUCE_TEMPLATE)
+
+    def merge(overviews: List[str]) -> str:
+        if len(overviews) == 1:
+            return overviews[0]
+        return model.invoke(
+            reduce_prompt.format(
+                ticker=ticker,
+                overviews="\n\n".join(
+                    f"<OVERVIEW>\n{overview}\n</OVERVIEW>" for overview in overviews
+                ),
+            )
+        )
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Bound the windows held in memory while rows are still streaming in
+        in_flight = threading.BoundedSemaphore(max_workers * 2)
+        futures = []
+        window_hashes = []
+        cached = 0
+
+        for first_chunk, last_chunk, chunk_text in windows:
+            window_hash = get_window_hash(ticker, chunk_text)
+            window_hashes.append(window_hash)
+            if window_summaries is not None and window_hash in window_summaries:
+                futures.append(None)
+                cached += 1
                 continue
 
-            # Invoke the model
             print(
-                f"Adding chunks {first_chunk} through {last_chunk} out of {total_chunk_count} to {ticker} overview..."
+                f"Summarizing chunks {first_chunk} through {last_chunk} out of {total_chunk_count} for {ticker}..."
             )
-            fmt_prompt = prompt.format(
-                total_chunk_count=total_chunk_count,
-                first_chunk=first_chunk,
-                last_chunk=last_chunk,
-                previous_overview=overview,
-                chunk_text=chunk_text,
-                ticker=ticker,
+            in_flight.acquire()
+            future = executor.submit(
+                model.invoke,
+                map_prompt.format(
+                    total_chunk_count=total_chunk_count,
+                    first_chunk=first_chunk,
+                    last_chunk=last_chunk,
+                    chunk_text=chunk_text,
+                    ticker=ticker,
+                ),
+            )
+            future.add_done_callback(lambda _: in_flight.release())
+            futures.append(future)
+
+        overviews = [
+            window_summaries[window_hash] if future is None else future.result()
+            for window_hash, future in zip(window_hashes, futures)
+        ]
+        if cached:
+            print(f"Reused {cached} of {len(overviews)} window summaries for {ticker}")
+
+        if window_summaries is not None:
+            window_summaries.clear()
+            window_summaries.update(zip(window_hashes, overviews))
+
+        while len(overviews) > 1:
+            print(f"Merging {len(overviews)} partial overviews for {ticker}...")
+            overviews = list(
+                executor.map(
+                    merge,
+                    [
+                        overviews[i : i + fan_in]
+                        for i in range(0, len(overviews), fan_in)
+                    ],
+                )
             )
 
-            overview = model.invoke(fmt_prompt)
+    return overviews[0] if overviews else ""
+
+
+# Triggered from a message on a Cloud Pub/Sub topic.
+@functions_framework.cloud_event
+def analyze_prospectus(cloud_event):
+    """Function to analyze prospectus"""
+    # Print out the data from Pub/Sub, to prove that it worked
+    ticker = base64.b64decode(cloud_event.data["message"]["data"])
+    ticker = ticker.decode("utf-8")
+    print(ticker)
+
+    # AlloyDB Vars
+    table_name = "langchain_vector_store"
+
+    # Reuse the instance-wide connection pool
+    pool = get_pool()
+
+    # Prep SQL statements
+    count_sql = f"SELECT COUNT(*) FROM {table_name} WHERE ticker = :ticker"
+    sql = f"SELECT content FROM {table_name} WHERE ticker = :ticker ORDER BY page, page_chunk"
+
+    # Prep model
+    model = VertexAI(model_name="gemini-pro", max_output_tokens=1024, temperature=0.0)
+
+    # "map_reduce" summarizes windows concurrently, "refine" folds them in one at a time
+    analysis_mode = os.environ.get("ANALYSIS_MODE", "map_reduce")
+    max_workers = int(os.environ.get("ANALYSIS_MAX_WORKERS", "8"))
+
+    # Create overview of full document by iterating through chunks
+    with pool.connect() as db_conn:
+        window_summaries = load_window_summaries(db_conn, ticker)
+        stored_hashes = set(window_summaries)
+
+        total_chunk_count = db_conn.execute(
+            sqlalchemy.text(count_sql), parameters={"ticker": ticker}
+        ).scalar()
+
+        # Stream rows through a server-side cursor instead of fetching them all
+        result = db_conn.execution_options(yield_per=100).execute(
+            sqlalchemy.text(sql), parameters={"ticker": ticker}
+        )
+        windows = iter_windows(result)
+
+        if analysis_mode == "refine":
+            overview = refine_overview(model, ticker, windows, total_chunk_count)
+        else:
+            overview = map_reduce_overview(
+                model,
+                ticker,
+                windows,
+                total_chunk_count,
+                max_workers=max_workers,
+                window_summaries=window_summaries,
+            )
+            save_window_summaries(db_conn, ticker, window_summaries, stored_hashes)
 
-            # Reset first_chunk and chunk_text values
-            first_chunk = current_chunk + 1
-            chunk_text = ""
+        # commit transaction (SQLAlchemy v2.X.X is commit as you go)
+        db_conn.commit()
 
     analysis = model.invoke(
         f"You are an experienced financial analyst. Write a financial analysis for ticker {ticker} that includes an Investment Rating (buy, sell, or hold), Investment Risk (high, medium, low), Target Investor (conservative, neutral, aggressive) and a two-paragraph analysis. Use the following company overview as context for the analysis: \n\n{overview}"
@@ -135,32 +379,56 @@ def analyze_prospectus(cloud_event):
     insert_stmt = sqlalchemy.text(
         "INSERT INTO investments (id, ticker, etf, market, rating, overview, analysis) VALUES (:id, :ticker, :etf, :market, :rating, :overview, :analysis)"
     )
+    update_stmt = sqlalchemy.text(
+        "UPDATE investments SET rating = :rating, overview = :overview, analysis = :analysis WHERE id = :id"
+    )
+
+    # Opt in to overwrite the ticker's earlier analysis instead of adding a row per run
+    replace_analysis = os.environ.get("REPLACE_ANALYSIS", "false").lower() == "true"
 
     with pool.connect() as db_conn:
-        max_id = db_conn.execute(
-            sqlalchemy.text("SELECT MAX(id) FROM investments")
-        ).fetchall()
-        new_id = max_id[0][0] + 1
-        print(new_id)
+        existing_id = None
+        if replace_analysis:
+            existing_id = db_conn.execute(
+                sqlalchemy.text(
+                    "SELECT MIN(id) FROM investments WHERE ticker = :ticker"
+                ),
+                parameters={"ticker": ticker},
+            ).scalar()
 
-        # insert into database
-        db_conn.execute(
-            insert_stmt,
-            parameters={
-                "id": new_id,
-                "ticker": ticker,
-                "etf": False,
-                "market": "US",
-                "rating": rating,
-                "overview": overview,
-                "analysis": analysis,
-            },
-        )
+        if existing_id is not None:
+            db_conn.execute(
+                update_stmt,
+                parameters={
+                    "id": existing_id,
+                    "rating": rating,
+                    "overview": overview,
+                    "analysis": analysis,
+                },
+            )
+        else:
+            max_id = db_conn.execute(
+                sqlalchemy.text("SELECT MAX(id) FROM investments")
+            ).fetchall()
+            new_id = max_id[0][0] + 1
+            print(new_id)
+
+            # insert into database
+            db_conn.execute(
+                insert_stmt,
+                parameters={
+                    "id": new_id,
+                    "ticker": ticker,
+                    "etf": False,
+                    "market": "US",
+                    "rating": rating,
+                    "overview": overview,
+                    "analysis": analysis,
+                },
+            )
 
         # commit transaction (SQLAlchemy v2.X.X is commit as you go)
         db_conn.commit()
         print("Finished insert")
 
-    print("Closing database connection.")
-    connector.close()
     print(f"Finished analyzing ticker {ticker}.")
@@ -0,0 +1,53 @@
+"""Measures the AlloyDB connection latency of a cold and a warm function instance.
+
+The benchmark uses the same `alloydb_pool` module the functions deploy, so run
+it with one of the function directories on the path and the same environment
+variables as the deployed function:
+
+    PYTHONPATH=analyze-prospectus python benchmark_alloydb_pool.py
+"""
+
+import time
+from typing import Dict
+
+from alloydb_pool import close_pool, get_pool
+import sqlalchemy
+
+
+def benchmark_pool(invocations: int = 10) -> Dict[str, float]:
+    """Measures per-invocation connection latency on a cold and warm instance.
+
+    The first invocation starts from a closed pool, like a freshly started
+    instance; the rest reuse it, like invocations on a warm instance. Each
+    invocation checks out a connection and runs `SELECT 1`.
+
+    Returns:
+        A dict with the cold latency and the warm p50/max latencies in ms.
+    """
+    close_pool()
+
+    latencies = []
+    for _ in range(invocations):
+        start = time.perf_counter()
+        with get_pool().connect() as db_conn:
+            db_conn.execute(sqlalchemy.text("SELECT 1")).scalar()
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    warm = sorted(latencies[1:]) or [0.0]
+    results = {
+        "cold_ms": latencies[0],
+        "warm_p50_ms": warm[len(warm) // 2],
+        "warm_max_ms": warm[-1],
+    }
+    print(
+        f"Cold: {results['cold_ms']:.1f} ms, warm p50: {results['warm_p50_ms']:.1f} ms, "
+        f"warm max: {results['warm_max_ms']:.1f} ms over {invocations} invocations"
+    )
+    return results
+
+
+if __name__ == "__main__":
+    try:
+        benchmark_pool()
+    finally:
+        close_pool()
@@ -0,0 +1,89 @@
+"""Shared AlloyDB connection pool for the genwealth Cloud Functions.
+
+Each function is deployed from its own source directory, so this module is
+copied into every function that talks to AlloyDB. Keep the copies in sync.
+
+The pool is created lazily on first use and kept at module level, so warm
+instances reuse the connector (and its refreshed certificates) and open
+connections instead of paying the setup cost on every invocation.
+"""
+
+import os
+import threading
+from typing import Optional
+
+from google.cloud.alloydb.connector import Connector
+import sqlalchemy
+
+# AlloyDB Vars
+CLUSTER = "alloydb-cluster"
+INSTANCE = "alloydb-instance"
+DATABASE = "ragdemos"
+USER = "postgres"
+
+_connector: Optional[Connector] = None
+_pool: Optional[sqlalchemy.engine.Engine] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> sqlalchemy.engine.Engine:
+    """Returns the instance-wide connection pool, creating it on first use.
+
+    Connections are checked with a ping before they are handed out and are
+    recycled after POOL_RECYCLE_SECONDS, so connections that went stale
+    while the instance was idle are replaced transparently.
+    """
+    global _connector, _pool
+
+    if _pool is not None:
+        return _pool
+
+    with _pool_lock:
+        if _pool is not None:
+            return _pool
+
+        project_id = os.environ["PROJECT_ID"]
+        region = os.environ["REGION"]
+        password = os.environ["ALLOYDB_PASSWORD"]
+        ip_type = os.environ.get("IP_TYPE", "private")
+
+        # Setup sync connector
+        _connector = Connector()
+
+        def getconn():
+            conn = _connector.connect(
+                f"projects/{project_id}/locations/{region}/clusters/{CLUSTER}/instances/{INSTANCE}",
+                "pg8000",
+                user=USER,
+                password=password,
+                db=DATABASE,
+                ip_type=ip_type,
+            )
+            return conn
+
+        # Functions run with --concurrency=1, so a couple of connections per
+        # instance is enough; max-instances bounds the total on the cluster.
+        _pool = sqlalchemy.create_engine(
+            "postgresql+pg8000://",
+            creator=getconn,
+            pool_size=int(os.environ.get("POOL_SIZE", "2")),
+            max_overflow=int(os.environ.get("POOL_MAX_OVERFLOW", "2")),
+            pool_timeout=30,
+            pool_recycle=int(os.environ.get("POOL_RECYCLE_SECONDS", "1800")),
+            pool_pre_ping=True,
+        )
+        return _pool
+
+
+def close_pool() -> None:
+    """Disposes of the pool and closes the connector."""
+    global _connector, _pool
+
+    with _pool_lock:
+        if _pool is not None:
+            _pool.dispose()
+            _pool = None
+        if _connector is not None:
+            _connector.close()
+            _connector = None
+
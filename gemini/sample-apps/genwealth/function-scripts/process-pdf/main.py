@@ -1,11 +1,17 @@
 """Cloud Function code to process a pdf dropped in GCS"""
 
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
 import os
 from pathlib import Path
 import re
-from typing import List, Optional
+import time
+from typing import Dict, Iterable, Iterator, List, Optional
 import uuid
 
+from alloydb_pool import get_pool
 import functions_framework
 from google.api_core.client_options import ClientOptions
 from google.api_core.exceptions import InternalServerError, RetryError
@@ -13,8 +19,26 @@ from google.cloud import documentai  # type: ignore
 from google.cloud import pubsub_v1, storage
 from langchain.docstore.document import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_google_alloydb_pg import AlloyDBEngine, AlloyDBVectorStore, Column
+from langchain_google_alloydb_pg import AlloyDBEngine, Column
 from langchain_google_vertexai import VertexAIEmbeddings
+import sqlalchemy
+
+# Metadata columns of the langchain_vector_store table, in insert order
+METADATA_COLUMNS = [
+    "source",
+    "page",
+    "ticker",
+    "page_size",
+    "doc_ai_shard_count",
+    "doc_ai_shard_index",
+    "doc_ai_chunk_size",
+    "doc_ai_chunk_uri",
+    "page_chunk",
+    "chunk_size",
+]
+
+# Namespace for deterministic ids of new chunks, derived from their content
+CHUNK_ID_NAMESPACE = uuid.UUID("1b3f5c1e-8a55-4e0b-9c67-2f6a1d0e4b7a")
 
 
 # Source: https://cloud.google.com/document-ai/docs/samples/documentai-batch-process-document#documentai_batch_process_document-python
@@ -143,6 +167,324 @@ def split_document(_doc):
     return new_docs
 
 
+def load_shard(blob: storage.Blob, source_file: str) -> Optional[Document]:
+    """Downloads a Document AI output shard and converts it to a LangChain doc."""
+    # Document AI should only output JSON files to GCS
+    if blob.content_type != "application/json":
+        print(
+            f"Skipping non-supported file: {blob.name} - Mimetype: {blob.content_type}"
+        )
+        return None
+
+    # Download JSON File as bytes object and convert to Document Object
+    print(f"Fetching {blob.name}")
+    document = documentai.Document.from_json(
+        blob.download_as_bytes(), ignore_unknown_fields=True
+    )
+
+    # Create LangChain doc
+    return Document(
+        page_content=document.text,
+        metadata={
+            "source": source_file,
+            "page": document.shard_info.shard_index + 1,
+            "ticker": Path(source_file).stem,
+            "page_size": len(document.text),
+            "doc_ai_shard_count": document.shard_info.shard_count,
+            "doc_ai_shard_index": document.shard_info.shard_index,
+            "doc_ai_chunk_size": blob._CHUNK_SIZE_MULTIPLE,
+            "doc_ai_chunk_uri": blob.public_url,
+        },
+    )
+
+
+def iter_shards(
+    blobs: Iterable[storage.Blob], source_file: str, max_workers: int = 8
+) -> Iterator[Document]:
+    """Downloads and parses shards on a thread pool, yielding them in order.
+
+    At most max_workers shards are fetched ahead of the consumer, so memory
+    stays bounded regardless of how many shards Document AI produced.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque()
+        for blob in blobs:
+            pending.append(executor.submit(load_shard, blob, source_file))
+            if len(pending) >= max_workers:
+                page = pending.popleft().result()
+                if page is not None:
+                    yield page
+
+        while pending:
+            page = pending.popleft().result()
+            if page is not None:
+                yield page
+
+
+def get_chunk_id(ticker: str, content_hash: str, occurrence: int) -> str:
+    """Returns the langchain_id of a new chunk, derived from its content.
+
+    occurrence tells apart chunks with the same text in one prospectus.
+    """
+    return str(uuid.uuid5(CHUNK_ID_NAMESPACE, f"{ticker}/{content_hash}/{occurrence}"))
+
+
+def get_content_hash(text: str) -> str:
+    """Returns the hex SHA-256 of a chunk's text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def load_chunk_manifest(
+    db_conn: sqlalchemy.engine.Connection, table_name: str, ticker: str
+) -> Dict[Optional[str], List[Dict]]:
+    """Returns a ticker's stored chunks grouped by content hash.
+
+    Each stored chunk is a dict of its langchain_id and METADATA_COLUMNS, in
+    page order. The content hash is kept in each row's langchain_metadata
+    column. Rows written before hashes were recorded are grouped under None,
+    so they are re-embedded and removed as stale.
+    """
+    rows = db_conn.execute(
+        sqlalchemy.text(
+            f"SELECT langchain_id, langchain_metadata->>'content_hash', "
+            f"{', '.join(METADATA_COLUMNS)} FROM {table_name} "
+            "WHERE ticker = :ticker ORDER BY page, page_chunk"
+        ),
+        parameters={"ticker": ticker},
+    )
+    manifest: Dict[Optional[str], List[Dict]] = {}
+    for langchain_id, content_hash, *metadata in rows:
+        stored_chunk = dict(zip(METADATA_COLUMNS, metadata))
+        stored_chunk["langchain_id"] = str(langchain_id)
+        manifest.setdefault(content_hash, []).append(stored_chunk)
+    return manifest
+
+
+def iter_changed_chunks(
+    chunks: Iterable[Document],
+    manifest: Dict[Optional[str], List[Dict]],
+    seen_ids: set,
+    moved_chunks: List[Document],
+) -> Iterator[Document]:
+    """Yields only chunks whose content is not stored yet.
+
+    A chunk whose content hash is still in the manifest takes over that
+    stored row and its embedding, wherever the chunk is now in the
+    document. If its page or other metadata changed, it is appended to
+    moved_chunks so only its metadata is updated. Inserting or deleting a
+    page therefore re-embeds just the chunks whose text changed.
+
+    Every chunk's id is added to seen_ids, so the caller can tell which
+    stored rows no longer exist in the new document.
+    """
+    stored_ids = {
+        stored_chunk["langchain_id"]
+        for stored_chunks in manifest.values()
+        for stored_chunk in stored_chunks
+    }
+    occurrences: Dict[str, int] = {}
+    for chunk in chunks:
+        metadata = chunk.metadata
+        content_hash = get_content_hash(chunk.page_content)
+        occurrence = occurrences.get(content_hash, 0)
+        occurrences[content_hash] = occurrence + 1
+        metadata["content_hash"] = content_hash
+
+        stored_chunks = manifest.get(content_hash, [])
+        if occurrence < len(stored_chunks):
+            stored_chunk = stored_chunks[occurrence]
+            metadata["langchain_id"] = stored_chunk["langchain_id"]
+            seen_ids.add(stored_chunk["langchain_id"])
+            if any(
+                metadata.get(column) != stored_chunk[column]
+                for column in METADATA_COLUMNS
+            ):
+                moved_chunks.append(chunk)
+            continue
+
+        # Skip ids of stored rows, which may have been reordered
+        chunk_id = get_chunk_id(metadata["ticker"], content_hash, occurrence)
+        while chunk_id in stored_ids or chunk_id in seen_ids:
+            occurrence += 1
+            chunk_id = get_chunk_id(metadata["ticker"], content_hash, occurrence)
+        metadata["langchain_id"] = chunk_id
+        seen_ids.add(chunk_id)
+        yield chunk
+
+
+def iter_batches(
+    chunks: Iterable[Document], batch_size: int = 64
+) -> Iterator[List[Document]]:
+    """Groups chunks into batches of batch_size."""
+    batch = []
+    for chunk in chunks:
+        batch.append(chunk)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def upsert_chunks(
+    db_conn: sqlalchemy.engine.Connection,
+    table_name: str,
+    chunks: List[Document],
+    embeddings: List[List[float]],
+) -> None:
+    """Writes a batch of chunks to the vector table with one multi-row upsert."""
+    columns = ["langchain_id", "content", "embedding", "langchain_metadata"]
+    columns += METADATA_COLUMNS
+    values = []
+    parameters = {}
+    for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
+        values.append(
+            f"(CAST(:langchain_id_{i} AS uuid), :content_{i}, "
+            f"CAST(:embedding_{i} AS vector), CAST(:langchain_metadata_{i} AS json), "
+            + ", ".join(f":{column}_{i}" for column in METADATA_COLUMNS)
+            + ")"
+        )
+        parameters[f"langchain_id_{i}"] = chunk.metadata["langchain_id"]
+        parameters[f"content_{i}"] = chunk.page_content
+        parameters[f"embedding_{i}"] = json.dumps(embedding)
+        parameters[f"langchain_metadata_{i}"] = json.dumps(
+            {"content_hash": chunk.metadata["content_hash"]}
+        )
+        for column in METADATA_COLUMNS:
+            parameters[f"{column}_{i}"] = chunk.metadata.get(column)
+
+    updates = ", ".join(f"{column} = EXCLUDED.{column}" for column in columns[1:])
+    db_conn.execute(
+        sqlalchemy.text(
+            f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES {', '.join(values)} "
+            f"ON CONFLICT (langchain_id) DO UPDATE SET {updates}"
+        ),
+        parameters=parameters,
+    )
+
+
+def update_chunk_metadata(
+    db_conn: sqlalchemy.engine.Connection, table_name: str, chunks: List[Document]
+) -> None:
+    """Updates the metadata columns of stored chunks, keeping their embeddings."""
+    if not chunks:
+        return
+    db_conn.execute(
+        sqlalchemy.text(
+            f"UPDATE {table_name} SET "
+            + ", ".join(f"{column} = :{column}" for column in METADATA_COLUMNS)
+            + " WHERE langchain_id = CAST(:langchain_id AS uuid)"
+        ),
+        [
+            {
+                "langchain_id": chunk.metadata["langchain_id"],
+                **{column: chunk.metadata.get(column) for column in METADATA_COLUMNS},
+            }
+            for chunk in chunks
+        ],
+    )
+
+
+def delete_chunks(
+    db_conn: sqlalchemy.engine.Connection, table_name: str, chunk_ids: List[str]
+) -> None:
+    """Deletes chunks by langchain_id."""
+    if not chunk_ids:
+        return
+    db_conn.execute(
+        sqlalchemy.text(
+            f"DELETE FROM {table_name} WHERE langchain_id = ANY(CAST(:ids AS uuid[]))"
+        ),
+        parameters={"ids": chunk_ids},
+    )
+
+
+def ingest_shards(
+    blobs: Iterable[storage.Blob],
+    source_file: str,
+    embedding: VertexAIEmbeddings,
+    pool: sqlalchemy.engine.Engine,
+    table_name: str,
+    batch_size: int = 64,
+    max_workers: int = 8,
+) -> Dict[str, int]:
+    """Fetches, splits, embeds and upserts a document's shards as a pipeline.
+
+    Chunks whose content hash matches a stored row of the ticker reuse that
+    row and its embedding, with only their page metadata updated if they
+    moved, so re-uploading a revised prospectus only re-embeds the text that
+    changed. Rows for chunks that no longer exist are deleted.
+
+    The next batch is embedded while the current one is being written, and
+    only a few batches are held in memory at once. Accepts any blob-like
+    objects and SQLAlchemy engine, so it can be benchmarked against a local
+    Postgres and fake GCS blobs.
+
+    Returns:
+        A dict with the number of upserted, moved, unchanged and deleted
+        chunks.
+    """
+    start = time.perf_counter()
+    ticker = Path(source_file).stem
+    seen_ids = set()
+    moved_chunks: List[Document] = []
+    upserted = 0
+
+    def embed(batch: List[Document]) -> List[List[float]]:
+        return embedding.embed_documents([chunk.page_content for chunk in batch])
+
+    with ThreadPoolExecutor(max_workers=1) as embedder, pool.connect() as db_conn:
+        manifest = load_chunk_manifest(db_conn, table_name, ticker)
+        chunks = (
+            chunk
+            for page in iter_shards(blobs, source_file, max_workers=max_workers)
+            for chunk in split_document([page])
+        )
+        batches = iter_batches(
+            iter_changed_chunks(chunks, manifest, seen_ids, moved_chunks),
+            batch_size=batch_size,
+        )
+
+        pending = None
+        for batch in batches:
+            future = embedder.submit(embed, batch)
+            if pending is not None:
+                upsert_chunks(db_conn, table_name, pending[0], pending[1].result())
+                upserted += len(pending[0])
+            pending = (batch, future)
+
+        if pending is not None:
+            upsert_chunks(db_conn, table_name, pending[0], pending[1].result())
+            upserted += len(pending[0])
+
+        update_chunk_metadata(db_conn, table_name, moved_chunks)
+
+        stale_ids = [
+            stored_chunk["langchain_id"]
+            for stored_chunks in manifest.values()
+            for stored_chunk in stored_chunks
+            if stored_chunk["langchain_id"] not in seen_ids
+        ]
+        delete_chunks(db_conn, table_name, stale_ids)
+
+        # commit transaction (SQLAlchemy v2.X.X is commit as you go)
+        db_conn.commit()
+
+    stats = {
+        "upserted": upserted,
+        "moved": len(moved_chunks),
+        "unchanged": len(seen_ids) - upserted - len(moved_chunks),
+        "deleted": len(stale_ids),
+    }
+    elapsed = time.perf_counter() - start
+    print(
+        f"Upserted {stats['upserted']}, moved {stats['moved']}, kept "
+        f"{stats['unchanged']} unchanged and deleted {stats['deleted']} stale "
+        f"chunks for {ticker} in {elapsed:.1f}s"
+    )
+    return stats
+
+
 # Triggered by a change in a storage bucket
 @functions_framework.cloud_event
 def process_pdf(cloud_event):
@@ -190,41 +532,6 @@ def process_pdf(cloud_event):
         input_mime_type="application/pdf",
     )
 
-    # Document AI may output multiple JSON files per source file
-    lc_doc = []
-    for blob in blobs:
-        # Document AI should only output JSON files to GCS
-        if blob.content_type != "application/json":
-            print(
-                f"Skipping non-supported file: {blob.name} - Mimetype: {blob.content_type}"
-            )
-            continue
-
-        # Download JSON File as bytes object and convert to Document Object
-        print(f"Fetching {blob.name}")
-        document = documentai.Document.from_json(
-            blob.download_as_bytes(), ignore_unknown_fields=True
-        )
-
-        # Create LangChain doc
-        page = Document(
-            page_content=document.text,
-            metadata={
-                "source": source_file,
-                "page": document.shard_info.shard_index + 1,
-                "ticker": Path(source_file).stem,
-                "page_size": len(document.text),
-                "doc_ai_shard_count": document.shard_info.shard_count,
-                "doc_ai_shard_index": document.shard_info.shard_index,
-                "doc_ai_chunk_size": blob._CHUNK_SIZE_MULTIPLE,
-                "doc_ai_chunk_uri": blob.public_url,
-            },
-        )
-        lc_doc.append(page)
-
-    # Split docs into smaller chunks (max 3072 tokens, 9216 characters)
-    lc_doc_chunks = split_document(lc_doc)
-
     # Setup embeddings
     embedding = VertexAIEmbeddings(
         model_name="textembedding-gecko@003", project=project_id
@@ -240,19 +547,17 @@ def process_pdf(cloud_event):
     initialize_vector_store = False
     ip_type = os.environ["IP_TYPE"]
 
-    # Create vector store
-    engine = AlloyDBEngine.from_instance(
-        project_id=project_id,
-        region=region,
-        cluster=cluster,
-        instance=instance,
-        database=database,
-        user=user,
-        password=password,
-        ip_type=ip_type,
-    )
-
     if initialize_vector_store:
+        engine = AlloyDBEngine.from_instance(
+            project_id=project_id,
+            region=region,
+            cluster=cluster,
+            instance=instance,
+            database=database,
+            user=user,
+            password=password,
+            ip_type=ip_type,
+        )
         engine.init_vectorstore_table(
             table_name=table_name,
             vector_size=768,  # Vector size for VertexAI model(textembedding-gecko@latest)
@@ -271,29 +576,28 @@ def process_pdf(cloud_event):
             overwrite_existing=True,
         )
 
-    store = AlloyDBVectorStore.create_sync(
-        engine=engine,
-        table_name=table_name,
-        embedding_service=embedding,
-        metadata_columns=[
-            "source",
-            "page",
-            "ticker",
-            "page_size",
-            "doc_ai_shard_count",
-            "doc_ai_shard_index",
-            "doc_ai_chunk_size",
-            "doc_ai_chunk_uri",
-            "page_chunk",
-            "chunk_size",
-        ],
+    # Reuse the instance-wide connection pool
+    pool = get_pool()
+
+    # Document AI may output multiple JSON files per source file. Shards are
+    # fetched in parallel, split into chunks (max 3072 tokens, 9216
+    # characters), and only new or changed chunks are embedded and upserted.
+    stats = ingest_shards(
+        blobs,
+        source_file,
+        embedding,
+        pool,
+        table_name,
+        batch_size=int(os.environ.get("INGEST_BATCH_SIZE", "64")),
+        max_workers=int(os.environ.get("INGEST_MAX_WORKERS", "8")),
     )
 
-    ids = [str(uuid.uuid4()) for i in range(len(lc_doc_chunks))]
-    store.add_documents(lc_doc_chunks, ids)
-
     print("Finished processing pdf")
 
+    if not stats["upserted"] and not stats["moved"] and not stats["deleted"]:
+        print("Prospectus is unchanged, skipping analysis")
+        return
+
     # Send message to pubsub topic to kick off next step
     ticker = Path(source_file).stem
     publisher = pubsub_v1.PublisherClient()
@@ -0,0 +1,165 @@
+"""Tests for the incremental ingestion of prospectus chunks."""
+
+from typing import Dict, List
+
+from google.cloud import documentai
+import main
+
+
+class FakeBlob:
+    content_type = "application/json"
+    public_url = "https://storage.googleapis.com/bucket/shard.json"
+    _CHUNK_SIZE_MULTIPLE = 256 * 1024
+
+    def __init__(self, name: str, text: str, shard_index: int, shard_count: int):
+        self.name = name
+        self.document = documentai.Document(
+            text=text,
+            shard_info=documentai.Document.ShardInfo(
+                shard_index=shard_index, shard_count=shard_count
+            ),
+        )
+
+    def download_as_bytes(self) -> bytes:
+        return documentai.Document.to_json(self.document).encode("utf-8")
+
+
+class FakeEmbeddings:
+    def __init__(self) -> None:
+        self.texts: List[str] = []
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.texts.extend(texts)
+        return [[float(len(text))] for text in texts]
+
+
+class FakeConnection:
+    """Runs the vector table statements of main against a dict of rows."""
+
+    def __init__(self, rows: Dict[str, Dict]) -> None:
+        self.rows = rows
+
+    def __enter__(self) -> "FakeConnection":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+    def execute(self, statement, parameters=None):
+        query = str(statement)
+        if query.startswith("SELECT"):
+            rows = sorted(
+                self.rows.values(), key=lambda row: (row["page"], row["page_chunk"])
+            )
+            return [
+                (row["langchain_id"], row["content_hash"])
+                + tuple(row[column] for column in main.METADATA_COLUMNS)
+                for row in rows
+            ]
+        if query.startswith("INSERT"):
+            i = 0
+            while f"langchain_id_{i}" in parameters:
+                row = {
+                    column: parameters[f"{column}_{i}"]
+                    for column in ["langchain_id", "content"] + main.METADATA_COLUMNS
+                }
+                row["content_hash"] = main.get_content_hash(row["content"])
+                self.rows[row["langchain_id"]] = row
+                i += 1
+        elif query.startswith("UPDATE"):
+            for update in parameters:
+                row = self.rows[update["langchain_id"]]
+                row.update({column: update[column] for column in main.METADATA_COLUMNS})
+        elif query.startswith("DELETE"):
+            for langchain_id in parameters["ids"]:
+                del self.rows[langchain_id]
+        return None
+
+    def commit(self) -> None:
+        pass
+
+
+class FakePool:
+    def __init__(self) -> None:
+        self.rows: Dict[str, Dict] = {}
+
+    def connect(self) -> FakeConnection:
+        return FakeConnection(self.rows)
+
+
+def make_page(name: str) -> str:
+    # About three chunks per page
+    return " ".join(f"{name}-word{i}" for i in range(2000))
+
+
+def ingest(pages: List[str], pool: FakePool, embedding: FakeEmbeddings) -> Dict:
+    blobs = [
+        FakeBlob(f"shard-{index}.json", text, index, len(pages))
+        for index, text in enumerate(pages)
+    ]
+    return main.ingest_shards(
+        blobs, "gs://bucket/TICK.pdf", embedding, pool, "table", batch_size=2
+    )
+
+
+def test_inserting_a_page_only_embeds_its_chunks():
+    pages = [make_page(f"page{n}") for n in range(4)]
+    pool = FakePool()
+    ingest(pages, pool, FakeEmbeddings())
+    first_ids = set(pool.rows)
+    later_chunks = [row["content"] for row in pool.rows.values() if row["page"] >= 3]
+
+    new_page = make_page("inserted")
+    embedding = FakeEmbeddings()
+    stats = ingest(pages[:2] + [new_page] + pages[2:], pool, embedding)
+
+    new_chunks = [
+        chunk.page_content
+        for chunk in main.split_document(
+            [main.Document(page_content=new_page, metadata={})]
+        )
+    ]
+    assert embedding.texts == new_chunks
+    assert stats["upserted"] == len(new_chunks)
+    # Every page's shard count changed, which only updates the metadata
+    assert stats["moved"] == len(first_ids)
+    assert stats["deleted"] == 0
+    assert first_ids < set(pool.rows)
+
+    # The chunks after the inserted page kept their rows but moved one page down
+    for row in pool.rows.values():
+        if row["content"] in later_chunks:
+            assert row["page"] >= 4
+
+
+def test_unchanged_prospectus_is_not_reembedded():
+    pages = [make_page(f"page{n}") for n in range(3)]
+    pool = FakePool()
+    ingest(pages, pool, FakeEmbeddings())
+
+    embedding = FakeEmbeddings()
+    stats = ingest(pages, pool, embedding)
+
+    assert embedding.texts == []
+    assert stats == {
+        "upserted": 0,
+        "moved": 0,
+        "unchanged": len(pool.rows),
+        "deleted": 0,
+    }
+
+
+def test_deleting_a_page_removes_only_its_chunks():
+    pages = [make_page(f"page{n}") for n in range(4)]
+    pool = FakePool()
+    ingest(pages, pool, FakeEmbeddings())
+    deleted_chunks = {
+        row["langchain_id"] for row in pool.rows.values() if row["page"] == 1
+    }
+
+    embedding = FakeEmbeddings()
+    stats = ingest(pages[1:], pool, embedding)
+
+    assert embedding.texts == []
+    assert stats["deleted"] == len(deleted_chunks)
+    assert not deleted_chunks & set(pool.rows)
@@ -0,0 +1,148 @@
+"""
+Benchmarks for the chunking and retrieval helpers in `intro_multimodal_rag_utils`.
+
+Run from the `retrieval-augmented-generation` directory with:
+
+    python -m utils.benchmark_intro_multimodal_rag_utils
+"""
+
+import time
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+from utils.intro_multimodal_rag_utils import (
+    EmbeddingIndex,
+    get_cosine_score,
+    iter_text_chunk_spans,
+    iter_text_chunks,
+    normalize_text,
+)
+
+
+def benchmark_embedding_index(
+    num_rows: int = 200_000,
+    embedding_size: int = 768,
+    num_queries: int = 10,
+    top_n: int = 3,
+    seed: int = 0,
+) -> Dict[str, float]:
+    """
+    Compares the row-wise `apply` + `get_cosine_score` scoring path with `EmbeddingIndex`
+    on a synthetic metadata DataFrame.
+
+    Args:
+        num_rows: The number of synthetic chunk rows.
+        embedding_size: The dimensionality of the synthetic embeddings.
+        num_queries: The number of queries to time for each path.
+        top_n: The number of results to retrieve per query.
+        seed: The random seed for the synthetic data.
+
+    Returns:
+        A dictionary with the average seconds per query for the apply path, the index path
+        and the batched index path, and the one-off index build time.
+    """
+
+    rng = np.random.default_rng(seed)
+    embeddings = rng.standard_normal((num_rows, embedding_size)).astype(np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    dataframe = pd.DataFrame({"text_embedding_chunk": list(embeddings)})
+    queries = embeddings[rng.integers(0, num_rows, num_queries)]
+
+    start = time.perf_counter()
+    for query in queries:
+        cosine_scores = dataframe.apply(
+            lambda row: get_cosine_score(row, "text_embedding_chunk", query), axis=1
+        )
+        cosine_scores.nlargest(top_n)
+    apply_time = (time.perf_counter() - start) / num_queries
+
+    start = time.perf_counter()
+    index = EmbeddingIndex(dataframe, "text_embedding_chunk")
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for query in queries:
+        index.search(query, top_n)
+    index_time = (time.perf_counter() - start) / num_queries
+
+    start = time.perf_counter()
+    index.search_batch(queries, top_n)
+    batch_time = (time.perf_counter() - start) / num_queries
+
+    results = {
+        "apply_seconds_per_query": apply_time,
+        "index_build_seconds": build_time,
+        "index_seconds_per_query": index_time,
+        "index_batch_seconds_per_query": batch_time,
+    }
+    for name, value in results.items():
+        print(f"{name}: {value:.6f}")
+
+    return results
+
+
+def benchmark_text_chunking(
+    text_size: int = 100_000_000,
+    character_limit: int = 1000,
+    overlap: int = 100,
+    seed: int = 0,
+) -> Dict[str, float]:
+    """
+    Compares per-chunk normalization into a dictionary with normalizing once and streaming
+    chunk spans, on a synthetic text of `text_size` characters.
+
+    Args:
+        text_size: The number of characters of the synthetic text.
+        character_limit: Maximum characters per chunk.
+        overlap: Number of overlapping characters between chunks.
+        seed: The random seed for the synthetic text.
+
+    Returns:
+        A dictionary with the seconds taken by each approach and the number of chunks.
+    """
+
+    rng = np.random.default_rng(seed)
+    words = np.array(["lorem", "ipsum", "dolor", "sit", "amet.", "caf\u00e9", "\n"])
+    text = " ".join(rng.choice(words, size=text_size // 5))[:text_size]
+
+    start = time.perf_counter()
+    chunked_text_dict = {}
+    for chunk_number, i in enumerate(
+        range(0, len(text), character_limit - overlap), start=1
+    ):
+        chunk = text[i : min(i + character_limit, len(text))]
+        chunked_text_dict[chunk_number] = chunk.encode("ascii", "ignore").decode(
+            "utf-8", "ignore"
+        )
+    per_chunk_time = time.perf_counter() - start
+    del chunked_text_dict
+
+    start = time.perf_counter()
+    normalized_text = normalize_text(text)
+    num_chunks = sum(
+        1 for _ in iter_text_chunk_spans(normalized_text, character_limit, overlap)
+    )
+    streaming_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in iter_text_chunks(normalized_text, character_limit, overlap, "sentence"):
+        pass
+    sentence_time = time.perf_counter() - start
+
+    results = {
+        "per_chunk_normalization_seconds": per_chunk_time,
+        "streaming_spans_seconds": streaming_time,
+        "streaming_sentence_chunks_seconds": sentence_time,
+        "num_chunks": num_chunks,
+    }
+    for name, value in results.items():
+        print(f"{name}: {value:.6f}")
+
+    return results
+
+
+if __name__ == "__main__":
+    benchmark_text_chunking()
+    benchmark_embedding_index()
@@ -1,7 +1,15 @@
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import contextlib
 import glob
+import hashlib
+from itertools import repeat
+import json
 import os
+import threading
 import time
-from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+import weakref
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
 from IPython.display import display
 import PIL
@@ -19,10 +27,48 @@ from vertexai.language_models import TextEmbeddingModel
 from vertexai.vision_models import Image as vision_model_Image
 from vertexai.vision_models import MultiModalEmbeddingModel
 
-text_embedding_model = TextEmbeddingModel.from_pretrained("textembedding-gecko@latest")
-multimodal_embedding_model = MultiModalEmbeddingModel.from_pretrained(
-    "multimodalembedding@001"
-)
+TEXT_EMBEDDING_MODEL_NAME = "textembedding-gecko@latest"
+MULTIMODAL_EMBEDDING_MODEL_NAME = "multimodalembedding@001"
+
+# The models are loaded on first use, so the worker processes that only extract PDFs never load them
+_text_embedding_model: Optional[TextEmbeddingModel] = None
+_multimodal_embedding_model: Optional[MultiModalEmbeddingModel] = None
+_models_lock = threading.Lock()
+
+
+def get_text_embedding_model() -> TextEmbeddingModel:
+    """Returns the text embedding model, loading it on first use."""
+
+    global _text_embedding_model
+
+    with _models_lock:
+        if _text_embedding_model is None:
+            _text_embedding_model = TextEmbeddingModel.from_pretrained(
+                TEXT_EMBEDDING_MODEL_NAME
+            )
+        return _text_embedding_model
+
+
+def get_multimodal_embedding_model() -> MultiModalEmbeddingModel:
+    """Returns the multimodal embedding model, loading it on first use."""
+
+    global _multimodal_embedding_model
+
+    with _models_lock:
+        if _multimodal_embedding_model is None:
+            _multimodal_embedding_model = MultiModalEmbeddingModel.from_pretrained(
+                MULTIMODAL_EMBEDDING_MODEL_NAME
+            )
+        return _multimodal_embedding_model
+
+
+def __getattr__(name: str) -> Any:
+    # Keeps `text_embedding_model` and `multimodal_embedding_model` available as module attributes
+    if name == "text_embedding_model":
+        return get_text_embedding_model()
+    if name == "multimodal_embedding_model":
+        return get_multimodal_embedding_model()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 # Functions for getting text and image embeddings
@@ -45,7 +91,7 @@ def get_text_embedding_from_text_embedding_model(
                                The format (list or NumPy array) depends on the
                                value of the 'return_array' parameter.
     """
-    embeddings = text_embedding_model.get_embeddings([text])
+    embeddings = get_text_embedding_model().get_embeddings([text])
     text_embedding = [embedding.values for embedding in embeddings][0]
 
     if return_array:
@@ -76,7 +122,7 @@ def get_image_embedding_from_multimodal_embedding_model(
     """
     # image = Image.load_from_file(image_uri)
     image = vision_model_Image.load_from_file(image_uri)
-    embeddings = multimodal_embedding_model.get_embeddings(
+    embeddings = get_multimodal_embedding_model().get_embeddings(
         image=image, contextual_text=text, dimension=embedding_size
     )  # 128, 256, 512, 1408
     image_embedding = embeddings.image_embedding
@@ -87,6 +133,172 @@ def get_image_embedding_from_multimodal_embedding_model(
     return image_embedding
 
 
+class TokenBucketRateLimiter:
+    """
+    A thread-safe token bucket used to keep concurrent API calls under a requests-per-minute quota.
+    Each call to `acquire` takes one token, blocking until one is available.
+    """
+
+    def __init__(self, requests_per_minute: float, burst: Optional[int] = None) -> None:
+        """
+        Args:
+            requests_per_minute: The sustained number of requests allowed per minute.
+            burst: The maximum number of requests that can be issued back to back. Defaults to one second's worth.
+        """
+
+        if requests_per_minute <= 0:
+            raise ValueError("requests_per_minute must be positive.")
+
+        self.rate = requests_per_minute / 60.0
+        self.capacity = float(burst or max(1, int(self.rate)))
+        self._tokens = self.capacity
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Blocks until a request may be issued."""
+
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._last_refill) * self.rate
+                )
+                self._last_refill = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                wait_time = (1 - self._tokens) / self.rate
+
+            time.sleep(wait_time)
+
+
+class BatchTextEmbedder:
+    """
+    Embeds many texts with as few text embedding requests as possible.
+    Texts are packed into requests of up to `batch_size` instances (and `max_batch_characters`
+    characters), up to `max_concurrent_requests` requests are kept in flight at once,
+    and embeddings are returned in the same order as the input texts.
+    """
+
+    def __init__(
+        self,
+        embedding_model: Optional[Any] = None,
+        batch_size: int = 250,
+        max_batch_characters: int = 60_000,
+        max_concurrent_requests: int = 4,
+        rate_limiter: Optional[TokenBucketRateLimiter] = None,
+    ) -> None:
+        """
+        Args:
+            embedding_model: Any object with a `get_embeddings(texts)` method returning objects
+                             with a `values` attribute. Defaults to the module's text embedding model.
+            batch_size: Maximum number of texts per request (the model's instance limit).
+            max_batch_characters: Maximum total characters per request, to stay under the token limit.
+            max_concurrent_requests: Maximum number of requests in flight at once.
+            rate_limiter: If provided, every request waits for a token from this limiter first.
+        """
+
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1.")
+
+        self.embedding_model = embedding_model or get_text_embedding_model()
+        self.batch_size = batch_size
+        self.max_batch_characters = max_batch_characters
+        self.max_concurrent_requests = max_concurrent_requests
+        self.rate_limiter = rate_limiter
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent_requests)
+
+    def _iter_batches(self, texts: Iterable[str]) -> Iterator[List[str]]:
+        batch: List[str] = []
+        batch_characters = 0
+
+        for text in texts:
+            if batch and (
+                len(batch) >= self.batch_size
+                or batch_characters + len(text) > self.max_batch_characters
+            ):
+                yield batch
+                batch, batch_characters = [], 0
+            batch.append(text)
+            batch_characters += len(text)
+
+        if batch:
+            yield batch
+
+    def _embed_batch(self, batch: List[str]) -> List[list]:
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        embeddings = self.embedding_model.get_embeddings(batch)
+        return [embedding.values for embedding in embeddings]
+
+    def embed_iter(self, texts: Iterable[str]) -> Iterator[list]:
+        """
+        Generates text embeddings for a stream of texts, such as the output of `iter_text_chunks`.
+        Requests are sent as soon as a batch is full, so embedding starts before the input is exhausted,
+        and at most `max_concurrent_requests` batches are held in memory at once.
+
+        Args:
+            texts: The input text strings to be embedded.
+
+        Yields:
+            One embedding per input text, in the same order as `texts`.
+        """
+
+        pending: deque = deque()
+        for batch in self._iter_batches(texts):
+            pending.append(self._executor.submit(self._embed_batch, batch))
+            if len(pending) >= self.max_concurrent_requests:
+                yield from pending.popleft().result()
+
+        while pending:
+            yield from pending.popleft().result()
+
+    def embed(self, texts: List[str]) -> List[list]:
+        """
+        Generates text embeddings for a list of texts.
+
+        Args:
+            texts: The input text strings to be embedded.
+
+        Returns:
+            A list of embeddings, one per input text, in the same order as `texts`.
+        """
+
+        return list(self.embed_iter(texts))
+
+    def close(self) -> None:
+        """Shuts down the request threads once the requests in flight are done."""
+
+        self._executor.shutdown()
+
+    def __enter__(self) -> "BatchTextEmbedder":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+
+_default_embedder: Optional[BatchTextEmbedder] = None
+_default_embedder_lock = threading.Lock()
+
+
+def get_default_embedder() -> BatchTextEmbedder:
+    """
+    Returns the `BatchTextEmbedder` shared by all calls that are not given one,
+    creating it on first use so its request threads are started only once.
+    """
+
+    global _default_embedder
+
+    with _default_embedder_lock:
+        if _default_embedder is None:
+            _default_embedder = BatchTextEmbedder()
+        return _default_embedder
+
+
 def load_image_bytes(image_path):
     """Loads an image from a URL or local file path.
 
@@ -157,8 +369,120 @@ class Color:
     END: str = "\033[0m"
 
 
+# Separators a chunk may end on, by boundary type, when not splitting on raw characters
+CHUNK_BOUNDARY_SEPARATORS: Dict[str, Tuple[str, ...]] = {
+    "sentence": (". ", "! ", "? ", ".\n", "\n\n"),
+    "word": (" ", "\n", "\t"),
+}
+
+
+def normalize_text(text: str) -> str:
+    """
+    Drops the non-ASCII characters of a text, the normalization applied to all page text and chunks.
+
+    Args:
+        text: The text to normalize.
+
+    Returns:
+        The normalized text.
+    """
+
+    return text.encode("ascii", "ignore").decode("utf-8", "ignore")
+
+
+def iter_text_chunk_spans(
+    text: str,
+    character_limit: int = 1000,
+    overlap: int = 100,
+    boundary: Optional[str] = None,
+) -> Iterator[Tuple[int, int]]:
+    """
+    Lazily yields the (offset, length) of each overlapping chunk of a text, without copying the text.
+
+    Args:
+        text: The text document to be chunked. It should already be normalized.
+        character_limit: Maximum characters per chunk (defaults to 1000).
+        overlap: Number of overlapping characters between chunks (defaults to 100).
+        boundary: None to split on raw characters, or "sentence" / "word" to end each chunk
+                  on the last such boundary inside the window, when there is one.
+
+    Yields:
+        A tuple of (offset, length) for each chunk, in order.
+
+    Raises:
+        ValueError: If `overlap` is not smaller than `character_limit`, or `boundary` is unknown.
+
+    """
+
+    if overlap >= character_limit:
+        raise ValueError("Overlap must be smaller than the character limit.")
+
+    text_length = len(text)
+
+    if boundary is None:
+        for offset in range(0, text_length, character_limit - overlap):
+            yield offset, min(character_limit, text_length - offset)
+        return
+
+    if boundary not in CHUNK_BOUNDARY_SEPARATORS:
+        raise ValueError(
+            f"Unknown boundary '{boundary}', expected one of {list(CHUNK_BOUNDARY_SEPARATORS)}."
+        )
+
+    offset = 0
+    while offset < text_length:
+        end_index = min(offset + character_limit, text_length)
+
+        if end_index < text_length:
+            # End after the last separator that still moves the next chunk forward
+            search_start = offset + overlap + 1
+            boundary_end = -1
+            for separator in CHUNK_BOUNDARY_SEPARATORS[boundary]:
+                separator_index = text.rfind(separator, search_start, end_index)
+                if separator_index != -1:
+                    boundary_end = max(boundary_end, separator_index + len(separator))
+            if boundary_end > search_start:
+                end_index = boundary_end
+
+        yield offset, end_index - offset
+
+        if end_index >= text_length:
+            break
+        offset = end_index - overlap
+
+
+def iter_text_chunks(
+    text: str,
+    character_limit: int = 1000,
+    overlap: int = 100,
+    boundary: Optional[str] = None,
+) -> Iterator[Tuple[int, str]]:
+    """
+    Lazily yields numbered chunks of a text. Only one chunk string exists at a time,
+    so memory stays flat on very large documents.
+
+    Args:
+        text: The text document to be chunked. It should already be normalized.
+        character_limit: Maximum characters per chunk (defaults to 1000).
+        overlap: Number of overlapping characters between chunks (defaults to 100).
+        boundary: None, "sentence" or "word"; see `iter_text_chunk_spans`.
+
+    Yields:
+        A tuple of (chunk number starting at 1, chunk text).
+    """
+
+    for chunk_number, (offset, length) in enumerate(
+        iter_text_chunk_spans(text, character_limit, overlap, boundary), start=1
+    ):
+        yield chunk_number, text[offset : offset + length]
+
+
 def get_text_overlapping_chunk(
-    text: str, character_limit: int = 1000, overlap: int = 100
+    text: str,
+    character_limit: int = 1000,
+    overlap: int = 100,
+    normalize: bool = True,
+    boundary: Optional[str] = None,
 ) -> dict:
     """
     * Breaks a text document into chunks of a specified size, with an overlap between chunks to preserve context.
@@ -169,39 +493,32 @@ def get_text_overlapping_chunk(
         text: The text document to be chunked.
         character_limit: Maximum characters per chunk (defaults to 1000).
         overlap: Number of overlapping characters between chunks (defaults to 100).
+        normalize: Whether to normalize the chunks. Pass False if the text is already normalized.
+                   As before, chunk boundaries are computed on the text as given and each chunk
+                   is normalized afterwards, so text with non-ASCII characters is chunked the same
+                   way as by earlier versions.
+        boundary: None, "sentence" or "word"; see `iter_text_chunk_spans`.
 
     Returns:
         A dictionary where keys are chunk numbers and values are the corresponding text chunks.
 
     Raises:
-        ValueError: If `overlap` is greater than `character_limit`.
+        ValueError: If `overlap` is not smaller than `character_limit`.
 
     """
 
-    if overlap > character_limit:
-        raise ValueError("Overlap cannot be larger than character limit.")
+    chunks = iter_text_chunks(text, character_limit, overlap, boundary)
 
-    # Initialize variables
-    chunk_number = 1
-    chunked_text_dict = {}
+    # ASCII text is unchanged by normalization, so only other text is normalized per chunk
+    if normalize and not text.isascii():
+        return {chunk_number: normalize_text(chunk) for chunk_number, chunk in chunks}
 
-    # Iterate over text with the given limit and overlap
-    for i in range(0, len(text), character_limit - overlap):
-        end_index = min(i + character_limit, len(text))
-        chunk = text[i:end_index]
+    return dict(chunks)
 
-        # Encode and decode for consistent encoding
-        chunked_text_dict[chunk_number] = chunk.encode("ascii", "ignore").decode(
-            "utf-8", "ignore"
-        )
-
-        # Increment chunk number
-        chunk_number += 1
-
-    return chunked_text_dict
 
-
-def get_page_text_embedding(text_data: Union[dict, str]) -> dict:
+def get_page_text_embedding(
+    text_data: Union[dict, str], embedder: Optional[BatchTextEmbedder] = None
+) -> dict:
     """
     * Generates embeddings for each text chunk using a specified embedding model.
     * Takes a dictionary of text chunks and an embedding size as input.
@@ -209,7 +526,8 @@ def get_page_text_embedding(text_data: Union[dict, str]) -> dict:
 
     Args:
         text_data: Either a dictionary of pre-chunked text or the entire page text.
-        embedding_size: Size of the embedding vector (defaults to 128).
+        embedder: The `BatchTextEmbedder` used to embed the chunks in batched requests.
+                  The shared default embedder is used if not provided.
 
     Returns:
         A dictionary where keys are chunk numbers or "text_embedding" and values are the corresponding embeddings.
@@ -221,16 +539,16 @@ def get_page_text_embedding(text_data: Union[dict, str]) -> dict:
     if not text_data:
         return embeddings_dict
 
+    if embedder is None:
+        embedder = get_default_embedder()
+
     if isinstance(text_data, dict):
-        # Process each chunk
-        # print(text_data)
-        for chunk_number, chunk_value in text_data.items():
-            text_embed = get_text_embedding_from_text_embedding_model(text=chunk_value)
-            embeddings_dict[chunk_number] = text_embed
+        # Process all chunks in batched requests
+        chunk_embeddings = embedder.embed(list(text_data.values()))
+        embeddings_dict = dict(zip(text_data.keys(), chunk_embeddings))
     else:
         # Process the first 1000 characters of the page text
-        text_embed = get_text_embedding_from_text_embedding_model(text=text_data)
-        embeddings_dict["text_embedding"] = text_embed
+        embeddings_dict["text_embedding"] = embedder.embed([text_data])[0]
 
     return embeddings_dict
 
@@ -240,6 +558,7 @@ def get_chunk_text_metadata(
     character_limit: int = 1000,
     overlap: int = 100,
     embedding_size: int = 128,
+    embedder: Optional[BatchTextEmbedder] = None,
 ) -> tuple[str, dict, dict, dict]:
     """
     * Extracts text from a given page object, chunks it, and generates embeddings for each chunk.
@@ -251,6 +570,8 @@ def get_chunk_text_metadata(
         character_limit: Maximum characters per chunk (defaults to 1000).
         overlap: Number of overlapping characters between chunks (defaults to 100).
         embedding_size: Size of the embedding vector (defaults to 128).
+        embedder: The `BatchTextEmbedder` shared by the page-level and chunk-level embeddings.
+                  The shared default embedder is used if not provided.
 
     Returns:
         A tuple containing:
@@ -267,35 +588,40 @@ def get_chunk_text_metadata(
     if overlap > character_limit:
         raise ValueError("Overlap cannot be larger than character limit.")
 
+    if embedder is None:
+        embedder = get_default_embedder()
+
     # Extract text from the page
-    text: str = page.get_text().encode("ascii", "ignore").decode("utf-8", "ignore")
+    text: str = normalize_text(page.get_text())
 
-    # Get whole-page text embeddings
-    page_text_embeddings_dict: dict = get_page_text_embedding(text)
+    # Chunk the already normalized text with the given limit and overlap
+    chunked_text_dict: dict = get_text_overlapping_chunk(
+        text, character_limit, overlap, normalize=False
+    )
 
-    # Chunk the text with the given limit and overlap
-    chunked_text_dict: dict = get_text_overlapping_chunk(text, character_limit, overlap)
-    # print(chunked_text_dict)
+    page_text_embeddings_dict: dict = {}
+    chunk_embeddings_dict: dict = {}
 
-    # Get embeddings for the chunks
-    chunk_embeddings_dict: dict = get_page_text_embedding(chunked_text_dict)
-    # print(chunk_embeddings_dict)
+    if text:
+        # Embed the whole page and all its chunks in the same batched requests
+        text_embeddings = embedder.embed([text] + list(chunked_text_dict.values()))
+        page_text_embeddings_dict["text_embedding"] = text_embeddings[0]
+        chunk_embeddings_dict = dict(zip(chunked_text_dict.keys(), text_embeddings[1:]))
 
     # Return all extracted data
     return text, page_text_embeddings_dict, chunked_text_dict, chunk_embeddings_dict
 
 
-def get_image_for_gemini(
+def save_image_from_pdf(
     doc: fitz.Document,
     image: tuple,
     image_no: int,
     image_save_dir: str,
     file_name: str,
     page_num: int,
-) -> Tuple[Image, str]:
+) -> str:
     """
-    Extracts an image from a PDF document, converts it to JPEG format, saves it to a specified directory,
-    and loads it as a PIL Image Object.
+    Extracts an image from a PDF document, converts it to JPEG format and saves it to a specified directory.
 
     Parameters:
     - doc (fitz.Document): The PDF document from which the image is extracted.
@@ -306,7 +632,7 @@ def get_image_for_gemini(
     - page_num (int): The page number from which the image is extracted.
 
     Returns:
-    - Tuple[Image.Image, str]: A tuple containing the Gemini Image object and the image filename.
+    - str: The saved image filename.
     """
 
     # Extract the image from the document
@@ -325,12 +651,47 @@ def get_image_for_gemini(
     # Save the image to the specified location
     pix.save(image_name)
 
+    return image_name
+
+
+def get_image_for_gemini(
+    doc: fitz.Document,
+    image: tuple,
+    image_no: int,
+    image_save_dir: str,
+    file_name: str,
+    page_num: int,
+) -> Tuple[Image, str]:
+    """
+    Extracts an image from a PDF document, converts it to JPEG format, saves it to a specified directory,
+    and loads it as a PIL Image Object.
+
+    Parameters:
+    - doc (fitz.Document): The PDF document from which the image is extracted.
+    - image (tuple): A tuple containing image information.
+    - image_no (int): The image number for naming purposes.
+    - image_save_dir (str): The directory where the image will be saved.
+    - file_name (str): The base name for the image file.
+    - page_num (int): The page number from which the image is extracted.
+
+    Returns:
+    - Tuple[Image.Image, str]: A tuple containing the Gemini Image object and the image filename.
+    """
+
+    image_name = save_image_from_pdf(
+        doc, image, image_no, image_save_dir, file_name, page_num
+    )
+
     # Load the saved image as a Gemini Image Object
     image_for_gemini = Image.load_from_file(image_name)
 
     return image_for_gemini, image_name
 
 
+# Placeholder text appended to a Gemini response for each chunk that failed
+GEMINI_ERROR_RESPONSE = "Exception occurred"
+
+
 def get_gemini_response(
     generative_multimodal_model,
     model_input: List[str],
@@ -371,28 +732,27 @@ def get_gemini_response(
                 "Exception occurred while calling gemini. Something is wrong. Lower the safety thresholds [safety_settings: BLOCK_NONE ] if not already done. -----",
                 e,
             )
-            response_list.append("Exception occurred")
+            response_list.append(GEMINI_ERROR_RESPONSE)
             continue
     response = "".join(response_list)
 
     return response
 
 
-def get_text_metadata_df(
+def get_text_metadata_rows(
     filename: str, text_metadata: Dict[Union[int, str], Dict]
-) -> pd.DataFrame:
+) -> List[Dict]:
     """
     This function takes a filename and a text metadata dictionary as input,
     iterates over the text metadata dictionary and extracts the text, chunk text,
-    and chunk embeddings for each page, creates a Pandas DataFrame with the
-    extracted data, and returns it.
+    and chunk embeddings for each page as one row per chunk.
 
     Args:
         filename: The filename of the document.
         text_metadata: A dictionary containing the text metadata for each page.
 
     Returns:
-        A Pandas DataFrame with the extracted text, chunk text, and chunk embeddings for each page.
+        A list of dictionaries with the extracted text, chunk text, and chunk embeddings for each chunk.
     """
 
     final_data_text: List[Dict] = []
@@ -412,26 +772,45 @@ def get_text_metadata_df(
 
             final_data_text.append(data)
 
-    return_df = pd.DataFrame(final_data_text)
+    return final_data_text
+
+
+def get_text_metadata_df(
+    filename: str, text_metadata: Dict[Union[int, str], Dict]
+) -> pd.DataFrame:
+    """
+    This function takes a filename and a text metadata dictionary as input,
+    iterates over the text metadata dictionary and extracts the text, chunk text,
+    and chunk embeddings for each page, creates a Pandas DataFrame with the
+    extracted data, and returns it.
+
+    Args:
+        filename: The filename of the document.
+        text_metadata: A dictionary containing the text metadata for each page.
+
+    Returns:
+        A Pandas DataFrame with the extracted text, chunk text, and chunk embeddings for each page.
+    """
+
+    return_df = pd.DataFrame(get_text_metadata_rows(filename, text_metadata))
     return_df = return_df.reset_index(drop=True)
     return return_df
 
 
-def get_image_metadata_df(
+def get_image_metadata_rows(
     filename: str, image_metadata: Dict[Union[int, str], Dict]
-) -> pd.DataFrame:
+) -> List[Dict]:
     """
     This function takes a filename and an image metadata dictionary as input,
     iterates over the image metadata dictionary and extracts the image path,
-    image description, and image embeddings for each image, creates a Pandas
-    DataFrame with the extracted data, and returns it.
+    image description, and image embeddings for each image as one row per image.
 
     Args:
         filename: The filename of the document.
         image_metadata: A dictionary containing the image metadata for each page.
 
     Returns:
-        A Pandas DataFrame with the extracted image path, image description, and image embeddings for each image.
+        A list of dictionaries with the extracted image path, image description, and image embeddings for each image.
     """
 
     final_data_image: List[Dict] = []
@@ -454,11 +833,453 @@ def get_image_metadata_df(
             ]
             final_data_image.append(data)
 
-    return_df = pd.DataFrame(final_data_image).dropna()
+    return final_data_image
+
+
+def get_image_metadata_df(
+    filename: str, image_metadata: Dict[Union[int, str], Dict]
+) -> pd.DataFrame:
+    """
+    This function takes a filename and an image metadata dictionary as input,
+    iterates over the image metadata dictionary and extracts the image path,
+    image description, and image embeddings for each image, creates a Pandas
+    DataFrame with the extracted data, and returns it.
+
+    Args:
+        filename: The filename of the document.
+        image_metadata: A dictionary containing the image metadata for each page.
+
+    Returns:
+        A Pandas DataFrame with the extracted image path, image description, and image embeddings for each image.
+    """
+
+    return_df = pd.DataFrame(get_image_metadata_rows(filename, image_metadata)).dropna()
     return_df = return_df.reset_index(drop=True)
     return return_df
 
 
+def extract_pdf_contents(pdf_path: str, image_save_dir: str) -> Dict[str, Any]:
+    """
+    Extracts the text and saves the images of every page of a PDF document.
+    This runs in a worker process, so it only returns plain, picklable data.
+
+    Args:
+        pdf_path: The path to the PDF document.
+        image_save_dir: The directory where extracted images should be saved.
+
+    Returns:
+        A dictionary with the "file_name" and a "pages" list. Each page holds its "page_num",
+        its ASCII-normalized "text" and the "image_paths" of its saved images.
+    """
+
+    doc, num_pages = get_pdf_doc_object(pdf_path)
+    file_name = pdf_path.split("/")[-1]
+
+    pages: List[Dict[str, Any]] = []
+    for page_num in range(num_pages):
+        page = doc[page_num]
+        text = normalize_text(page.get_text())
+        image_paths = [
+            save_image_from_pdf(
+                doc, image, image_no, image_save_dir, file_name, page_num
+            )
+            for image_no, image in enumerate(page.get_images())
+        ]
+        pages.append({"page_num": page_num, "text": text, "image_paths": image_paths})
+
+    return {"file_name": file_name, "pages": pages}
+
+
+def get_pages_text_metadata(
+    page_texts: Dict[int, str],
+    embedder: BatchTextEmbedder,
+    character_limit: int = 1000,
+    overlap: int = 100,
+) -> Dict[int, Dict]:
+    """
+    Chunks the text of many pages and embeds every page and chunk in one batched embedder call,
+    so requests are packed across page boundaries.
+
+    Args:
+        page_texts: A dictionary of page number to normalized page text.
+        embedder: The `BatchTextEmbedder` used for the page-level and chunk-level embeddings.
+        character_limit: Maximum characters per chunk (defaults to 1000).
+        overlap: Number of overlapping characters between chunks (defaults to 100).
+
+    Returns:
+        A dictionary of page number to the "text", "page_text_embeddings", "chunked_text_dict"
+        and "chunk_embeddings_dict" of that page, as built by `get_chunk_text_metadata`.
+    """
+
+    chunked_text_dicts = {
+        page_num: get_text_overlapping_chunk(
+            text, character_limit, overlap, normalize=False
+        )
+        for page_num, text in page_texts.items()
+    }
+
+    texts: List[str] = []
+    for page_num, text in page_texts.items():
+        if text:
+            texts.append(text)
+            texts.extend(chunked_text_dicts[page_num].values())
+
+    text_embeddings = iter(embedder.embed(texts))
+
+    text_metadata: Dict[int, Dict] = {}
+    for page_num, text in page_texts.items():
+        page_text_embeddings_dict: dict = {}
+        chunk_embeddings_dict: dict = {}
+
+        if text:
+            page_text_embeddings_dict["text_embedding"] = next(text_embeddings)
+            chunk_embeddings_dict = {
+                chunk_number: next(text_embeddings)
+                for chunk_number in chunked_text_dicts[page_num]
+            }
+
+        text_metadata[page_num] = {
+            "text": text,
+            "page_text_embeddings": page_text_embeddings_dict,
+            "chunked_text_dict": chunked_text_dicts[page_num],
+            "chunk_embeddings_dict": chunk_embeddings_dict,
+        }
+
+    return text_metadata
+
+
+def get_model_name(generative_multimodal_model) -> str:
+    """Returns the name of a Gemini model, or its class name if it has none."""
+
+    return getattr(
+        generative_multimodal_model,
+        "_model_name",
+        type(generative_multimodal_model).__name__,
+    )
+
+
+class ImageResultCache:
+    """
+    An on-disk, content-addressed cache for image descriptions and embeddings.
+    Entries are keyed by a hash of the image bytes and every input that changes the result,
+    so repeated logos and headers are only described and embedded once. The least recently
+    used entries are evicted when the cache grows past `max_size_bytes`.
+    """
+
+    def __init__(self, cache_dir: str, max_size_bytes: int = 512 * 1024 * 1024) -> None:
+        """
+        Args:
+            cache_dir: The directory holding one JSON file per cache entry.
+            max_size_bytes: The total size of the entries above which the oldest are evicted.
+        """
+
+        self.cache_dir = cache_dir
+        self.max_size_bytes = max_size_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(cache_dir, exist_ok=True)
+
+        # Rebuild the LRU order from the file access times of a previous run
+        entries = []
+        for entry in os.scandir(cache_dir):
+            if entry.name.endswith(".json"):
+                stat = entry.stat()
+                entries.append(
+                    (stat.st_mtime, entry.name[: -len(".json")], stat.st_size)
+                )
+
+        self._sizes: "OrderedDict[str, int]" = OrderedDict(
+            (key, size) for _, key, size in sorted(entries)
+        )
+        self._total_size = sum(self._sizes.values())
+
+    @staticmethod
+    def make_key(*parts: Union[bytes, str]) -> str:
+        """Returns the SHA-256 hex digest of the given parts."""
+
+        digest = hashlib.sha256()
+        for part in parts:
+            part_bytes = part if isinstance(part, bytes) else part.encode("utf-8")
+            # Length-prefix every part so that different splits never collide
+            digest.update(len(part_bytes).to_bytes(8, "big"))
+            digest.update(part_bytes)
+        return digest.hexdigest()
+
+    def _get_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + ".json")
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Returns the cached value for `key`, or None on a miss.
+        """
+
+        with self._lock:
+            if key not in self._sizes:
+                self.misses += 1
+                return None
+
+            path = self._get_path(key)
+            try:
+                with open(path) as f:
+                    value = json.load(f)
+            except (OSError, ValueError):
+                self._total_size -= self._sizes.pop(key)
+                self.misses += 1
+                return None
+
+            os.utime(path)
+            self._sizes.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any) -> None:
+        """
+        Stores `value` under `key` and evicts the least recently used entries if needed.
+        """
+
+        data = json.dumps(value, default=lambda item: np.asarray(item).tolist())
+
+        with self._lock:
+            path = self._get_path(key)
+            temp_path = path + ".tmp"
+            with open(temp_path, "w") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+
+            self._total_size -= self._sizes.pop(key, 0)
+            self._sizes[key] = len(data)
+            self._total_size += len(data)
+
+            while self._total_size > self.max_size_bytes and len(self._sizes) > 1:
+                evicted_key, evicted_size = self._sizes.popitem(last=False)
+                self._total_size -= evicted_size
+                try:
+                    os.remove(self._get_path(evicted_key))
+                except FileNotFoundError:
+                    pass
+
+
+def get_image_description_and_embeddings(
+    generative_multimodal_model,
+    image_path: str,
+    image_description_prompt: str,
+    embedder: BatchTextEmbedder,
+    embedding_size: int = 128,
+    generation_config: Optional[GenerationConfig] = None,
+    safety_settings: Optional[dict] = None,
+    rate_limiter: Optional[TokenBucketRateLimiter] = None,
+    image_cache: Optional[ImageResultCache] = None,
+) -> Dict[str, Any]:
+    """
+    Describes a saved image with Gemini and generates its image and description embeddings.
+
+    Args:
+        generative_multimodal_model: The Gemini model used to describe the image.
+        image_path: The path of the saved image.
+        image_description_prompt: A prompt to guide Gemini for generating image descriptions.
+        embedder: The `BatchTextEmbedder` used to embed the image description.
+        embedding_size: The dimensionality of the image embedding.
+        generation_config: The Gemini generation config.
+        safety_settings: The Gemini safety settings.
+        rate_limiter: If provided, the Gemini and multimodal embedding calls wait for a token first.
+        image_cache: If provided, descriptions and embeddings are looked up there before calling out.
+
+    Returns:
+        A dictionary with the "img_desc", "mm_embedding_from_img_only" and
+        "text_embedding_from_image_description" of the image.
+    """
+
+    description_key = image_embedding_key = None
+    description = image_embedding = None
+
+    if image_cache is not None:
+        with open(image_path, "rb") as f:
+            image_bytes = f.read()
+
+        model_name = get_model_name(generative_multimodal_model)
+        config = (
+            json.dumps(generation_config.to_dict(), sort_keys=True)
+            if generation_config is not None
+            else ""
+        )
+        safety = (
+            json.dumps(
+                {
+                    str(category): str(threshold)
+                    for category, threshold in safety_settings.items()
+                },
+                sort_keys=True,
+            )
+            if isinstance(safety_settings, dict)
+            else str(safety_settings)
+        )
+        description_key = image_cache.make_key(
+            image_bytes,
+            image_description_prompt,
+            model_name,
+            config,
+            safety,
+            TEXT_EMBEDDING_MODEL_NAME,
+        )
+        image_embedding_key = image_cache.make_key(
+            image_bytes, MULTIMODAL_EMBEDDING_MODEL_NAME, str(embedding_size)
+        )
+        description = image_cache.get(description_key)
+        image_embedding = image_cache.get(image_embedding_key)
+
+    if description is None:
+        image_for_gemini = Image.load_from_file(image_path)
+
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+        response = get_gemini_response(
+            generative_multimodal_model,
+            model_input=[image_description_prompt, image_for_gemini],
+            generation_config=generation_config,
+            safety_settings=safety_settings,
+            stream=True,
+        )
+
+        description = {
+            "img_desc": response,
+            "text_embedding_from_image_description": embedder.embed([response])[0],
+        }
+        # Failed responses are not cached, so the image is described again next run
+        if image_cache is not None and GEMINI_ERROR_RESPONSE not in response:
+            image_cache.set(description_key, description)
+
+    if image_embedding is None:
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+        image_embedding = get_image_embedding_from_multimodal_embedding_model(
+            image_uri=image_path,
+            embedding_size=embedding_size,
+        )
+        if image_cache is not None:
+            image_cache.set(image_embedding_key, image_embedding)
+
+    return {
+        "img_desc": description["img_desc"],
+        # "mm_embedding_from_text_desc_and_img": image_embedding_with_description,
+        "mm_embedding_from_img_only": image_embedding,
+        "text_embedding_from_image_description": description[
+            "text_embedding_from_image_description"
+        ],
+    }
+
+
+def get_checkpoint_path(checkpoint_dir: str, pdf_path: str) -> str:
+    """Returns the path of the checkpoint file holding the processed rows of a PDF."""
+
+    return os.path.join(checkpoint_dir, pdf_path.split("/")[-1] + ".json")
+
+
+def get_pdf_fingerprint(pdf_path: str) -> Dict[str, int]:
+    """Returns the size and modification time of a PDF, stored with its checkpoint."""
+
+    stat = os.stat(pdf_path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def get_checkpoint_params(
+    generative_multimodal_model, image_description_prompt: str, embedding_size: int
+) -> Dict[str, Union[int, str]]:
+    """Returns the inputs that change the processed rows, stored with every checkpoint."""
+
+    return {
+        "model_name": get_model_name(generative_multimodal_model),
+        "image_description_prompt": image_description_prompt,
+        "embedding_size": embedding_size,
+        "text_embedding_model_name": TEXT_EMBEDDING_MODEL_NAME,
+        "multimodal_embedding_model_name": MULTIMODAL_EMBEDDING_MODEL_NAME,
+    }
+
+
+def load_document_checkpoint(
+    checkpoint_dir: Optional[str],
+    pdf_path: str,
+    params: Optional[Dict[str, Union[int, str]]] = None,
+) -> Optional[Dict[str, List[Dict]]]:
+    """
+    Loads the text and image rows saved for a PDF by a previous run.
+
+    Args:
+        checkpoint_dir: The checkpoint directory, or None if checkpointing is disabled.
+        pdf_path: The path to the PDF document.
+        params: The processing parameters from `get_checkpoint_params` of the current run.
+
+    Returns:
+        A dictionary with "text_rows" and "image_rows", or None if the PDF has not been processed yet,
+        or if the PDF or the processing parameters have changed since its checkpoint was saved.
+    """
+
+    if checkpoint_dir is None:
+        return None
+
+    checkpoint_path = get_checkpoint_path(checkpoint_dir, pdf_path)
+    if not os.path.exists(checkpoint_path):
+        return None
+
+    with open(checkpoint_path) as f:
+        checkpoint = json.load(f)
+
+    if checkpoint.get("source") != get_pdf_fingerprint(pdf_path):
+        print("Discarding the outdated checkpoint of the changed file: ", pdf_path)
+        return None
+
+    if checkpoint.get("params") != params:
+        print(
+            "Discarding the checkpoint made with different parameters of the file: ",
+            pdf_path,
+        )
+        return None
+
+    return checkpoint
+
+
+def save_document_checkpoint(
+    checkpoint_dir: Optional[str],
+    pdf_path: str,
+    text_rows: List[Dict],
+    image_rows: List[Dict],
+    params: Optional[Dict[str, Union[int, str]]] = None,
+) -> None:
+    """
+    Saves the text and image rows of a processed PDF, so a later run can skip it as long as the
+    PDF's size and modification time and the processing parameters are unchanged.
+    The file is written to a temporary name first, so a crash never leaves a partial checkpoint.
+
+    Args:
+        checkpoint_dir: The checkpoint directory, or None if checkpointing is disabled.
+        pdf_path: The path to the PDF document.
+        text_rows: The text metadata rows of the PDF.
+        image_rows: The image metadata rows of the PDF.
+        params: The processing parameters from `get_checkpoint_params`.
+    """
+
+    if checkpoint_dir is None:
+        return
+
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    checkpoint_path = get_checkpoint_path(checkpoint_dir, pdf_path)
+    temp_path = checkpoint_path + ".tmp"
+
+    with open(temp_path, "w") as f:
+        json.dump(
+            {
+                "source": get_pdf_fingerprint(pdf_path),
+                "params": params,
+                "text_rows": text_rows,
+                "image_rows": image_rows,
+            },
+            f,
+            default=lambda value: np.asarray(value).tolist(),
+        )
+    os.replace(temp_path, checkpoint_path)
+
+
 def get_document_metadata(
     generative_multimodal_model,
     pdf_folder_path: str,
@@ -476,16 +1297,37 @@ def get_document_metadata(
     },
     add_sleep_after_page: bool = False,
     sleep_time_after_page: int = 2,
+    embedder: Optional[BatchTextEmbedder] = None,
+    requests_per_minute: float = 120,
+    max_concurrent_requests: int = 8,
+    max_extraction_workers: Optional[int] = None,
+    checkpoint_dir: Optional[str] = None,
+    image_cache: Optional[ImageResultCache] = None,
 ) -> Tuple[pd.DataFrame, pd.DataFrame]:
     """
     This function takes a PDF path, an image save directory, an image description prompt, an embedding size, and a text embedding text limit as input.
 
+    PDFs are processed as a staged pipeline: pages and images are extracted in a process pool,
+    while the Gemini description and embedding calls for already extracted files run concurrently
+    under a token-bucket rate limiter. Rows are collected in lists and the DataFrames are built once.
+
     Args:
         pdf_path: The path to the PDF document.
         image_save_dir: The directory where extracted images should be saved.
         image_description_prompt: A prompt to guide Gemini for generating image descriptions.
         embedding_size: The dimensionality of the embedding vectors.
         text_emb_text_limit: The maximum number of tokens for text embedding.
+        add_sleep_after_page: Deprecated. API calls are now paced by `requests_per_minute`.
+        sleep_time_after_page: Deprecated. API calls are now paced by `requests_per_minute`.
+        embedder: The `BatchTextEmbedder` used for all text embeddings. A new one is created and shut down at the end if not provided.
+        requests_per_minute: The quota shared by all Gemini and embedding calls.
+        max_concurrent_requests: The number of images described and embedded at the same time.
+        max_extraction_workers: The number of processes extracting pages and images. Defaults to the CPU count.
+        checkpoint_dir: If set, the rows of every finished PDF are saved there, and PDFs
+                        with a checkpoint are skipped, so a crashed run can be resumed. A checkpoint
+                        made with another model, prompt or embedding size is not reused.
+        image_cache: If provided, image descriptions and embeddings are served from this cache when
+                     the same image was already processed, and hit/miss counts are printed at the end.
 
     Returns:
         A tuple containing two DataFrames:
@@ -493,111 +1335,205 @@ def get_document_metadata(
             * Another DataFrame containing the extracted image metadata for each image in the PDF, including the image path, image description, image embeddings (with and without context), and image description text embedding.
     """
 
-    text_metadata_df_final, image_metadata_df_final = pd.DataFrame(), pd.DataFrame()
-
-    for pdf_path in glob.glob(pdf_folder_path + "/*.pdf"):
+    if add_sleep_after_page:
         print(
-            "\n\n",
-            "Processing the file: ---------------------------------",
-            pdf_path,
-            "\n\n",
+            "add_sleep_after_page is no longer needed: API calls are paced by requests_per_minute =",
+            requests_per_minute,
         )
 
-        doc, num_pages = get_pdf_doc_object(pdf_path)
+    rate_limiter = TokenBucketRateLimiter(requests_per_minute)
+    # An embedder created here is shut down when all files are processed
+    embedder_context = (
+        BatchTextEmbedder(rate_limiter=rate_limiter)
+        if embedder is None
+        else contextlib.nullcontext(embedder)
+    )
 
-        file_name = pdf_path.split("/")[-1]
+    pdf_paths = sorted(glob.glob(pdf_folder_path + "/*.pdf"))
+    rows_by_file: Dict[str, Dict[str, List[Dict]]] = {}
 
-        text_metadata: Dict[Union[int, str], Dict] = {}
-        image_metadata: Dict[Union[int, str], Dict] = {}
+    checkpoint_params = get_checkpoint_params(
+        generative_multimodal_model, image_description_prompt, embedding_size
+    )
 
-        for page_num in range(num_pages):
-            print(f"Processing page: {page_num + 1}")
+    for pdf_path in pdf_paths:
+        checkpoint = load_document_checkpoint(
+            checkpoint_dir, pdf_path, checkpoint_params
+        )
+        if checkpoint is not None:
+            print("Skipping the already processed file: ", pdf_path)
+            rows_by_file[pdf_path] = checkpoint
+
+    pending_pdf_paths = [
+        pdf_path for pdf_path in pdf_paths if pdf_path not in rows_by_file
+    ]
+
+    with embedder_context as embedder, ProcessPoolExecutor(
+        max_workers=max_extraction_workers
+    ) as process_pool, ThreadPoolExecutor(
+        max_workers=max_concurrent_requests
+    ) as thread_pool:
+        # map() keeps extracting the next files while the model calls for this one run
+        for pdf_path, pdf_contents in zip(
+            pending_pdf_paths,
+            process_pool.map(
+                extract_pdf_contents, pending_pdf_paths, repeat(image_save_dir)
+            ),
+        ):
+            print(
+                "\n\n",
+                "Processing the file: ---------------------------------",
+                pdf_path,
+                "\n\n",
+            )
 
-            page = doc[page_num]
+            file_name = pdf_contents["file_name"]
+            pages = pdf_contents["pages"]
+
+            image_futures = {}
+            for page in pages:
+                for image_no, image_path in enumerate(page["image_paths"]):
+                    image_futures[
+                        (page["page_num"], image_no + 1, image_path)
+                    ] = thread_pool.submit(
+                        get_image_description_and_embeddings,
+                        generative_multimodal_model,
+                        image_path,
+                        image_description_prompt,
+                        embedder,
+                        embedding_size,
+                        generation_config,
+                        safety_settings,
+                        rate_limiter,
+                        image_cache,
+                    )
 
-            text = page.get_text()
-            (
-                text,
-                page_text_embeddings_dict,
-                chunked_text_dict,
-                chunk_embeddings_dict,
-            ) = get_chunk_text_metadata(page, embedding_size=embedding_size)
+            # Embed the text of all pages while the images are being described
+            text_metadata = get_pages_text_metadata(
+                {page["page_num"]: page["text"] for page in pages}, embedder
+            )
 
-            text_metadata[page_num] = {
-                "text": text,
-                "page_text_embeddings": page_text_embeddings_dict,
-                "chunked_text_dict": chunked_text_dict,
-                "chunk_embeddings_dict": chunk_embeddings_dict,
+            image_metadata: Dict[Union[int, str], Dict] = {
+                page["page_num"]: {} for page in pages
             }
+            for (page_num, image_number, image_path), future in image_futures.items():
+                image_metadata[page_num][image_number] = {
+                    "img_num": image_number,
+                    "img_path": image_path,
+                    **future.result(),
+                }
 
-            images = page.get_images()
-            image_metadata[page_num] = {}
+            text_rows = get_text_metadata_rows(file_name, text_metadata)
 
-            for image_no, image in enumerate(images):
-                image_number = int(image_no + 1)
-                image_metadata[page_num][image_number] = {}
+            # Keep the first image for every distinct description
+            image_rows: List[Dict] = []
+            seen_descriptions = set()
+            for row in get_image_metadata_rows(file_name, image_metadata):
+                if row["img_desc"] not in seen_descriptions:
+                    seen_descriptions.add(row["img_desc"])
+                    image_rows.append(row)
 
-                image_for_gemini, image_name = get_image_for_gemini(
-                    doc, image, image_no, image_save_dir, file_name, page_num
-                )
+            save_document_checkpoint(
+                checkpoint_dir, pdf_path, text_rows, image_rows, checkpoint_params
+            )
+            rows_by_file[pdf_path] = {"text_rows": text_rows, "image_rows": image_rows}
 
-                print(
-                    f"Extracting image from page: {page_num + 1}, saved as: {image_name}"
-                )
+    if image_cache is not None:
+        print(
+            f"Image cache hits: {image_cache.hits}, misses: {image_cache.misses}",
+        )
 
-                response = get_gemini_response(
-                    generative_multimodal_model,
-                    model_input=[image_description_prompt, image_for_gemini],
-                    generation_config=generation_config,
-                    safety_settings=safety_settings,
-                    stream=True,
-                )
+    text_metadata_rows: List[Dict] = []
+    image_metadata_rows: List[Dict] = []
+    for pdf_path in pdf_paths:
+        text_metadata_rows.extend(rows_by_file[pdf_path]["text_rows"])
+        image_metadata_rows.extend(rows_by_file[pdf_path]["image_rows"])
 
-                image_embedding = get_image_embedding_from_multimodal_embedding_model(
-                    image_uri=image_name,
-                    embedding_size=embedding_size,
-                )
+    text_metadata_df_final = pd.DataFrame(text_metadata_rows).reset_index(drop=True)
+    image_metadata_df_final = (
+        pd.DataFrame(image_metadata_rows).dropna().reset_index(drop=True)
+    )
 
-                image_description_text_embedding = (
-                    get_text_embedding_from_text_embedding_model(text=response)
-                )
+    return text_metadata_df_final, image_metadata_df_final
 
-                image_metadata[page_num][image_number] = {
-                    "img_num": image_number,
-                    "img_path": image_name,
-                    "img_desc": response,
-                    # "mm_embedding_from_text_desc_and_img": image_embedding_with_description,
-                    "mm_embedding_from_img_only": image_embedding,
-                    "text_embedding_from_image_description": image_description_text_embedding,
-                }
 
-            # Add sleep to reduce issues with Quota error on API
-            if add_sleep_after_page:
-                time.sleep(sleep_time_after_page)
-                print(
-                    "Sleeping for ",
-                    sleep_time_after_page,
-                    """ sec before processing the next page to avoid quota issues. You can disable it: "add_sleep_after_page = False"  """,
-                )
+def save_metadata_df(
+    metadata_df: pd.DataFrame,
+    save_dir: str,
+    embedding_columns: Optional[List[str]] = None,
+) -> None:
+    """
+    Saves a text or image metadata DataFrame in a columnar layout: the scalar columns go to a
+    Parquet file, and each embedding column goes to its own float32 `.npy` matrix whose row i
+    belongs to the row with `row_id` i. Writing Parquet requires `pyarrow`.
+
+    Args:
+        metadata_df: A DataFrame from `get_text_metadata_df`, `get_image_metadata_df` or `get_document_metadata`.
+        save_dir: The directory to write `metadata.parquet`, `manifest.json` and the `.npy` files to.
+        embedding_columns: The columns holding embeddings. Defaults to every column whose values are lists or arrays.
+    """
 
-        text_metadata_df = get_text_metadata_df(file_name, text_metadata)
-        image_metadata_df = get_image_metadata_df(file_name, image_metadata)
+    if embedding_columns is None:
+        embedding_columns = [
+            column
+            for column in metadata_df.columns
+            if len(metadata_df)
+            and isinstance(metadata_df[column].iloc[0], (list, np.ndarray))
+        ]
 
-        text_metadata_df_final = pd.concat(
-            [text_metadata_df_final, text_metadata_df], axis=0
-        )
-        image_metadata_df_final = pd.concat(
-            [
-                image_metadata_df_final,
-                image_metadata_df.drop_duplicates(subset=["img_desc"]),
-            ],
-            axis=0,
+    os.makedirs(save_dir, exist_ok=True)
+
+    for column in embedding_columns:
+        embeddings = np.array(metadata_df[column].tolist(), dtype=np.float32)
+        np.save(os.path.join(save_dir, f"{column}.npy"), embeddings)
+
+    scalar_df = metadata_df.drop(columns=embedding_columns).reset_index(drop=True)
+    scalar_df.insert(0, "row_id", np.arange(len(scalar_df)))
+    scalar_df.to_parquet(os.path.join(save_dir, "metadata.parquet"), index=False)
+
+    with open(os.path.join(save_dir, "manifest.json"), "w") as f:
+        json.dump(
+            {"num_rows": len(scalar_df), "embedding_columns": embedding_columns}, f
         )
 
-        text_metadata_df_final = text_metadata_df_final.reset_index(drop=True)
-        image_metadata_df_final = image_metadata_df_final.reset_index(drop=True)
 
-    return text_metadata_df_final, image_metadata_df_final
+def load_metadata_df(
+    save_dir: str, mmap_mode: Optional[str] = "r"
+) -> Tuple[pd.DataFrame, Dict[str, np.ndarray]]:
+    """
+    Loads a metadata DataFrame saved by `save_metadata_df`.
+    The embedding matrices are memory-mapped by default, so opening a large corpus does not read
+    or copy them; pass them to `EmbeddingIndex.from_embeddings` to search them directly.
+
+    Args:
+        save_dir: The directory written by `save_metadata_df`.
+        mmap_mode: The `np.load` memory-map mode, or None to read the matrices into memory.
+
+    Returns:
+        A tuple containing the DataFrame of scalar columns (indexed by position, with a `row_id` column)
+        and a dictionary of embedding column name to float32 matrix aligned with it.
+
+    Raises:
+        ValueError: If an embedding matrix does not have one row per metadata row.
+    """
+
+    with open(os.path.join(save_dir, "manifest.json")) as f:
+        manifest = json.load(f)
+
+    metadata_df = pd.read_parquet(os.path.join(save_dir, "metadata.parquet"))
+
+    embeddings: Dict[str, np.ndarray] = {}
+    for column in manifest["embedding_columns"]:
+        embeddings[column] = np.load(
+            os.path.join(save_dir, f"{column}.npy"), mmap_mode=mmap_mode
+        )
+        if embeddings[column].shape[0] != len(metadata_df):
+            raise ValueError(
+                f"Embedding matrix '{column}' has {embeddings[column].shape[0]} rows, "
+                f"expected {len(metadata_df)}."
+            )
+
+    return metadata_df, embeddings
 
 
 # Helper Functions
@@ -656,6 +1592,167 @@ def get_cosine_score(
     return text_cosine_score
 
 
+class EmbeddingIndex:
+    """
+    An in-memory top-k retrieval index over one embedding column of a metadata DataFrame.
+    The embeddings are copied once into a contiguous float32 matrix, so a query is answered
+    with a single matrix-vector product and `np.argpartition` instead of a row-wise `apply`.
+    """
+
+    def __init__(self, dataframe: pd.DataFrame, column_name: str) -> None:
+        """
+        Builds the index from the embeddings stored in `dataframe[column_name]`.
+
+        Args:
+            dataframe: A metadata DataFrame such as `text_metadata_df` or `image_metadata_df`.
+            column_name: The column containing one embedding (list or NumPy array) per row.
+
+        Raises:
+            KeyError: If the specified `column_name` is not present in the `dataframe`.
+        """
+
+        if column_name not in dataframe.columns:
+            raise KeyError(f"Column '{column_name}' not found in the dataframe")
+
+        self.column_name = column_name
+        self.embeddings: np.ndarray = np.ascontiguousarray(
+            np.array(dataframe[column_name].tolist(), dtype=np.float32)
+        )
+
+    @classmethod
+    def from_embeddings(
+        cls, embeddings: np.ndarray, column_name: str = ""
+    ) -> "EmbeddingIndex":
+        """
+        Builds the index directly from an embedding matrix, such as one returned by `load_metadata_df`.
+        A float32 matrix (including a memory-mapped one) is used as is, without copying.
+
+        Args:
+            embeddings: A 2-D matrix with one embedding per row.
+            column_name: The name of the column the embeddings came from.
+        """
+
+        index = cls.__new__(cls)
+        index.column_name = column_name
+        index.embeddings = np.asarray(embeddings, dtype=np.float32)
+        return index
+
+    def __len__(self) -> int:
+        return self.embeddings.shape[0]
+
+    def search(
+        self,
+        query_embedding: Union[list, np.ndarray],
+        top_n: int = 3,
+        max_score: Optional[float] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Finds the rows whose embeddings have the highest dot product with a single query embedding.
+
+        Args:
+            query_embedding: The query embedding (list or 1-D NumPy array).
+            top_n: The number of rows to return.
+            max_score: If set, rows whose score rounded to two decimals is at least this value are skipped.
+
+        Returns:
+            A tuple of (row positions, scores), both sorted by descending score.
+        """
+
+        indices, scores = self.search_batch([query_embedding], top_n, max_score)
+        return indices[0], scores[0]
+
+    def search_batch(
+        self,
+        query_embeddings: Union[List[list], np.ndarray],
+        top_n: int = 3,
+        max_score: Optional[float] = None,
+    ) -> Tuple[List[np.ndarray], List[np.ndarray]]:
+        """
+        Finds the top N rows for a whole batch of query embeddings with one matrix product.
+
+        Args:
+            query_embeddings: The query embeddings, one per row.
+            top_n: The number of rows to return for each query.
+            max_score: If set, rows whose score rounded to two decimals is at least this value are skipped.
+
+        Returns:
+            A tuple of two lists with one entry per query: the row positions and their scores,
+            both sorted by descending score.
+        """
+
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+
+        # An empty index has no embedding dimension to multiply with
+        top_n = min(top_n, len(self))
+        if top_n <= 0:
+            empty = [np.empty(0, dtype=np.int64) for _ in range(len(queries))]
+            return empty, [np.empty(0, dtype=np.float32) for _ in range(len(queries))]
+
+        scores = queries @ self.embeddings.T
+
+        if max_score is not None:
+            scores[np.round(scores, 2) >= max_score] = -np.inf
+
+        # Select the top N unordered, then sort only those N
+        candidates = np.argpartition(-scores, top_n - 1, axis=1)[:, :top_n]
+        candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+        order = np.argsort(-candidate_scores, axis=1, kind="stable")
+        top_indices = np.take_along_axis(candidates, order, axis=1)
+        top_scores = np.take_along_axis(candidate_scores, order, axis=1)
+
+        indices_list, scores_list = [], []
+        for row_indices, row_scores in zip(top_indices, top_scores):
+            keep = np.isfinite(row_scores)
+            indices_list.append(row_indices[keep])
+            scores_list.append(row_scores[keep])
+
+        return indices_list, scores_list
+
+
+# Indexes built for calls without `index=`, keyed on the DataFrame's id and the column
+_embedding_indexes: "OrderedDict[Tuple[int, str], tuple]" = OrderedDict()
+_embedding_indexes_lock = threading.Lock()
+_MAX_CACHED_EMBEDDING_INDEXES = 8
+
+
+def get_embedding_index(dataframe: pd.DataFrame, column_name: str) -> EmbeddingIndex:
+    """
+    Returns the `EmbeddingIndex` over `dataframe[column_name]`, building it only the first time
+    the DataFrame is searched. An index is rebuilt if the DataFrame's row count changes; after
+    editing embeddings in place, pass a fresh DataFrame or an explicit `index=`.
+
+    Args:
+        dataframe: A metadata DataFrame such as `text_metadata_df` or `image_metadata_df`.
+        column_name: The column containing one embedding per row.
+
+    Returns:
+        The cached or newly built `EmbeddingIndex`.
+    """
+
+    key = (id(dataframe), column_name)
+
+    with _embedding_indexes_lock:
+        cached = _embedding_indexes.get(key)
+        # The id of a garbage collected DataFrame can be reused, so check it is the same object
+        if (
+            cached is not None
+            and cached[0]() is dataframe
+            and len(cached[1]) == len(dataframe)
+        ):
+            _embedding_indexes.move_to_end(key)
+            return cached[1]
+
+    index = EmbeddingIndex(dataframe, column_name)
+
+    with _embedding_indexes_lock:
+        _embedding_indexes[key] = (weakref.ref(dataframe), index)
+        _embedding_indexes.move_to_end(key)
+        while len(_embedding_indexes) > _MAX_CACHED_EMBEDDING_INDEXES:
+            _embedding_indexes.popitem(last=False)
+
+    return index
+
+
 def print_text_to_image_citation(
     final_images: Dict[int, Dict[str, Any]], print_top: bool = True
 ) -> None:
@@ -769,6 +1866,7 @@ def get_similar_image_from_query(
     image_emb: bool = True,
     top_n: int = 3,
     embedding_size: int = 128,
+    index: Optional[EmbeddingIndex] = None,
 ) -> Dict[int, Dict[str, Any]]:
     """
     Finds the top N most similar images from a metadata DataFrame based on a text query or an image query.
@@ -782,34 +1880,31 @@ def get_similar_image_from_query(
         image_emb: Whether to use image embeddings (True) or text captions (False) for comparisons.
         top_n: The number of most similar images to return.
         embedding_size: The dimensionality of the image embeddings (only used if image_emb is True).
+        index: A prebuilt `EmbeddingIndex` over `column_name` of `image_metadata_df`. If not provided, one is built on the first call and reused for later calls on the same DataFrame.
 
     Returns:
         A dictionary containing information about the top N most similar images, including cosine scores, image objects, paths, page numbers, text excerpts, and descriptions.
     """
+    if index is None:
+        index = get_embedding_index(image_metadata_df, column_name)
+
     # Check if image embedding is used
     if image_emb:
         # Calculate cosine similarity between query image and metadata images
-        user_query_image_embedding = get_user_query_image_embeddings(
+        user_query_embedding = get_user_query_image_embeddings(
             image_query_path, embedding_size
         )
-        cosine_scores = image_metadata_df.apply(
-            lambda x: get_cosine_score(x, column_name, user_query_image_embedding),
-            axis=1,
-        )
     else:
         # Calculate cosine similarity between query text and metadata image captions
-        user_query_text_embedding = get_user_query_text_embeddings(query)
-        cosine_scores = image_metadata_df.apply(
-            lambda x: get_cosine_score(x, column_name, user_query_text_embedding),
-            axis=1,
-        )
-
-    # Remove same image comparison score when user image is matched exactly with metadata image
-    cosine_scores = cosine_scores[cosine_scores < 1.0]
+        user_query_embedding = get_user_query_text_embeddings(query)
 
-    # Get top N cosine scores and their indices
-    top_n_cosine_scores = cosine_scores.nlargest(top_n).index.tolist()
-    top_n_cosine_values = cosine_scores.nlargest(top_n).values.tolist()
+    # Get top N cosine scores and their indices, removing same image comparison score
+    # when user image is matched exactly with metadata image
+    top_n_indices, top_n_scores = index.search(
+        user_query_embedding, top_n=top_n, max_score=1.0
+    )
+    top_n_cosine_scores = top_n_indices.tolist()
+    top_n_cosine_values = np.round(top_n_scores, 2).tolist()
 
     # Create a dictionary to store matched images and their information
     final_images: Dict[int, Dict[str, Any]] = {}
@@ -873,6 +1968,7 @@ def get_similar_text_from_query(
     top_n: int = 3,
     chunk_text: bool = True,
     print_citation: bool = False,
+    index: Optional[EmbeddingIndex] = None,
 ) -> Dict[int, Dict[str, Any]]:
     """
     Finds the top N most similar text passages from a metadata DataFrame based on a text query.
@@ -885,6 +1981,7 @@ def get_similar_text_from_query(
         embedding_size: The dimensionality of the text embeddings (only used if text embeddings are stored in the column specified by `column_name`).
         chunk_text: Whether to return individual text chunks (True) or the entire page text (False).
         print_citation: Whether to immediately print formatted citations for the matched text passages (True) or just return the dictionary (False).
+        index: A prebuilt `EmbeddingIndex` over `column_name` of `text_metadata_df`. If not provided, one is built on the first call and reused for later calls on the same DataFrame.
 
     Returns:
         A dictionary containing information about the top N most similar text passages, including cosine scores, page numbers, chunk numbers (optional), and chunk text or page text (depending on `chunk_text`).
@@ -893,39 +1990,34 @@ def get_similar_text_from_query(
         KeyError: If the specified `column_name` is not present in the `text_metadata_df`.
     """
 
-    if column_name not in text_metadata_df.columns:
-        raise KeyError(f"Column '{column_name}' not found in the 'text_metadata_df'")
+    if index is None:
+        if column_name not in text_metadata_df.columns:
+            raise KeyError(
+                f"Column '{column_name}' not found in the 'text_metadata_df'"
+            )
+        index = get_embedding_index(text_metadata_df, column_name)
 
     query_vector = get_user_query_text_embeddings(query)
 
-    # Calculate cosine similarity between query text and metadata text
-    cosine_scores = text_metadata_df.apply(
-        lambda row: get_cosine_score(
-            row,
-            column_name,
-            query_vector,
-        ),
-        axis=1,
-    )
-
     # Get top N cosine scores and their indices
-    top_n_indices = cosine_scores.nlargest(top_n).index.tolist()
-    top_n_scores = cosine_scores.nlargest(top_n).values.tolist()
+    top_n_indices, top_n_scores = index.search(query_vector, top_n=top_n)
+    top_n_indices = top_n_indices.tolist()
+    top_n_scores = np.round(top_n_scores, 2).tolist()
 
     # Create a dictionary to store matched text and their information
     final_text: Dict[int, Dict[str, Any]] = {}
 
-    for matched_textno, index in enumerate(top_n_indices):
+    for matched_textno, position in enumerate(top_n_indices):
         # Create a sub-dictionary for each matched text
         final_text[matched_textno] = {}
 
         # Store page number
-        final_text[matched_textno]["file_name"] = text_metadata_df.iloc[index][
+        final_text[matched_textno]["file_name"] = text_metadata_df.iloc[position][
             "file_name"
         ]
 
         # Store page number
-        final_text[matched_textno]["page_num"] = text_metadata_df.iloc[index][
+        final_text[matched_textno]["page_num"] = text_metadata_df.iloc[position][
             "page_num"
         ]
 
@@ -934,17 +2026,17 @@ def get_similar_text_from_query(
 
         if chunk_text:
             # Store chunk number
-            final_text[matched_textno]["chunk_number"] = text_metadata_df.iloc[index][
-                "chunk_number"
-            ]
+            final_text[matched_textno]["chunk_number"] = text_metadata_df.iloc[
+                position
+            ]["chunk_number"]
 
             # Store chunk text
-            final_text[matched_textno]["chunk_text"] = text_metadata_df["chunk_text"][
-                index
+            final_text[matched_textno]["chunk_text"] = text_metadata_df.iloc[position][
+                "chunk_text"
             ]
         else:
             # Store page text
-            final_text[matched_textno]["text"] = text_metadata_df["text"][index]
+            final_text[matched_textno]["text"] = text_metadata_df.iloc[position]["text"]
 
     # Optionally print citations immediately
     if print_citation:
@@ -2,9 +2,17 @@
 
 from __future__ import annotations
 
+import asyncio
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import itertools
 import json
 import logging
-from typing import Any, Iterable, List, Optional, Type
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Type, Union
 import uuid
 
 import google.auth
@@ -21,6 +29,182 @@ import requests
 logger = logging.getLogger()
 
 
+class DocumentCache:
+    """Read-through cache for the document bodies stored in GCS.
+
+    Documents are kept in an in-process LRU bounded by `max_memory_bytes`
+    and, if `cache_dir` is set, in an on-disk LRU bounded by
+    `max_disk_bytes` that survives restarts. Entries are keyed by datapoint
+    id. Hit rate and bytes saved are available through `stats()` to help
+    size the cache."""
+
+    def __init__(
+        self,
+        max_memory_bytes: int = 64 * 1024 * 1024,
+        cache_dir: Optional[str] = None,
+        max_disk_bytes: int = 1024 * 1024 * 1024,
+    ):
+        """Read-through cache for the document bodies stored in GCS.
+
+        Attributes:
+            max_memory_bytes: The byte budget of the in-process LRU.
+            cache_dir (Optional): The directory of the on-disk LRU. Disabled if not set.
+            max_disk_bytes: The byte budget of the on-disk LRU.
+        """
+        self.max_memory_bytes = max_memory_bytes
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, Union[str, bytes]]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_bytes = 0
+
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            # Rebuild the on-disk LRU order from the file access times
+            entries = sorted(
+                (entry.stat().st_mtime, entry.name, entry.stat().st_size)
+                for entry in os.scandir(cache_dir)
+                if entry.is_file()
+            )
+            for _, name, size in entries:
+                self._disk[name] = size
+                self._disk_bytes += size
+
+    @staticmethod
+    def _get_size(content: Union[str, bytes]) -> int:
+        return len(content.encode("utf-8") if isinstance(content, str) else content)
+
+    def _get_disk_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key)
+
+    @staticmethod
+    def _get_disk_key(datapoint_id: str) -> str:
+        return hashlib.sha256(datapoint_id.encode("utf-8")).hexdigest()
+
+    def _put_memory(self, datapoint_id: str, content: Union[str, bytes]) -> None:
+        size = self._get_size(content)
+        if size > self.max_memory_bytes:
+            return
+
+        if datapoint_id in self._memory:
+            self._memory_bytes -= self._get_size(self._memory.pop(datapoint_id))
+        self._memory[datapoint_id] = content
+        self._memory_bytes += size
+
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= self._get_size(evicted)
+
+    def _put_disk(self, datapoint_id: str, content: Union[str, bytes]) -> None:
+        key = self._get_disk_key(datapoint_id)
+        data = content.encode("utf-8") if isinstance(content, str) else content
+
+        temp_path = self._get_disk_path(key) + ".tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, self._get_disk_path(key))
+
+        self._disk_bytes -= self._disk.pop(key, 0)
+        self._disk[key] = len(data)
+        self._disk_bytes += len(data)
+
+        while self._disk_bytes > self.max_disk_bytes and len(self._disk) > 1:
+            evicted_key, evicted_size = self._disk.popitem(last=False)
+            self._disk_bytes -= evicted_size
+            try:
+                os.remove(self._get_disk_path(evicted_key))
+            except FileNotFoundError:
+                pass
+
+    def get(self, datapoint_id: str) -> Optional[Union[str, bytes]]:
+        """Gets a cached document body.
+
+        Args:
+            datapoint_id: The datapoint id of the document.
+
+        Returns:
+            The document body, or None on a miss.
+        """
+        with self._lock:
+            content = self._memory.get(datapoint_id)
+            if content is not None:
+                self._memory.move_to_end(datapoint_id)
+            elif self.cache_dir is not None:
+                key = self._get_disk_key(datapoint_id)
+                if key in self._disk:
+                    try:
+                        with open(self._get_disk_path(key), "rb") as f:
+                            content = f.read()
+                        os.utime(self._get_disk_path(key))
+                        self._disk.move_to_end(key)
+                        self._put_memory(datapoint_id, content)
+                    except OSError:
+                        self._disk_bytes -= self._disk.pop(key)
+
+            if content is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.bytes_saved += self._get_size(content)
+            return content
+
+    def put(self, datapoint_id: str, content: Union[str, bytes]) -> None:
+        """Caches a document body.
+
+        Args:
+            datapoint_id: The datapoint id of the document.
+            content: The document body.
+        """
+        with self._lock:
+            self._put_memory(datapoint_id, content)
+            if self.cache_dir is not None:
+                self._put_disk(datapoint_id, content)
+
+    def invalidate(self, datapoint_id: str) -> None:
+        """Drops a document from the cache, e.g. when its body is rewritten.
+
+        Args:
+            datapoint_id: The datapoint id of the document.
+        """
+        with self._lock:
+            if datapoint_id in self._memory:
+                self._memory_bytes -= self._get_size(self._memory.pop(datapoint_id))
+            if self.cache_dir is not None:
+                key = self._get_disk_key(datapoint_id)
+                if key in self._disk:
+                    self._disk_bytes -= self._disk.pop(key)
+                    try:
+                        os.remove(self._get_disk_path(key))
+                    except FileNotFoundError:
+                        pass
+
+    def stats(self) -> Dict[str, float]:
+        """Returns the cache counters.
+
+        Returns:
+            The hits, misses, hit rate, bytes saved and current memory and
+            disk usage of the cache.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "bytes_saved": self.bytes_saved,
+                "memory_bytes": self._memory_bytes,
+                "disk_bytes": self._disk_bytes,
+            }
+
+
 class MatchingEngine(VectorStore):
     """Vertex Matching Engine implementation of the vector store.
 
@@ -48,6 +232,8 @@ class MatchingEngine(VectorStore):
         index_endpoint_client: aiplatform_v1.IndexEndpointServiceClient,
         gcs_bucket_name: str,
         credentials: Credentials = None,
+        max_concurrent_requests: int = 16,
+        document_cache: Optional[DocumentCache] = None,
     ):
         """Vertex Matching Engine implementation of the vector store.
 
@@ -75,6 +261,10 @@ class MatchingEngine(VectorStore):
             multilingual Tensorflow Universal Sentence Encoder will be used.
             gcs_client: The Google Cloud Storage client.
             credentials (Optional): Created GCP credentials.
+            max_concurrent_requests (Optional): The number of GCS uploads,
+            GCS downloads and findNeighbors requests run at the same time.
+            document_cache (Optional): A :class:`DocumentCache` consulted
+            before downloading a document from GCS.
         """
         super().__init__()
         self._validate_google_libraries_installation()
@@ -90,6 +280,16 @@ class MatchingEngine(VectorStore):
         self.gcs_client = gcs_client
         self.credentials = credentials
         self.gcs_bucket_name = gcs_bucket_name
+        self.document_cache = document_cache
+
+        # Reused across calls: a pooled HTTP session, the GCS bucket handle
+        # and a thread pool for blocking GCS transfers and requests.
+        self._session = requests.Session()
+        self._aiohttp_session = None
+        self._aiohttp_session_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._bucket: Optional[storage.Bucket] = None
+        self._credentials_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent_requests)
 
     def _validate_google_libraries_installation(self) -> None:
         """Validates that Google libraries that are needed are installed."""
@@ -106,56 +306,157 @@ class MatchingEngine(VectorStore):
     def add_texts(
         self,
         texts: Iterable[str],
-        metadatas: Optional[Iterable[dict]],
+        metadatas: Optional[Iterable[dict]] = None,
+        embedding_batch_size: int = 100,
+        max_upsert_datapoints: int = 1000,
+        max_upsert_bytes: int = 3_000_000,
         **kwargs: Any,
     ) -> List[str]:
         """Run more texts through the embeddings and add to the vectorstore.
 
+        The texts are processed as a pipeline: they are embedded in batches,
+        uploaded to GCS concurrently while the next batch is embedded, and
+        upserted in requests bounded by datapoint count and payload size.
+        Only one upsert request worth of texts is held in memory at a time,
+        so `texts` can be an arbitrarily long iterable. Per-stage item counts
+        and seconds (summed over concurrent uploads) are logged and kept in
+        `last_add_texts_stats`.
+
         Args:
             texts: Iterable of strings to add to the vectorstore.
             metadatas: Optional list of metadatas associated with the texts.
-            kwargs: vectorstore specific parameters.
+            embedding_batch_size: The number of texts embedded per call.
+            max_upsert_datapoints: The maximum number of datapoints per upsert request.
+            max_upsert_bytes: The maximum serialized size of an upsert request.
+            kwargs: vectorstore specific parameters. `ids` may give the id of
+                each text, as in `VectorStore.add_texts`; texts added with an
+                existing id replace its document and datapoint. New ids are
+                generated otherwise.
 
         Returns:
             List of ids from adding the texts into the vectorstore.
         """
-        logger.debug("Embedding documents.")
-        embeddings = self.embedding.embed_documents(list(texts))
-        insert_datapoints_payload = []
+        stats = {
+            "embedded_texts": 0,
+            "embedding_seconds": 0.0,
+            "uploaded_documents": 0,
+            "upload_seconds": 0.0,
+            "upserted_datapoints": 0,
+            "upsert_requests": 0,
+            "upsert_seconds": 0.0,
+        }
+        stats_lock = threading.Lock()
+        start_time = time.perf_counter()
+
+        def upload(text: str, datapoint_id: str) -> None:
+            upload_start = time.perf_counter()
+            self._upload_to_gcs(text, f"documents/{datapoint_id}")
+            # A rewritten id must not be served from the cache. This runs once
+            # the new body is in GCS and before its datapoint is upserted.
+            if self.document_cache is not None:
+                self.document_cache.invalidate(datapoint_id)
+            with stats_lock:
+                stats["uploaded_documents"] += 1
+                stats["upload_seconds"] += time.perf_counter() - upload_start
+
+        def upsert(datapoints: List[aiplatform_v1.IndexDatapoint]) -> None:
+            # Documents must be in GCS before their datapoints can be returned
+            while pending_uploads:
+                pending_uploads.popleft().result()
+
+            upsert_start = time.perf_counter()
+            upsert_request = aiplatform_v1.UpsertDatapointsRequest(
+                index=self.index.name, datapoints=datapoints
+            )
+            self.index_client.upsert_datapoints(request=upsert_request)
+            stats["upserted_datapoints"] += len(datapoints)
+            stats["upsert_requests"] += 1
+            stats["upsert_seconds"] += time.perf_counter() - upsert_start
+
         ids = []
+        pending_uploads: deque = deque()
+        insert_datapoints_payload: List[aiplatform_v1.IndexDatapoint] = []
+        payload_bytes = 0
 
-        # Streaming index update
-        for idx, (embedding, text, metadata) in enumerate(
-            zip(embeddings, texts, metadatas or [])
-        ):
-            id = uuid.uuid4()
-            ids.append(str(id))
-            self._upload_to_gcs(text, f"documents/{id}")
+        supplied_ids = kwargs.get("ids")
 
-            insert_datapoints_payload.append(
-                aiplatform_v1.IndexDatapoint(
+        # Streaming index update
+        text_metadata_pairs = zip(
+            texts,
+            metadatas if metadatas is not None else itertools.repeat(None),
+            (
+                supplied_ids
+                if supplied_ids is not None
+                else (uuid.uuid4() for _ in itertools.count())
+            ),
+        )
+        while True:
+            batch = list(itertools.islice(text_metadata_pairs, embedding_batch_size))
+            if not batch:
+                break
+
+            logger.debug(f"Embedding {len(batch)} documents.")
+            embedding_start = time.perf_counter()
+            embeddings = self.embedding.embed_documents([text for text, _, _ in batch])
+            stats["embedded_texts"] += len(batch)
+            stats["embedding_seconds"] += time.perf_counter() - embedding_start
+
+            for embedding, (text, metadata, id) in zip(embeddings, batch):
+                ids.append(str(id))
+                pending_uploads.append(self._executor.submit(upload, text, str(id)))
+
+                datapoint = aiplatform_v1.IndexDatapoint(
                     datapoint_id=str(id),
                     feature_vector=embedding,
                     restricts=metadata if metadata else [],
                 )
-            )
-            if idx % 100 == 0:
-                upsert_request = aiplatform_v1.UpsertDatapointsRequest(
-                    index=self.index.name, datapoints=insert_datapoints_payload
-                )
-                self.index_client.upsert_datapoints(request=upsert_request)
-                insert_datapoints_payload = []
+                datapoint_bytes = aiplatform_v1.IndexDatapoint.pb(datapoint).ByteSize()
+
+                if insert_datapoints_payload and (
+                    len(insert_datapoints_payload) >= max_upsert_datapoints
+                    or payload_bytes + datapoint_bytes > max_upsert_bytes
+                ):
+                    upsert(insert_datapoints_payload)
+                    insert_datapoints_payload = []
+                    payload_bytes = 0
+
+                insert_datapoints_payload.append(datapoint)
+                payload_bytes += datapoint_bytes
+
         if len(insert_datapoints_payload) > 0:
-            upsert_request = aiplatform_v1.UpsertDatapointsRequest(
-                index=self.index.name, datapoints=insert_datapoints_payload
-            )
-            _ = self.index_client.upsert_datapoints(request=upsert_request)
+            upsert(insert_datapoints_payload)
+
+        stats["total_seconds"] = time.perf_counter() - start_time
+        self.last_add_texts_stats = stats
 
         logger.debug("Updated index with new configuration.")
-        logger.info(f"Indexed {len(ids)} documents to Matching Engine.")
+        for stage, count_key, seconds_key in (
+            ("Embedding", "embedded_texts", "embedding_seconds"),
+            ("GCS upload", "uploaded_documents", "upload_seconds"),
+            ("Upsert", "upserted_datapoints", "upsert_seconds"),
+        ):
+            logger.info(
+                f"{stage}: {stats[count_key]} items in {stats[seconds_key]:.2f}s "
+                f"of stage time."
+            )
+        logger.info(
+            f"Indexed {len(ids)} documents to Matching Engine in "
+            f"{stats['total_seconds']:.2f}s "
+            f"({len(ids) / max(stats['total_seconds'], 1e-9):.1f}/s)."
+        )
 
         return ids
 
+    def _get_bucket(self) -> storage.Bucket:
+        """Gets the GCS bucket, fetching its handle only on the first call.
+
+        Returns:
+            The cached bucket handle.
+        """
+        if self._bucket is None:
+            self._bucket = self.gcs_client.get_bucket(self.gcs_bucket_name)
+        return self._bucket
+
     def _upload_to_gcs(self, data: str, gcs_location: str) -> None:
         """Uploads data to gcs_location.
 
@@ -163,21 +464,33 @@ class MatchingEngine(VectorStore):
             data: The data that will be stored.
             gcs_location: The location where the data will be stored.
         """
-        bucket = self.gcs_client.get_bucket(self.gcs_bucket_name)
-        blob = bucket.blob(gcs_location)
+        blob = self._get_bucket().blob(gcs_location)
         blob.upload_from_string(data)
 
-    def get_matches(
+    def _get_auth_header(self) -> Dict[str, str]:
+        """Gets the authorization header, refreshing the token only when it
+        is missing or close to expiry.
+
+        Returns:
+            The authorization header for the Matching Engine endpoint.
+        """
+        with self._credentials_lock:
+            if not self.credentials.valid:
+                request = google.auth.transport.requests.Request()
+                self.credentials.refresh(request)
+            return {"Authorization": "Bearer " + self.credentials.token}
+
+    def _get_find_neighbors_request(
         self,
         embeddings: List[str],
         n_matches: int,
         index_endpoint: MatchingEngineIndexEndpoint,
         filters: dict,
-    ):
-        """
-        get matches from matching engine given a vector query
-        Uses public endpoint
+    ) -> Tuple[str, str]:
+        """Builds a findNeighbors request for the public endpoint.
 
+        Returns:
+            A tuple with the RPC address and the JSON request body.
         """
         request_data = {
             "deployed_index_id": index_endpoint.deployed_indexes[0].id,
@@ -197,15 +510,108 @@ class MatchingEngine(VectorStore):
 
         endpoint_address = self.endpoint.public_endpoint_domain_name
         rpc_address = f"https://{endpoint_address}/v1beta1/{index_endpoint.resource_name}:findNeighbors"
-        endpoint_json_data = json.dumps(request_data)
+        return rpc_address, json.dumps(request_data)
+
+    def get_matches(
+        self,
+        embeddings: List[str],
+        n_matches: int,
+        index_endpoint: MatchingEngineIndexEndpoint,
+        filters: dict,
+    ):
+        """
+        get matches from matching engine given a vector query
+        Uses public endpoint
+
+        """
+        rpc_address, endpoint_json_data = self._get_find_neighbors_request(
+            embeddings, n_matches, index_endpoint, filters
+        )
 
         logger.debug(f"Querying Matching Engine Index Endpoint {rpc_address}")
 
-        request = google.auth.transport.requests.Request()
-        self.credentials.refresh(request)
-        header = {"Authorization": "Bearer " + self.credentials.token}
+        return self._session.post(
+            rpc_address, data=endpoint_json_data, headers=self._get_auth_header()
+        )
+
+    async def _get_aiohttp_session(self) -> Any:
+        """Lazily creates the pooled aiohttp session used by the async path.
 
-        return requests.post(rpc_address, data=endpoint_json_data, headers=header)
+        A session is bound to the event loop it was created on, so a new one
+        is created when called from a different loop, e.g. on each
+        `asyncio.run`.
+
+        Returns:
+            An open aiohttp.ClientSession for the running event loop.
+        """
+        try:
+            import aiohttp
+        except ImportError:
+            raise ImportError(
+                "You must run `pip install --upgrade aiohttp` "
+                "to use the async MatchingEngine query path."
+            )
+
+        loop = asyncio.get_running_loop()
+        if (
+            self._aiohttp_session is None
+            or self._aiohttp_session.closed
+            or self._aiohttp_session_loop is not loop
+        ):
+            previous_session = self._aiohttp_session
+            previous_loop = self._aiohttp_session_loop
+            if (
+                previous_session is not None
+                and not previous_session.closed
+                and previous_loop is not None
+                and previous_loop.is_running()
+            ):
+                # The session can only be closed on its own loop
+                asyncio.run_coroutine_threadsafe(
+                    previous_session.close(), previous_loop
+                )
+            self._aiohttp_session = aiohttp.ClientSession()
+            self._aiohttp_session_loop = loop
+        return self._aiohttp_session
+
+    async def aget_matches(
+        self,
+        embeddings: List[str],
+        n_matches: int,
+        index_endpoint: MatchingEngineIndexEndpoint,
+        filters: dict,
+    ) -> List[dict]:
+        """Async version of `get_matches` that reuses a pooled HTTP session.
+
+        Returns:
+            The nearest neighbors of every query, in query order.
+        """
+        rpc_address, endpoint_json_data = self._get_find_neighbors_request(
+            embeddings, n_matches, index_endpoint, filters
+        )
+
+        logger.debug(f"Querying Matching Engine Index Endpoint {rpc_address}")
+
+        loop = asyncio.get_running_loop()
+        header = await loop.run_in_executor(self._executor, self._get_auth_header)
+        session = await self._get_aiohttp_session()
+        async with session.post(
+            rpc_address, data=endpoint_json_data, headers=header
+        ) as response:
+            if response.status != 200:
+                raise Exception(f"Failed to query index {await response.text()}")
+            return (await response.json()).get("nearestNeighbors", [])
+
+    async def aclose(self) -> None:
+        """Closes the pooled aiohttp session of the async path."""
+        if (
+            self._aiohttp_session is not None
+            and not self._aiohttp_session.closed
+            and self._aiohttp_session_loop is asyncio.get_running_loop()
+        ):
+            await self._aiohttp_session.close()
+        self._aiohttp_session = None
+        self._aiohttp_session_loop = None
 
     def similarity_search(
         self,
@@ -250,16 +656,194 @@ class MatchingEngine(VectorStore):
 
         logger.debug(f"Found {len(response)} matches for the query {query}.")
 
-        results = []
-
         # I'm only getting the first one because queries receives an array
         # and the similarity_search method only receives one query. This
         # means that the match method will always return an array with only
         # one element.
-        for doc in response[0]["neighbors"]:
-            page_content = self._download_from_gcs(
-                f"documents/{doc['datapoint']['datapointId']}"
+        neighbors = response[0]["neighbors"]
+        page_contents = list(
+            self._executor.map(
+                self._get_document,
+                [doc["datapoint"]["datapointId"] for doc in neighbors],
             )
+        )
+        results = self._get_documents(neighbors, page_contents, search_distance)
+
+        logger.debug("Downloaded documents for query.")
+
+        return results
+
+    def similarity_search_batch(
+        self,
+        queries: List[str],
+        k: int = 4,
+        search_distance: float = 0.65,
+        filters={},
+        max_queries_per_request: int = 100,
+        max_request_bytes: int = 2_000_000,
+        **kwargs: Any,
+    ) -> List[List[Document]]:
+        """Return docs most similar to each of many queries.
+
+        All queries are embedded in bulk and packed into as few findNeighbors
+        requests as the size limits allow. Documents returned for several
+        queries are downloaded only once.
+
+        Args:
+            queries: The strings that will be used to search for similar documents.
+            k: The amount of neighbors that will be retrieved per query.
+            search_distance: filter search results by  search distance by adding a threshold value
+            max_queries_per_request: The maximum number of queries in one findNeighbors request.
+            max_request_bytes: The approximate maximum size of one findNeighbors request body.
+
+        Returns:
+            A list with the matching documents of each query, in query order.
+        """
+
+        queries = list(queries)
+        if not queries:
+            return []
+
+        logger.debug(f"Embedding {len(queries)} queries.")
+        embedding_queries = self.embedding.embed_documents(queries)
+
+        # Pack the queries into requests bounded by count and payload size
+        filters_size = len(json.dumps(filters))
+        batches: List[List[List[float]]] = [[]]
+        batch_size = 0
+        for embedding_query in embedding_queries:
+            query_size = len(json.dumps(embedding_query)) + filters_size + 200
+            if batches[-1] and (
+                len(batches[-1]) >= max_queries_per_request
+                or batch_size + query_size > max_request_bytes
+            ):
+                batches.append([])
+                batch_size = 0
+            batches[-1].append(embedding_query)
+            batch_size += query_size
+
+        def find_neighbors(batch: List[List[float]]) -> List[dict]:
+            response = self.get_matches(batch, k, self.endpoint, filters)
+            if response.status_code != 200:
+                raise Exception(f"Failed to query index {str(response)}")
+
+            # Queries are numbered within their request, so map them back by id
+            neighbors_by_query: List[dict] = [{} for _ in batch]
+            for position, query_result in enumerate(
+                response.json().get("nearestNeighbors", [])
+            ):
+                neighbors_by_query[int(query_result.get("id", position))] = query_result
+            return [
+                query_result.get("neighbors", []) for query_result in neighbors_by_query
+            ]
+
+        logger.debug(f"Querying {len(queries)} queries in {len(batches)} requests.")
+        neighbors_by_query: List[List[dict]] = []
+        for batch_neighbors in self._executor.map(find_neighbors, batches):
+            neighbors_by_query.extend(batch_neighbors)
+
+        # Download every distinct document once, whatever the number of queries returning it
+        datapoint_ids = list(
+            dict.fromkeys(
+                doc["datapoint"]["datapointId"]
+                for neighbors in neighbors_by_query
+                for doc in neighbors
+            )
+        )
+        page_contents_by_id = dict(
+            zip(
+                datapoint_ids,
+                self._executor.map(self._get_document, datapoint_ids),
+            )
+        )
+
+        logger.debug(
+            f"Downloaded {len(datapoint_ids)} distinct documents for {len(queries)} queries."
+        )
+
+        return [
+            self._get_documents(
+                neighbors,
+                [
+                    page_contents_by_id[doc["datapoint"]["datapointId"]]
+                    for doc in neighbors
+                ],
+                search_distance,
+            )
+            for neighbors in neighbors_by_query
+        ]
+
+    async def asimilarity_search(
+        self,
+        query: str,
+        k: int = 4,
+        search_distance: float = 0.65,
+        filters={},
+        **kwargs: Any,
+    ) -> List[Document]:
+        """Async version of `similarity_search`.
+
+        The neighbor documents are downloaded concurrently, so a query takes
+        roughly two round trips instead of one per neighbor.
+
+        Args:
+            query: The string that will be used to search for similar documents.
+            k: The amount of neighbors that will be retrieved.
+            search_distance: filter search results by  search distance by adding a threshold value
+
+        Returns:
+            A list of k matching documents.
+        """
+
+        logger.debug(f"Embedding query {query}.")
+        loop = asyncio.get_running_loop()
+        embedding_query = await loop.run_in_executor(
+            self._executor, self.embedding.embed_documents, [query]
+        )
+
+        response = await self.aget_matches(embedding_query, k, self.endpoint, filters)
+
+        if len(response) == 0:
+            return []
+
+        logger.debug(f"Found {len(response)} matches for the query {query}.")
+
+        neighbors = response[0]["neighbors"]
+        page_contents = await asyncio.gather(
+            *[
+                loop.run_in_executor(
+                    self._executor,
+                    self._get_document,
+                    doc["datapoint"]["datapointId"],
+                )
+                for doc in neighbors
+            ]
+        )
+        results = self._get_documents(neighbors, page_contents, search_distance)
+
+        logger.debug("Downloaded documents for query.")
+
+        return results
+
+    def _get_documents(
+        self,
+        neighbors: List[dict],
+        page_contents: List[str],
+        search_distance: float,
+    ) -> List[Document]:
+        """Builds the documents of the neighbors within the search distance.
+
+        Args:
+            neighbors: The neighbors returned by findNeighbors for one query.
+            page_contents: The downloaded content of each neighbor.
+            search_distance: The minimum distance of the returned neighbors.
+
+        Returns:
+            A list of matching documents.
+        """
+        results = []
+
+        for doc, page_content in zip(neighbors, page_contents):
             metadata = {}
             if "restricts" in doc["datapoint"]:
                 metadata = {
@@ -275,8 +859,6 @@ class MatchingEngine(VectorStore):
             else:
                 results.append(Document(page_content=page_content, metadata=metadata))
 
-        logger.debug("Downloaded documents for query.")
-
         return results
 
     def _get_index_id(self) -> str:
@@ -296,6 +878,27 @@ class MatchingEngine(VectorStore):
             f"{self.endpoint.display_name}."
         )
 
+    def _get_document(self, datapoint_id: str) -> str:
+        """Gets the body of a document, from the document cache if possible.
+
+        Args:
+            datapoint_id: The datapoint id of the document.
+
+        Returns:
+            The contents of the document.
+        """
+        if self.document_cache is not None:
+            content = self.document_cache.get(datapoint_id)
+            if content is not None:
+                return content
+
+        content = self._download_from_gcs(f"documents/{datapoint_id}")
+
+        # Failed downloads return an empty string and are not cached
+        if self.document_cache is not None and content:
+            self.document_cache.put(datapoint_id, content)
+        return content
+
     def _download_from_gcs(self, gcs_location: str) -> str:
         """Downloads from GCS in text format.
 
@@ -305,7 +908,7 @@ class MatchingEngine(VectorStore):
         Returns:
             The string contents of the file.
         """
-        bucket = self.gcs_client.get_bucket(self.gcs_bucket_name)
+        bucket = self._get_bucket()
         try:
             blob = bucket.blob(gcs_location)
             return blob.download_as_string()
@@ -352,6 +955,7 @@ class MatchingEngine(VectorStore):
         endpoint_id: str,
         credentials_path: Optional[str] = None,
         embedding: Optional[Embeddings] = None,
+        document_cache: Optional[DocumentCache] = None,
     ) -> "MatchingEngine":
         """Takes the object creation out of the constructor.
 
@@ -367,6 +971,8 @@ class MatchingEngine(VectorStore):
             the local file system.
             embedding: The :class:`Embeddings` that will be used for
             embedding the texts.
+            document_cache: (Optional) A :class:`DocumentCache` for the
+            document bodies downloaded from GCS.
 
         Returns:
             A configured MatchingEngine with the texts added to the index.
@@ -404,6 +1010,7 @@ class MatchingEngine(VectorStore):
             index_endpoint_client=index_endpoint_client,
             credentials=credentials,
             gcs_bucket_name=gcs_bucket_name,
+            document_cache=document_cache,
         )
 
     @classmethod
@@ -0,0 +1,92 @@
+"""Tests for the document cache of the Matching Engine vector store."""
+
+from types import SimpleNamespace
+from typing import Dict, List
+
+import pytest
+
+pytest.importorskip("google.cloud.aiplatform")
+pytest.importorskip("langchain")
+
+from langchain.embeddings.base import Embeddings  # noqa: E402
+
+from utils.matching_engine import DocumentCache, MatchingEngine  # noqa: E402
+
+
+class FakeEmbeddings(Embeddings):
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return [float(len(text)), 1.0]
+
+
+class FakeBlob:
+    def __init__(self, blobs: Dict[str, str], name: str) -> None:
+        self.blobs = blobs
+        self.name = name
+
+    def upload_from_string(self, data: str) -> None:
+        self.blobs[self.name] = data
+
+    def download_as_string(self) -> str:
+        return self.blobs[self.name]
+
+
+class FakeBucket:
+    def __init__(self) -> None:
+        self.blobs: Dict[str, str] = {}
+
+    def blob(self, name: str) -> FakeBlob:
+        return FakeBlob(self.blobs, name)
+
+
+class FakeIndexClient:
+    def __init__(self) -> None:
+        self.datapoint_ids: List[str] = []
+
+    def upsert_datapoints(self, request) -> None:
+        self.datapoint_ids.extend(
+            datapoint.datapoint_id for datapoint in request.datapoints
+        )
+
+
+def make_engine(document_cache: DocumentCache) -> MatchingEngine:
+    bucket = FakeBucket()
+    return MatchingEngine(
+        project_id="project",
+        region="us-central1",
+        index=SimpleNamespace(name="index"),
+        endpoint=None,
+        embedding=FakeEmbeddings(),
+        gcs_client=SimpleNamespace(get_bucket=lambda name: bucket),
+        index_client=FakeIndexClient(),
+        index_endpoint_client=None,
+        gcs_bucket_name="bucket",
+        document_cache=document_cache,
+    )
+
+
+@pytest.mark.parametrize("on_disk", [False, True])
+def test_add_texts_invalidates_rewritten_ids(tmp_path, on_disk):
+    cache = DocumentCache(cache_dir=str(tmp_path) if on_disk else None)
+    engine = make_engine(cache)
+
+    assert engine.add_texts(["first body"], ids=["doc-1"]) == ["doc-1"]
+    assert engine._get_document("doc-1") == "first body"
+    assert cache.get("doc-1") == "first body"
+
+    engine.add_texts(["second body"], ids=["doc-1"])
+
+    assert cache.get("doc-1") is None
+    assert engine._get_document("doc-1") == "second body"
+    assert engine.index_client.datapoint_ids == ["doc-1", "doc-1"]
+
+
+def test_add_texts_generates_ids_without_ids():
+    engine = make_engine(DocumentCache())
+
+    ids = engine.add_texts(["a", "b"])
+
+    assert len(set(ids)) == 2
+    assert engine.index_client.datapoint_ids == ids
@@ -0,0 +1,121 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Latency benchmark of pooled vs. per-request Discovery Engine clients
+
+Run from this directory with `python benchmark_client_pool.py`. It starts a
+local fake gRPC server, so it needs no credentials or network access.
+"""
+# pylint: disable=protected-access
+from concurrent import futures
+import time
+from typing import Any, Callable, Dict, Tuple
+
+import client_pool
+from google.auth.credentials import AnonymousCredentials
+from google.cloud import discoveryengine_v1alpha as discoveryengine
+from google.cloud.discoveryengine_v1alpha.services.document_service.transports import (
+    DocumentServiceGrpcTransport,
+)
+import grpc
+
+
+def benchmark_client_pool(
+    requests: int = 200,
+    bucket_ms: Tuple[float, ...] = (0.5, 1, 2, 5, 10, 20, 50, 100),
+) -> Dict[str, Dict]:
+    """
+    Latency histogram of cold vs. warm requests against a local fake server.
+
+    Cold requests build a new `DocumentServiceClient` per request, as each
+    handler did before; warm requests reuse the pooled client. The fake
+    server answers `ListDocuments` with an empty response over an insecure
+    channel, so the numbers cover client and channel setup but not TLS.
+    """
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=4))
+    server.add_generic_rpc_handlers(
+        (
+            grpc.method_handlers_generic_handler(
+                "google.cloud.discoveryengine.v1alpha.DocumentService",
+                {
+                    "ListDocuments": grpc.unary_unary_rpc_method_handler(
+                        lambda request, context: b""
+                    )
+                },
+            ),
+        )
+    )
+    address = f"localhost:{server.add_insecure_port('localhost:0')}"
+    server.start()
+
+    def create_client() -> Any:
+        return discoveryengine.DocumentServiceClient(
+            transport=DocumentServiceGrpcTransport(
+                credentials=AnonymousCredentials(),
+                channel=grpc.insecure_channel(address),
+            )
+        )
+
+    parent = "projects/benchmark/locations/global/collections/default_collection/dataStores/benchmark/branches/default_branch"
+    key = ("benchmark", address)
+
+    def timed_request(get_client_for_request: Callable[[], Any], close: bool) -> float:
+        start = time.perf_counter()
+        client = get_client_for_request()
+        list(client.list_documents(request={"parent": parent}))
+        latency = (time.perf_counter() - start) * 1000
+        if close:
+            client.transport.close()
+        return latency
+
+    results = {}
+    try:
+        for name, get_client_for_request, close in (
+            ("cold", create_client, True),
+            ("warm", lambda: client_pool._get_or_create(key, create_client), False),
+        ):
+            latencies = sorted(
+                timed_request(get_client_for_request, close) for _ in range(requests)
+            )
+            histogram = {}
+            lower = 0.0
+            for upper in bucket_ms + (float("inf"),):
+                histogram[f"<{upper}ms"] = sum(
+                    1 for latency in latencies if lower <= latency < upper
+                )
+                lower = upper
+            results[name] = {
+                "p50_ms": latencies[len(latencies) // 2],
+                "p99_ms": latencies[int(len(latencies) * 0.99)],
+                "histogram": histogram,
+            }
+
+            print(
+                f"{name}: p50 {results[name]['p50_ms']:.2f} ms, "
+                f"p99 {results[name]['p99_ms']:.2f} ms"
+            )
+            for bucket, count in histogram.items():
+                print(f"  {bucket:>9} {count:5d} {'#' * (count * 50 // requests)}")
+    finally:
+        with client_pool._CLIENTS_LOCK:
+            client = client_pool._CLIENTS.pop(key, None)
+        if client is not None:
+            client.transport.close()
+        server.stop(None)
+
+    return results
+
+
+if __name__ == "__main__":
+    benchmark_client_pool()
@@ -0,0 +1,88 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Process-wide Google Cloud API Client Pool"""
+import os
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional, Type
+
+# Clients are created on first use and shared by all request threads.
+# gRPC channels must not be shared across fork(), so a forked worker
+# starts with an empty pool and builds its own clients.
+_CLIENTS: Dict[Hashable, Any] = {}
+_CLIENTS_LOCK = threading.Lock()
+_CLIENTS_PID = os.getpid()
+
+
+def _reset_after_fork() -> None:
+    global _CLIENTS, _CLIENTS_LOCK, _CLIENTS_PID
+    _CLIENTS = {}
+    _CLIENTS_LOCK = threading.Lock()
+    _CLIENTS_PID = os.getpid()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_api_endpoint(service: str, location: str) -> Optional[str]:
+    """
+    Regional API endpoint for a location, or None for the default endpoint.
+    """
+    if location == "global":
+        return None
+    return f"{location}-{service}.googleapis.com"
+
+
+def _get_or_create(key: Hashable, factory: Callable[[], Any]) -> Any:
+    if _CLIENTS_PID != os.getpid():
+        # Fallback for platforms without os.register_at_fork
+        _reset_after_fork()
+
+    client = _CLIENTS.get(key)
+    if client is not None:
+        return client
+
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get(key)
+        if client is None:
+            client = factory()
+            _CLIENTS[key] = client
+        return client
+
+
+def get_client(
+    client_class: Type, location: str, api_endpoint: Optional[str] = None
+) -> Any:
+    """
+    Shared client of `client_class` for an endpoint and location.
+
+    Client classes are thread-safe, so one instance per process is reused
+    for every request instead of opening a new channel each time.
+    """
+
+    def create_client() -> Any:
+        if api_endpoint:
+            return client_class(client_options={"api_endpoint": api_endpoint})
+        return client_class()
+
+    return _get_or_create((client_class, api_endpoint, location), create_client)
+
+
+def clear_clients() -> None:
+    """
+    Drop all pooled clients, e.g. after credentials change.
+    """
+    with _CLIENTS_LOCK:
+        _CLIENTS.clear()
@@ -0,0 +1,102 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Background Refresh of the Recommendations Document List"""
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+REFRESH_SECONDS = int(os.environ.get("RECOMMENDATIONS_REFRESH_SECONDS", "600"))
+
+# Snapshot of the last listing, served while the first refresh runs. Point this
+# at a mounted volume to keep it across instance restarts.
+SNAPSHOT_PATH = os.environ.get(
+    "RECOMMENDATIONS_SNAPSHOT_PATH", "/tmp/recommendations_documents.json"
+)
+
+
+class DocumentsRefresher:
+    """
+    Serves a document list immediately and keeps it up to date in a daemon
+    thread, which is (re)started lazily in each worker process.
+    """
+
+    def __init__(
+        self,
+        list_documents: Callable[[], List[Dict[str, str]]],
+        snapshot_path: Optional[str] = SNAPSHOT_PATH,
+        refresh_seconds: int = REFRESH_SECONDS,
+    ) -> None:
+        self.list_documents = list_documents
+        self.snapshot_path = snapshot_path
+        self.refresh_seconds = refresh_seconds
+        self.documents = self.load_snapshot()
+        self.lock = threading.Lock()
+        self.thread_pid: Optional[int] = None
+
+    def load_snapshot(self) -> List[Dict[str, str]]:
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return []
+        try:
+            with open(self.snapshot_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable document snapshot {self.snapshot_path}: {e}")
+            return []
+
+    def save_snapshot(self, documents: List[Dict[str, str]]) -> None:
+        if not self.snapshot_path:
+            return
+        temp_path = f"{self.snapshot_path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(documents, f)
+            os.replace(temp_path, self.snapshot_path)
+        except OSError as e:
+            print(f"Could not save document snapshot {self.snapshot_path}: {e}")
+
+    def refresh(self) -> None:
+        """
+        List all documents, keeping the previous list if the call fails
+        """
+        try:
+            documents = self.list_documents()
+        except Exception as e:
+            print(f"Refreshing recommendations documents failed: {e}")
+            return
+        self.documents = documents
+        self.save_snapshot(documents)
+
+    def run(self) -> None:
+        while True:
+            self.refresh()
+            time.sleep(self.refresh_seconds)
+
+    def start(self) -> None:
+        """
+        Start refreshing in the background, unless this process already is
+        """
+        with self.lock:
+            if self.thread_pid == os.getpid():
+                return
+            self.thread_pid = os.getpid()
+            threading.Thread(
+                target=self.run, name="documents-refresher", daemon=True
+            ).start()
+
+    def get_documents(self) -> List[Dict[str, str]]:
+        self.start()
+        return self.documents
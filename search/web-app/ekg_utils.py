@@ -13,10 +13,14 @@
 # limitations under the License.
 
 """Enterprise Knowledge Graph Utilities"""
+from functools import partial
 import json
 from typing import List, Optional, Sequence, Tuple
 
+from client_pool import get_client
 from google.cloud import enterpriseknowledgegraph as ekg
+from raw_json_store import save_raw_json
+from response_cache import get_or_fetch, normalize_query
 
 JSON_INDENT = 2
 
@@ -33,7 +37,7 @@ def search_public_kg(
     """
     Make API Request to Public Knowledge Graph.
     """
-    client = ekg.EnterpriseKnowledgeGraphServiceClient()
+    client = get_client(ekg.EnterpriseKnowledgeGraphServiceClient, location)
 
     # Fully qualified location string, e.g. projects/{project_id}/locations/{location}
     parent = client.common_location_path(project=project_id, location=location)
@@ -42,20 +46,56 @@ def search_public_kg(
         parent=parent, query=search_query, languages=languages, types=types, limit=limit
     )
 
-    response = client.search_public_kg(request=request)
+    response = ekg.SearchPublicKgResponse.deserialize(
+        get_or_fetch(
+            "ekg",
+            {
+                "parent": parent,
+                "query": normalize_query(search_query),
+                "languages": sorted(languages or []),
+                "types": sorted(types or []),
+                "limit": limit,
+            },
+            lambda: ekg.SearchPublicKgResponse.serialize(
+                client.search_public_kg(request=request)
+            ),
+        )
+    )
 
     request_url = f"https://enterpriseknowledgegraph.googleapis.com/v1/{parent}/publicKnowledgeGraphEntities:Search?query={search_query}"  # noqa: E501
 
-    request_json = ekg.SearchPublicKgRequest.to_json(
-        request, including_default_value_fields=False, indent=JSON_INDENT
-    )
-
-    response_json = ekg.SearchPublicKgResponse.to_json(
-        response, including_default_value_fields=False, indent=JSON_INDENT
+    raw_json = save_raw_json(
+        partial(render_public_kg_json, request, response),
+        size=ekg.SearchPublicKgRequest.pb(request).ByteSize()
+        + ekg.SearchPublicKgResponse.pb(response).ByteSize(),
     )
 
     entities = get_entities(response)
-    return entities, request_url, request_json, response_json
+    return entities, request_url, raw_json
+
+
+def render_public_kg_json(
+    request: ekg.SearchPublicKgRequest,
+    response: ekg.SearchPublicKgResponse,
+    part: str,
+    index: int,
+) -> Optional[str]:
+    """
+    Render the raw JSON of a Knowledge Graph request, response or single entity
+    """
+    if part == "request":
+        return ekg.SearchPublicKgRequest.to_json(
+            request, including_default_value_fields=False, indent=JSON_INDENT
+        )
+    if part == "response":
+        return ekg.SearchPublicKgResponse.to_json(
+            response, including_default_value_fields=False, indent=JSON_INDENT
+        )
+    if part == "result":
+        entities = get_entities(response)
+        if 0 <= index < len(entities):
+            return json.dumps(entities[index], sort_keys=True, indent=JSON_INDENT)
+    return None
 
 
 def get_entities(response: ekg.SearchPublicKgResponse) -> List:
@@ -66,10 +106,4 @@ def get_entities(response: ekg.SearchPublicKgResponse) -> List:
         "item_list_element"
     ]
 
-    entities = []
-    for element in item_list_element:
-        result = element["result"]
-        result["resultJson"] = json.dumps(result, sort_keys=True, indent=JSON_INDENT)
-        entities.append(result)
-
-    return entities
+    return [element["result"] for element in item_list_element]
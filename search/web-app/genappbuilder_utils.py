@@ -13,20 +13,34 @@
 # limitations under the License.
 
 """Vertex AI Search Utilities"""
+from functools import partial
+import hashlib
 from os.path import basename
 from typing import Dict, List, Optional, Tuple
 
+from client_pool import get_api_endpoint, get_client
 from google.cloud import discoveryengine_v1alpha as discoveryengine
+from raw_json_store import save_raw_json
+from response_cache import get_or_fetch, normalize_query
 
 JSON_INDENT = 2
 
 
+def get_discoveryengine_client(client_class: type, location: str):
+    """
+    Shared Vertex AI Search client for the location's API endpoint.
+    """
+    return get_client(
+        client_class, location, get_api_endpoint("discoveryengine", location)
+    )
+
+
 def list_documents(
     project_id: str,
     location: str,
     datastore_id: str,
 ) -> List[Dict[str, str]]:
-    client = discoveryengine.DocumentServiceClient()
+    client = get_discoveryengine_client(discoveryengine.DocumentServiceClient, location)
 
     parent = client.branch_path(
         project=project_id,
@@ -35,8 +49,9 @@ def list_documents(
         branch="default_branch",
     )
 
-    request = discoveryengine.ListDocumentsRequest(parent=parent, page_size=10)
+    request = discoveryengine.ListDocumentsRequest(parent=parent, page_size=100)
 
+    # The pager fetches the following pages as it is iterated
     page_result = client.list_documents(request=request)
 
     return [
@@ -56,12 +71,11 @@ def search_enterprise_search(
     params: Optional[Dict] = None,
     summary_model: Optional[str] = None,
     summary_preamble: Optional[str] = None,
-) -> Tuple[List[Dict[str, str | List]], str, str, str, str]:
+) -> Tuple[List[Dict[str, str | List]], str, str, str]:
     if bool(search_query) == bool(image_bytes):
         raise ValueError("Cannot provide both search_query and image_bytes")
 
-    # Create a client
-    client = discoveryengine.SearchServiceClient()
+    client = get_discoveryengine_client(discoveryengine.SearchServiceClient, location)
 
     if data_store_id:
         serving_config = client.serving_config_path(
@@ -117,42 +131,87 @@ def search_enterprise_search(
             image_bytes=image_bytes
         )
 
-    try:
-        response_pager = client.search(request)
-    except Exception as exc:
-        raise exc
-
-    response = discoveryengine.SearchResponse(
-        results=response_pager.results,
-        facets=response_pager.facets,
-        guided_search_result=response_pager.guided_search_result,
-        total_size=response_pager.total_size,
-        attribution_token=response_pager.attribution_token,
-        next_page_token=response_pager.next_page_token,
-        corrected_query=response_pager.corrected_query,
-        summary=response_pager.summary,
+    def fetch_response() -> bytes:
+        try:
+            response_pager = client.search(request)
+        except Exception as exc:
+            raise exc
+
+        response = discoveryengine.SearchResponse(
+            results=response_pager.results,
+            facets=response_pager.facets,
+            guided_search_result=response_pager.guided_search_result,
+            total_size=response_pager.total_size,
+            attribution_token=response_pager.attribution_token,
+            next_page_token=response_pager.next_page_token,
+            corrected_query=response_pager.corrected_query,
+            summary=response_pager.summary,
+        )
+        return discoveryengine.SearchResponse.serialize(response)
+
+    response = discoveryengine.SearchResponse.deserialize(
+        get_or_fetch(
+            "search",
+            {
+                "serving_config": serving_config,
+                "page_size": page_size,
+                "query": normalize_query(search_query),
+                "image_sha256": (
+                    hashlib.sha256(image_bytes).hexdigest() if image_bytes else None
+                ),
+                "params": params,
+                "summary_model": summary_model,
+                "summary_preamble": summary_preamble,
+            },
+            fetch_response,
+        )
     )
 
     request_url = (
         f"https://discoveryengine.googleapis.com/v1alpha/{serving_config}:search"
     )
 
-    request_json = discoveryengine.SearchRequest.to_json(
-        request,
-        including_default_value_fields=False,
-        use_integers_for_enums=False,
-        indent=JSON_INDENT,
-    )
-    response_json = discoveryengine.SearchResponse.to_json(
-        response,
-        including_default_value_fields=True,
-        use_integers_for_enums=False,
-        indent=JSON_INDENT,
+    raw_json = save_raw_json(
+        partial(render_search_json, request, response),
+        size=discoveryengine.SearchRequest.pb(request).ByteSize()
+        + discoveryengine.SearchResponse.pb(response).ByteSize(),
     )
 
     results = get_enterprise_search_results(response)
     summary = getattr(response.summary, "summary_text", "")
-    return results, summary, request_url, request_json, response_json
+    return results, summary, request_url, raw_json
+
+
+def render_search_json(
+    request: discoveryengine.SearchRequest,
+    response: discoveryengine.SearchResponse,
+    part: str,
+    index: int,
+) -> Optional[str]:
+    """
+    Render the raw JSON of a search request, response or single result
+    """
+    if part == "request":
+        return discoveryengine.SearchRequest.to_json(
+            request,
+            including_default_value_fields=False,
+            use_integers_for_enums=False,
+            indent=JSON_INDENT,
+        )
+    if part == "response":
+        return discoveryengine.SearchResponse.to_json(
+            response,
+            including_default_value_fields=True,
+            use_integers_for_enums=False,
+            indent=JSON_INDENT,
+        )
+    if part == "result" and 0 <= index < len(response.results):
+        return discoveryengine.SearchResponse.SearchResult.to_json(
+            response.results[index],
+            including_default_value_fields=True,
+            indent=JSON_INDENT,
+        )
+    return None
 
 
 def get_enterprise_search_results(
@@ -206,9 +265,6 @@ def get_enterprise_search_results(
                 )
             ],
             "thumbnailImage": get_thumbnail_image(result.document.derived_struct_data),
-            "resultJson": discoveryengine.SearchResponse.SearchResult.to_json(
-                result, including_default_value_fields=True, indent=JSON_INDENT
-            ),
         }
         for result in response.results
     ]
@@ -223,8 +279,9 @@ def recommend_personalize(
     user_pseudo_id: Optional[str] = "xxxxxxxxxxx",
     attribution_token: Optional[str] = None,
 ) -> Tuple:
-    # Create a client
-    client = discoveryengine.RecommendationServiceClient()
+    client = get_discoveryengine_client(
+        discoveryengine.RecommendationServiceClient, location
+    )
 
     # The full resource name of the search engine serving config
     # e.g. projects/{project_id}/locations/{location}
@@ -254,15 +311,40 @@ def recommend_personalize(
         f"https://discoveryengine.googleapis.com/v1beta/{serving_config}:recommend"
     )
 
-    request_json = discoveryengine.RecommendRequest.to_json(
-        request, including_default_value_fields=False, indent=JSON_INDENT
-    )
-    response_json = discoveryengine.RecommendResponse.to_json(
-        response, including_default_value_fields=True, indent=JSON_INDENT
+    raw_json = save_raw_json(
+        partial(render_recommend_json, request, response),
+        size=discoveryengine.RecommendRequest.pb(request).ByteSize()
+        + discoveryengine.RecommendResponse.pb(response).ByteSize(),
     )
 
     results = get_personalize_results(response)
-    return results, response.attribution_token, request_url, request_json, response_json
+    return results, response.attribution_token, request_url, raw_json
+
+
+def render_recommend_json(
+    request: discoveryengine.RecommendRequest,
+    response: discoveryengine.RecommendResponse,
+    part: str,
+    index: int,
+) -> Optional[str]:
+    """
+    Render the raw JSON of a recommend request, response or single result
+    """
+    if part == "request":
+        return discoveryengine.RecommendRequest.to_json(
+            request, including_default_value_fields=False, indent=JSON_INDENT
+        )
+    if part == "response":
+        return discoveryengine.RecommendResponse.to_json(
+            response, including_default_value_fields=True, indent=JSON_INDENT
+        )
+    if part == "result" and 0 <= index < len(response.results):
+        return discoveryengine.RecommendResponse.RecommendationResult.to_json(
+            response.results[index],
+            including_default_value_fields=True,
+            indent=JSON_INDENT,
+        )
+    return None
 
 
 def get_storage_link(uri: str) -> str:
@@ -282,9 +364,6 @@ def get_personalize_results(
             "htmlFormattedUrl": result.document.content.uri,
             "link": get_storage_link(result.document.content.uri),
             "mimeType": result.document.content.mime_type,
-            "resultJson": discoveryengine.RecommendResponse.RecommendationResult.to_json(
-                result, including_default_value_fields=True, indent=JSON_INDENT
-            ),
         }
         for result in response.results
     ]
@@ -0,0 +1,128 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Image Download and Preparation Utilities for Image Search"""
+import io
+import os
+import time
+
+from PIL import Image, UnidentifiedImageError
+import requests
+
+# Downloads larger than this are aborted, matching the upload size limit
+MAX_IMAGE_BYTES = int(os.environ.get("IMAGE_FETCH_MAX_BYTES", str(16 * 1024 * 1024)))
+# Deadline for the whole download, not just for each read
+FETCH_TIMEOUT_SECONDS = float(os.environ.get("IMAGE_FETCH_TIMEOUT_SECONDS", "5"))
+CHUNK_SIZE = 64 * 1024
+
+# Images are downsampled to fit within this size before they are searched
+MAX_IMAGE_DIMENSION = int(os.environ.get("IMAGE_SEARCH_MAX_DIMENSION", "1024"))
+MAX_SEARCH_IMAGE_BYTES = 1024 * 1024
+
+# Magic bytes of the image formats accepted by image search
+IMAGE_SIGNATURES = {
+    b"\xff\xd8\xff": "image/jpeg",
+    b"\x89PNG\r\n\x1a\n": "image/png",
+    b"BM": "image/bmp",
+}
+SNIFF_BYTES = max(len(signature) for signature in IMAGE_SIGNATURES)
+VALID_IMAGE_MIMETYPES = set(IMAGE_SIGNATURES.values())
+
+# Shared by all request threads so connections to image hosts are reused
+session = requests.Session()
+
+
+class ImageError(ValueError):
+    """
+    The image could not be downloaded or is not a valid image
+    """
+
+
+def sniff_image_type(content: bytes) -> str:
+    """
+    Image MIME type from the first bytes of the content
+    """
+    for signature, mime_type in IMAGE_SIGNATURES.items():
+        if content.startswith(signature):
+            return mime_type
+    raise ImageError(
+        f"Invalid image format. Valid types {sorted(VALID_IMAGE_MIMETYPES)}"
+    )
+
+
+def fetch_image(url: str) -> bytes:
+    """
+    Stream an image, aborting on an invalid type, once it exceeds
+    MAX_IMAGE_BYTES, or after FETCH_TIMEOUT_SECONDS
+    """
+    deadline = time.monotonic() + FETCH_TIMEOUT_SECONDS
+    content = bytearray()
+    sniffed = False
+    try:
+        with session.get(
+            url, allow_redirects=True, stream=True, timeout=FETCH_TIMEOUT_SECONDS
+        ) as response:
+            if response.status_code != 200:
+                raise ImageError(
+                    f"Image request failed with status {response.status_code}"
+                )
+            content_length = int(response.headers.get("Content-Length") or 0)
+            if content_length > MAX_IMAGE_BYTES:
+                raise ImageError(f"Image is larger than {MAX_IMAGE_BYTES} bytes")
+
+            for chunk in response.iter_content(CHUNK_SIZE):
+                content += chunk
+                if len(content) > MAX_IMAGE_BYTES:
+                    raise ImageError(f"Image is larger than {MAX_IMAGE_BYTES} bytes")
+                if not sniffed and len(content) >= SNIFF_BYTES:
+                    sniff_image_type(content)
+                    sniffed = True
+                if time.monotonic() > deadline:
+                    raise ImageError(
+                        f"Image download took longer than {FETCH_TIMEOUT_SECONDS} seconds"
+                    )
+    except requests.Timeout as exc:
+        raise ImageError(
+            f"Image download took longer than {FETCH_TIMEOUT_SECONDS} seconds"
+        ) from exc
+    except requests.RequestException as exc:
+        raise ImageError(f"Image download failed - {exc}") from exc
+
+    sniff_image_type(content)
+    return bytes(content)
+
+
+def downsample_image(content: bytes) -> bytes:
+    """
+    Shrink images larger than MAX_IMAGE_DIMENSION or MAX_SEARCH_IMAGE_BYTES,
+    returning smaller images unchanged
+    """
+    try:
+        with Image.open(io.BytesIO(content)) as image:
+            if (
+                max(image.size) <= MAX_IMAGE_DIMENSION
+                and len(content) <= MAX_SEARCH_IMAGE_BYTES
+            ):
+                return content
+
+            image.thumbnail((MAX_IMAGE_DIMENSION, MAX_IMAGE_DIMENSION))
+            output = io.BytesIO()
+            if image.mode in ("RGBA", "LA", "P"):
+                image.save(output, format="PNG", optimize=True)
+            else:
+                image.convert("RGB").save(output, format="JPEG", quality=85)
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as exc:
+        raise ImageError(f"Invalid image - {exc}") from exc
+
+    return output.getvalue()
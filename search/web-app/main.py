@@ -15,6 +15,7 @@
 """Flask Web Server"""
 
 import base64
+from functools import partial
 import os
 import re
 from urllib.parse import urlparse
@@ -29,6 +30,7 @@ from consts import (
     IMAGE_SEARCH_DATASTORE_IDs,
     RECOMMENDATIONS_DATASTORE_IDs,
 )
+from documents_refresher import DocumentsRefresher
 from ekg_utils import search_public_kg
 from flask import Flask, render_template, request
 from genappbuilder_utils import (
@@ -37,7 +39,9 @@ from genappbuilder_utils import (
     search_enterprise_search,
 )
 from google.api_core.exceptions import ResourceExhausted
-import requests
+from image_utils import ImageError, downsample_image, fetch_image, sniff_image_type
+from raw_json_store import get_raw_json
+from response_cache import render_prometheus_metrics
 from werkzeug.exceptions import HTTPException
 
 app = Flask(__name__)
@@ -80,13 +84,16 @@ NAV_LINKS = [
     },
 ]
 
-RECOMMENDATIONS_DOCUMENTS = list_documents(
-    project_id=PROJECT_ID,
-    location=LOCATION,
-    datastore_id=RECOMMENDATIONS_DATASTORE_IDs[0]["datastore_id"],
+# Listed in the background so a slow call doesn't delay startup
+RECOMMENDATIONS_DOCUMENTS = DocumentsRefresher(
+    partial(
+        list_documents,
+        project_id=PROJECT_ID,
+        location=LOCATION,
+        datastore_id=RECOMMENDATIONS_DATASTORE_IDs[0]["datastore_id"],
+    )
 )
-
-VALID_IMAGE_MIMETYPES = {"image/jpeg", "image/png", "image/bmp"}
+RECOMMENDATIONS_DOCUMENTS.start()
 
 
 @app.route("/", methods=["GET"])
@@ -152,7 +159,7 @@ def search_genappbuilder() -> str:
     summary_model = request.form.get("summary_model")
     summary_preamble = request.form.get("summary_preamble")
 
-    results, summary, request_url, raw_request, raw_response = search_enterprise_search(
+    results, summary, request_url, raw_json = search_enterprise_search(
         project_id=PROJECT_ID,
         location=LOCATION,
         engine_id=CUSTOM_UI_DATASTORE_IDS[int(search_engine)]["engine_id"],
@@ -171,8 +178,7 @@ def search_genappbuilder() -> str:
         results=results,
         summary=summary,
         request_url=request_url,
-        raw_request=raw_request,
-        raw_response=raw_response,
+        raw_json=raw_json,
     )
 
 
@@ -206,30 +212,31 @@ def imagesearch_genappbuilder() -> str:
             message_error="No query provided",
         )
 
-    if image_file:
-        image_content = image_file.read()
-    elif search_query:
-        # Check if text is a url
-        image_url = urlparse(search_query)
-        if all([image_url.scheme, image_url.netloc, image_url.path]):
-            image_response = requests.get(
-                image_url.geturl(), allow_redirects=True, timeout=5
-            )
-            mime_type = image_response.headers["Content-Type"]
-            if mime_type not in VALID_IMAGE_MIMETYPES:
-                return render_template(
-                    "image-search.html",
-                    nav_links=NAV_LINKS,
-                    message_error=f"Invalid image format - {mime_type}. Valid types {VALID_IMAGE_MIMETYPES}",
-                )
-            image_content = image_response.content
+    try:
+        if image_file:
+            image_content = image_file.read()
+            sniff_image_type(image_content)
+        elif search_query:
+            # Check if text is a url
+            image_url = urlparse(search_query)
+            if all([image_url.scheme, image_url.netloc, image_url.path]):
+                image_content = fetch_image(image_url.geturl())
+
+        if image_content:
+            image_content = downsample_image(image_content)
+    except ImageError as e:
+        return render_template(
+            "image-search.html",
+            nav_links=NAV_LINKS,
+            message_error=str(e),
+        )
 
     if image_content:
         search_query = None
         image_bytes = base64.b64encode(image_content)
 
     try:
-        results, _, request_url, raw_request, raw_response = search_enterprise_search(
+        results, _, request_url, raw_json = search_enterprise_search(
             project_id=PROJECT_ID,
             location=LOCATION,
             engine_id=IMAGE_SEARCH_DATASTORE_IDs[0]["engine_id"],
@@ -251,8 +258,7 @@ def imagesearch_genappbuilder() -> str:
         message_success="Success",
         results=results,
         request_url=request_url,
-        raw_request=raw_request,
-        raw_response=raw_response,
+        raw_json=raw_json,
     )
 
 
@@ -265,7 +271,7 @@ def recommend() -> str:
         "recommend.html",
         nav_links=NAV_LINKS,
         title=NAV_LINKS[3]["name"],
-        documents=RECOMMENDATIONS_DOCUMENTS,
+        documents=RECOMMENDATIONS_DOCUMENTS.get_documents(),
         attribution_token="",
     )
 
@@ -284,18 +290,12 @@ def recommend_genappbuilder() -> str:
             "recommend.html",
             title=NAV_LINKS[3]["name"],
             nav_links=NAV_LINKS,
-            documents=RECOMMENDATIONS_DOCUMENTS,
+            documents=RECOMMENDATIONS_DOCUMENTS.get_documents(),
             attribution_token=attribution_token,
             message_error="No document provided",
         )
 
-    (
-        results,
-        attribution_token,
-        request_url,
-        raw_request,
-        raw_response,
-    ) = recommend_personalize(
+    results, attribution_token, request_url, raw_json = recommend_personalize(
         project_id=PROJECT_ID,
         location=LOCATION,
         datastore_id=RECOMMENDATIONS_DATASTORE_IDs[0]["datastore_id"],
@@ -308,13 +308,12 @@ def recommend_genappbuilder() -> str:
         "recommend.html",
         title=NAV_LINKS[3]["name"],
         nav_links=NAV_LINKS,
-        documents=RECOMMENDATIONS_DOCUMENTS,
+        documents=RECOMMENDATIONS_DOCUMENTS.get_documents(),
         message_success=document_id,
         results=results,
         attribution_token=attribution_token,
         request_url=request_url,
-        raw_request=raw_request,
-        raw_response=raw_response,
+        raw_json=raw_json,
     )
 
 
@@ -354,7 +353,7 @@ def search_ekg() -> str:
 
     types = re.split(r"[\s,]", form_types) if form_types else []
 
-    entities, request_url, raw_request, raw_response = search_public_kg(
+    entities, request_url, raw_json = search_public_kg(
         project_id=PROJECT_ID,
         location=LOCATION,
         search_query=search_query,
@@ -370,8 +369,34 @@ def search_ekg() -> str:
         message_success=search_query,
         entities=entities,
         request_url=request_url,
-        raw_request=raw_request,
-        raw_response=raw_response,
+        raw_json=raw_json,
+    )
+
+
+@app.route("/raw_json/<handle>/<part>", methods=["GET"])
+def raw_json_part(handle: str, part: str):
+    """
+    Serve the raw request, response or result JSON behind a page's handle
+    """
+    raw_json = get_raw_json(handle, part, request.args.get("index", 0, type=int))
+    # Not abort(), which the error handler below would turn into a page
+    if raw_json is None:
+        return app.response_class(
+            "Raw JSON has expired, run the request again.",
+            status=404,
+            mimetype="text/plain",
+        )
+
+    return app.response_class(raw_json, mimetype="application/json")
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """
+    Export response cache hit ratio and saved latency for Prometheus
+    """
+    return app.response_class(
+        render_prometheus_metrics(), mimetype="text/plain; version=0.0.4"
     )
 
 
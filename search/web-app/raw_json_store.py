@@ -0,0 +1,102 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Bounded In-Memory Store for On-Demand Raw JSON"""
+from collections import OrderedDict
+import os
+import secrets
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+# Renders one part of a raw API call ("request", "response" or "result")
+# to JSON. `index` selects the result; None means the part does not exist.
+RawJsonRenderer = Callable[[str, int], Optional[str]]
+
+MAX_ENTRIES = int(os.environ.get("RAW_JSON_STORE_SIZE", "256"))
+MAX_BYTES = int(os.environ.get("RAW_JSON_STORE_BYTES", str(64 * 1024 * 1024)))
+
+# handle -> (renderer, size including rendered parts, rendered parts),
+# least recently used first
+_ENTRIES: "OrderedDict[str, Tuple[RawJsonRenderer, int, Dict[Tuple[str, int], str]]]" = (
+    OrderedDict()
+)
+_LOCK = threading.Lock()
+_total_bytes = 0
+
+
+def _evict() -> None:
+    """
+    Drop least recently used entries until the store is within its bounds.
+    Must be called with _LOCK held.
+    """
+    global _total_bytes
+
+    while len(_ENTRIES) > 1 and (
+        len(_ENTRIES) > MAX_ENTRIES or _total_bytes > MAX_BYTES
+    ):
+        _, (_, evicted_size, _) = _ENTRIES.popitem(last=False)
+        _total_bytes -= evicted_size
+
+
+def save_raw_json(renderer: RawJsonRenderer, size: int = 0) -> str:
+    """
+    Keep a renderer for a page's raw JSON and return a short handle to it.
+
+    `size` is the approximate memory held by the renderer, e.g. the size of
+    the request and response messages. Rendered parts are added to the
+    entry's size as they are fetched. The least recently used entries are
+    dropped once MAX_ENTRIES or MAX_BYTES is exceeded.
+    """
+    global _total_bytes
+
+    handle = secrets.token_urlsafe(12)
+    with _LOCK:
+        _ENTRIES[handle] = (renderer, size, {})
+        _total_bytes += size
+        _evict()
+    return handle
+
+
+def get_raw_json(handle: str, part: str, index: int = 0) -> Optional[str]:
+    """
+    Render one part of the raw JSON behind a handle, or None if the handle
+    expired or the part does not exist. Rendered parts are kept with the entry.
+    """
+    global _total_bytes
+
+    key = (part, index)
+    with _LOCK:
+        entry = _ENTRIES.get(handle)
+        if entry is None:
+            return None
+        _ENTRIES.move_to_end(handle)
+        renderer, _, rendered = entry
+        if key in rendered:
+            return rendered[key]
+
+    raw_json = renderer(part, index)
+    if raw_json is None:
+        return None
+
+    with _LOCK:
+        entry = _ENTRIES.get(handle)
+        # Only keep the rendered part if the entry wasn't evicted meanwhile,
+        # and count it towards the entry's size
+        if entry is not None and key not in entry[2]:
+            renderer, size, rendered = entry
+            rendered[key] = raw_json
+            _ENTRIES[handle] = (renderer, size + len(raw_json), rendered)
+            _total_bytes += len(raw_json)
+            _evict()
+    return raw_json
@@ -0,0 +1,249 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""API Response Cache with TTL"""
+from collections import OrderedDict, defaultdict
+import hashlib
+import json
+import os
+import struct
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+TTL_SECONDS = int(os.environ.get("RESPONSE_CACHE_TTL_SECONDS", "300"))
+MAX_ENTRIES = int(os.environ.get("RESPONSE_CACHE_SIZE", "1024"))
+MAX_BYTES = int(os.environ.get("RESPONSE_CACHE_BYTES", str(64 * 1024 * 1024)))
+
+# Set to e.g. redis://10.0.0.3:6379/0 to share the cache between instances
+REDIS_URL = os.environ.get("RESPONSE_CACHE_REDIS_URL")
+REDIS_KEY_PREFIX = "web-app:response-cache:"
+
+# Cached values are the serialized response plus the latency of the API call
+# that produced it, which is what a later hit saves.
+CachedValue = Tuple[bytes, float]
+
+
+class MemoryBackend:
+    """
+    Per-process LRU cache with expiring entries, bounded by entry count and
+    total payload size
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries: "OrderedDict[str, Tuple[float, CachedValue]]" = OrderedDict()
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[CachedValue]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                self.total_bytes -= len(value[0])
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: CachedValue, ttl_seconds: int) -> None:
+        if len(value[0]) > self.max_bytes:
+            return
+
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.total_bytes -= len(previous[1][0])
+            self.entries[key] = (time.monotonic() + ttl_seconds, value)
+            self.total_bytes += len(value[0])
+            while (
+                len(self.entries) > self.max_entries
+                or self.total_bytes > self.max_bytes
+            ):
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.total_bytes -= len(evicted[0])
+
+
+class RedisBackend:
+    """
+    Cache shared by all instances, with expiry handled by Redis.
+
+    Redis errors are reported and treated as misses, so a cache outage only
+    makes requests go to the API directly.
+    """
+
+    def __init__(self, url: str) -> None:
+        import redis  # pylint: disable=import-outside-toplevel
+
+        self.client = redis.Redis.from_url(
+            url, socket_timeout=0.5, socket_connect_timeout=0.5
+        )
+        self.error = redis.RedisError
+
+    def get(self, key: str) -> Optional[CachedValue]:
+        try:
+            data = self.client.get(REDIS_KEY_PREFIX + key)
+        except self.error as e:
+            record_error(e)
+            return None
+        if data is None:
+            return None
+        (latency,) = struct.unpack_from("!d", data)
+        return data[8:], latency
+
+    def set(self, key: str, value: CachedValue, ttl_seconds: int) -> None:
+        payload, latency = value
+        try:
+            self.client.set(
+                REDIS_KEY_PREFIX + key,
+                struct.pack("!d", latency) + payload,
+                ex=ttl_seconds,
+            )
+        except self.error as e:
+            record_error(e)
+
+
+_backend: Optional[Any] = None
+_backend_lock = threading.Lock()
+
+_metrics: Dict[str, Dict[str, float]] = defaultdict(
+    lambda: {"hits": 0, "misses": 0, "saved_seconds": 0.0}
+)
+_metrics_lock = threading.Lock()
+_backend_errors = 0
+
+
+def record_error(error: Exception) -> None:
+    """
+    Count a cache backend error, which is served as a miss
+    """
+    global _backend_errors
+
+    with _metrics_lock:
+        _backend_errors += 1
+    print(f"Response cache unavailable, calling the API directly: {error}")
+
+
+def get_backend() -> Any:
+    """
+    Redis backend if RESPONSE_CACHE_REDIS_URL is set, otherwise in-memory
+    """
+    global _backend
+
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if REDIS_URL:
+                    _backend = RedisBackend(REDIS_URL)
+                else:
+                    _backend = MemoryBackend(MAX_ENTRIES, MAX_BYTES)
+    return _backend
+
+
+def normalize_query(query: Optional[str]) -> Optional[str]:
+    """
+    Case and whitespace insensitive form of a query, used for cache keys
+    """
+    if query is None:
+        return None
+    return " ".join(query.split()).casefold()
+
+
+def get_cache_key(kind: str, key_parts: Dict[str, Any]) -> str:
+    key_json = json.dumps(key_parts, sort_keys=True, default=str)
+    return f"{kind}:{hashlib.sha256(key_json.encode()).hexdigest()}"
+
+
+def get_or_fetch(
+    kind: str, key_parts: Dict[str, Any], fetch: Callable[[], bytes]
+) -> bytes:
+    """
+    Serialized API response for `key_parts`, calling `fetch` on a cache miss.
+
+    Failed calls raise and are not cached.
+    """
+    key = get_cache_key(kind, key_parts)
+    backend = get_backend()
+
+    cached = backend.get(key)
+    if cached is not None:
+        payload, latency = cached
+        with _metrics_lock:
+            _metrics[kind]["hits"] += 1
+            _metrics[kind]["saved_seconds"] += latency
+        return payload
+
+    start = time.perf_counter()
+    payload = fetch()
+    latency = time.perf_counter() - start
+
+    backend.set(key, (payload, latency), TTL_SECONDS)
+    with _metrics_lock:
+        _metrics[kind]["misses"] += 1
+    return payload
+
+
+def get_metrics() -> Dict[str, Dict[str, float]]:
+    """
+    Hits, misses, hit ratio and saved API latency per kind of request
+    """
+    with _metrics_lock:
+        metrics = {kind: dict(values) for kind, values in _metrics.items()}
+
+    for values in metrics.values():
+        requests = values["hits"] + values["misses"]
+        values["hit_ratio"] = values["hits"] / requests if requests else 0.0
+    return metrics
+
+
+def render_prometheus_metrics() -> str:
+    """
+    Cache metrics in the Prometheus text exposition format
+    """
+    metrics = get_metrics()
+    lines = [
+        "# HELP response_cache_requests_total Cache lookups by result.",
+        "# TYPE response_cache_requests_total counter",
+    ]
+    for kind, values in metrics.items():
+        for name, result in (("hits", "hit"), ("misses", "miss")):
+            lines.append(
+                f'response_cache_requests_total{{kind="{kind}",result="{result}"}} '
+                f"{values[name]}"
+            )
+    with _metrics_lock:
+        backend_errors = _backend_errors
+    lines += [
+        "# HELP response_cache_errors_total Cache backend errors served as misses.",
+        "# TYPE response_cache_errors_total counter",
+        f"response_cache_errors_total {backend_errors}",
+        "# HELP response_cache_hit_ratio Share of lookups served from the cache.",
+        "# TYPE response_cache_hit_ratio gauge",
+    ]
+    for kind, values in metrics.items():
+        lines.append(f'response_cache_hit_ratio{{kind="{kind}"}} {values["hit_ratio"]}')
+    lines += [
+        "# HELP response_cache_saved_latency_seconds_total API latency avoided by cache hits.",
+        "# TYPE response_cache_saved_latency_seconds_total counter",
+    ]
+    for kind, values in metrics.items():
+        lines.append(
+            f'response_cache_saved_latency_seconds_total{{kind="{kind}"}} '
+            f'{values["saved_seconds"]}'
+        )
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,56 @@
+/**
+ * Copyright 2024 Google LLC
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *    http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ */
+
+// Raw request/response JSON is only fetched from the server when the JSON
+// tab is opened or a result's "Show JSON" button is clicked.
+function loadRawJson(codeElement) {
+  if (codeElement.dataset.rawJsonLoaded) {
+    return;
+  }
+  codeElement.dataset.rawJsonLoaded = "true";
+  codeElement.parentElement.hidden = false;
+  codeElement.textContent = "Loading...";
+
+  fetch(codeElement.dataset.rawJson)
+    .then((response) => response.text().then((text) => ({ ok: response.ok, text })))
+    .then(({ ok, text }) => {
+      codeElement.textContent = text;
+      if (ok) {
+        delete codeElement.dataset.highlighted;
+        hljs.highlightElement(codeElement);
+      } else {
+        delete codeElement.dataset.rawJsonLoaded;
+      }
+    })
+    .catch((error) => {
+      codeElement.textContent = `Failed to load JSON: ${error}`;
+      delete codeElement.dataset.rawJsonLoaded;
+    });
+}
+
+const rawJsonTabSelector = document.querySelector("#json-tab-selector");
+
+if (rawJsonTabSelector) {
+  rawJsonTabSelector.addEventListener("click", () => {
+    document.querySelectorAll("code.raw-json-tab").forEach(loadRawJson);
+  });
+}
+
+document.querySelectorAll(".raw-json-button").forEach((button) => {
+  button.addEventListener("click", () => {
+    loadRawJson(document.getElementById(button.dataset.target));
+    button.hidden = true;
+  });
+});